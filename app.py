@@ -1,30 +1,41 @@
 import streamlit as st
-import pdfplumber
 import pandas as pd
 import io
 import re
-from collections import defaultdict
 from datetime import datetime
+import importlib.util
 import time
 
-try:
-    import plotly.express as px
-    import plotly.graph_objects as go
-    PLOTLY_AVAILABLE = True
-except ImportError:
-    PLOTLY_AVAILABLE = False
+# Plotly n'est importé qu'au premier affichage de graphiques
+PLOTLY_AVAILABLE = importlib.util.find_spec("plotly") is not None
+if not PLOTLY_AVAILABLE:
     st.warning("⚠️ Plotly non installé. Les graphiques ne seront pas affichés.")
 
 import base64
 
+from desathor.aggregates import summarize, top
+from desathor.backends import BACKENDS, DEFAULT_BACKEND
+from desathor.browser import STATUS_FILTERS, OrderIndex, page_count, page_rows
+from desathor.cache import ParseCache
+from desathor.core import KIND_LABELS
+from desathor.export import LONG_FORMATS, write_excel_report, write_long_report
+from desathor.history import HistoryStore, session_usage
+from desathor.incremental import IncrementalComparison
+from desathor.jobs import JobRegistry
+from desathor.metrics import RerunProfiler, Timings, emit_metrics, emit_reconciliation, emit_reruns, emit_stages
+from desathor.pool import SharedPool
+from desathor.store import LineStore
+
+# Début de la réexécution (les imports ci-dessus ne coûtent qu'au premier passage du processus)
+RERUN_START = time.perf_counter()
+
 st.set_page_config(
     page_title="DESATHOR",
     layout="wide",
     initial_sidebar_state="expanded"
 )
 
-# Logo plus haut
-st.markdown("""
+HEADER_CSS = """
 <style>
     .logo-container {
         display: flex;
@@ -85,27 +96,57 @@ st.markdown("""
         border: none;
     }
 </style>
-""", unsafe_allow_html=True)
-
-with open("Desathor.png", "rb") as f:
-    data = f.read()
-encoded = base64.b64encode(data).decode()
+"""
 
-st.markdown(
-    f"""
+@st.cache_resource
+def get_header_html():
+    """CSS et logo (encodé en base64) de l'en-tête, construits une fois par processus"""
+    with open("Desathor.png", "rb") as f:
+        encoded = base64.b64encode(f.read()).decode()
+    return HEADER_CSS + f"""
     <div class="logo-container">
         <img src="data:image/png;base64,{encoded}" style="width:250px; max-width:80%; height:auto;">
     </div>
-    """,
-    unsafe_allow_html=True
-)
+    """
+
+# Logo plus haut
+st.markdown(get_header_html(), unsafe_allow_html=True)
+
+@st.cache_resource
+def get_rerun_profiler():
+    """Temps des réexécutions de l'interface par état de page, pour toutes les sessions du processus"""
+    return RerunProfiler()
+
+rerun_profiler = get_rerun_profiler()
+
+def page_state(job):
+    if not st.session_state.authenticated:
+        return "login"
+    if job is not None and job.running:
+        return "running"
+    return "results" if st.session_state.historique else "idle"
+
+def record_rerun(state):
+    """Durée de la réexécution en cours jusqu'ici ; les réexécutions interrompues par st.rerun() ne comptent pas"""
+    if rerun_profiler.record(state, time.perf_counter() - RERUN_START):
+        emit_reruns(rerun_profiler)
 
 if 'historique' not in st.session_state:
-    st.session_state.historique = []
+    st.session_state.historique = HistoryStore()
+if "history_index" not in st.session_state:
+    st.session_state.history_index = -1
+if "show_timings" not in st.session_state:
+    st.session_state.show_timings = False
+if "job_id" not in st.session_state:
+    st.session_state.job_id = None
+if "incremental" not in st.session_state:
+    st.session_state.incremental = IncrementalComparison()
 if "key_cmd" not in st.session_state:
     st.session_state.key_cmd = "cmd_1"
 if "key_bl" not in st.session_state:
     st.session_state.key_bl = "bl_1"
+if "key_zip" not in st.session_state:
+    st.session_state.key_zip = "zip_1"
 if "show_help" not in st.session_state:
     st.session_state.show_help = False
 if "authenticated" not in st.session_state:
@@ -161,140 +202,41 @@ if not st.session_state.authenticated:
                     st.error("❌ Identifiant ou mot de passe incorrect")
         
         st.info("💡 **Demo**: user1 / user123")
+    record_rerun("login")
     st.stop()
 
+st.session_state.historique.owner = st.session_state.username
+
 st.markdown('<h1 class="main-header">🧾 Comparateur pour DESADV</h1>', unsafe_allow_html=True)
 st.markdown(f'<p class="subtitle">Bienvenue {st.session_state.username} ({st.session_state.user_role}) | Analysez vos commandes et bons de livraison en quelques clics</p>', unsafe_allow_html=True)
 
-def find_order_numbers_in_text(text):
-    if not text:
-        return []
-    patterns = [
-        r"Commande\s*n[°º]?\s*[:\s-]*?(\d{5,10})",
-        r"N[°º]?\s*commande\s*[:\s-]*?(\d{5,10})",
-        r"Bon\s+de\s+Livraison\s+Nr\.?\s*[:\s-]*?(\d{5,10})",
-    ]
-    found = []
-    for pat in patterns:
-        for m in re.finditer(pat, text, flags=re.IGNORECASE):
-            num = m.group(1)
-            if num and num not in found:
-                found.append(num)
-    return found
-
-def is_valid_ean13(code):
-    if not code or len(code) != 13:
-        return False
-    if code.startswith(('302', '376')):
-        return False
-    return True
+@st.cache_resource
+def get_parse_cache():
+    """Cache d'extraction partagé par toutes les sessions du processus"""
+    return ParseCache()
 
-def extract_records_from_command_pdf(pdf_file):
-    records = []
-    full_text = ""
-    try:
-        with pdfplumber.open(pdf_file) as pdf:
-            current_order = None
-            in_data_section = False
-            for page in pdf.pages:
-                txt = page.extract_text() or ""
-                full_text += "\n" + txt
-                lines = txt.split("\n")
-                for i, ligne in enumerate(lines):
-                    order_nums = find_order_numbers_in_text(ligne)
-                    if order_nums:
-                        current_order = order_nums[0]
-                    if re.search(r"^L\s+Réf\.\s*frn\s+Code\s+ean", ligne, re.IGNORECASE):
-                        in_data_section = True
-                        continue
-                    if re.search(r"^Récapitulatif|^Page\s+\d+", ligne, re.IGNORECASE):
-                        in_data_section = False
-                        continue
-                    if not in_data_section:
-                        continue
-                    ean_matches = re.findall(r"\b(\d{13})\b", ligne)
-                    valid_eans = [ean for ean in ean_matches if is_valid_ean13(ean)]
-                    if not valid_eans:
-                        continue
-                    ean = valid_eans[0]
-                    parts = ligne.split()
-                    ean_pos = None
-                    for idx, part in enumerate(parts):
-                        if ean in part:
-                            ean_pos = idx
-                            break
-                    ref_frn = None
-                    code_article = ""
-                    if ean_pos and ean_pos > 1:
-                        candidate = parts[ean_pos - 1]
-                        if re.match(r"^\d{3,6}$", candidate):
-                            code_article = candidate
-                            ref_frn = candidate
-                    qty_match = re.search(r"Conditionnement\s*:\s*\d+\s+\d+(\d+)\s+(\d+)", ligne)
-                    if qty_match:
-                        qte = int(qty_match.group(1))
-                    else:
-                        nums = re.findall(r"\b(\d+)\b", ligne)
-                        nums = [int(n) for n in nums if n != ean and len(n) < 6]
-                        if nums:
-                            qte = nums[-2] if len(nums) >= 2 else nums[-1]
-                        else:
-                            continue
-                    records.append({
-                        "ref": ean,
-                        "code_article": code_article,
-                        "qte_commande": qte,
-                        "order_num": current_order if current_order else "__NO_ORDER__"
-                    })
-    except Exception as e:
-        st.error(f"Erreur lecture PDF commande: {e}")
-        return {"records": [], "order_numbers": [], "full_text": ""}
-    order_numbers = find_order_numbers_in_text(full_text)
-    return {"records": records, "order_numbers": order_numbers, "full_text": full_text}
-
-def extract_records_from_bl_pdf(pdf_file):
-    records = []
-    full_text = ""
-    try:
-        with pdfplumber.open(pdf_file) as pdf:
-            current_order = None
-            for page in pdf.pages:
-                txt = page.extract_text() or ""
-                full_text += "\n" + txt
-                for ligne in txt.split("\n"):
-                    order_nums = find_order_numbers_in_text(ligne)
-                    if order_nums:
-                        current_order = order_nums[0]
-                    ean_matches = re.findall(r"\b(\d{13})\b", ligne)
-                    valid_eans = [ean for ean in ean_matches if is_valid_ean13(ean)]
-                    if not valid_eans:
-                        continue
-                    ean = valid_eans[0]
-                    nums = re.findall(r"[\d,.]+", ligne)
-                    qte = None
-                    if nums:
-                        candidate = nums[-2] if len(nums) >= 2 else nums[-1]
-                        try:
-                            qte = float(candidate.replace(",", "."))
-                        except:
-                            continue
-                    if qte is None:
-                        continue
-                    records.append({
-                        "ref": ean,
-                        "qte_bl": qte,
-                        "order_num": current_order if current_order else "__NO_ORDER__"
-                    })
-    except Exception as e:
-        st.error(f"Erreur lecture PDF BL: {e}")
-        return {"records": [], "order_numbers": [], "full_text": ""}
-    order_numbers = find_order_numbers_in_text(full_text)
-    return {"records": records, "order_numbers": order_numbers, "full_text": full_text}
-
-def calculate_service_rate(qte_cmd, qte_bl):
-    if pd.isna(qte_bl) or qte_cmd == 0:
-        return 0
-    return min((qte_bl / qte_cmd) * 100, 100)
+parse_cache = get_parse_cache()
+
+@st.cache_resource
+def get_line_store():
+    """Base des lignes extraites, partagée par toutes les sessions et conservée entre les redémarrages"""
+    return LineStore()
+
+line_store = get_line_store()
+
+@st.cache_resource
+def get_job_registry():
+    """Comparaisons en cours d'exécution, partagées par toutes les sessions"""
+    return JobRegistry()
+
+job_registry = get_job_registry()
+
+@st.cache_resource
+def get_shared_pool():
+    """Processus d'extraction du serveur, partagés équitablement par toutes les sessions"""
+    return SharedPool()
+
+shared_pool = get_shared_pool()
 
 with st.sidebar:
     # Nom utilisateur en haut
@@ -312,7 +254,19 @@ with st.sidebar:
     if st.button("🔄 Nouveau", use_container_width=True, type="primary"):
         st.session_state.key_cmd = f"cmd_{time.time()}"
         st.session_state.key_bl = f"bl_{time.time()}"
-        st.session_state.historique = []
+        st.session_state.key_zip = f"zip_{time.time()}"
+        st.session_state.historique.clear()
+        st.session_state.history_index = -1
+        running_job = job_registry.get(st.session_state.job_id)
+        if running_job is not None:
+            # L'analyse en cours s'arrête et son résultat est abandonné
+            running_job.cancel()
+            job_registry.discard(running_job.id)
+            st.session_state.job_id = None
+            # Nouvel état : le thread de l'analyse annulée garde l'ancien
+            st.session_state.incremental = IncrementalComparison()
+        else:
+            st.session_state.incremental.reset()
         st.rerun()
     
     st.markdown("---")
@@ -330,26 +284,80 @@ with st.sidebar:
         accept_multiple_files=True,
         key=st.session_state.key_bl
     )
+    archive_files = st.file_uploader(
+        "🗜️ Archive(s) ZIP",
+        type="zip",
+        accept_multiple_files=True,
+        key=st.session_state.key_zip,
+        help="PDF de commande et de BL mélangés : chaque PDF est lu à part et classé d'après son nom "
+             "(commande, cde, bl, livraison...) ou, à défaut, ses premières pages"
+    )
     
     st.markdown("---")
     st.header("⚙️ Options")
     hide_unmatched = st.checkbox(
         "👁️‍🗨️ Masquer les commandes sans correspondance",
         value=True,
-        help="Exclut les articles MISSING_IN_BL de l'export Excel"
+        help="Exclut les articles MISSING_IN_BL des exports"
+    )
+    shard_pages = st.number_input(
+        "📄 Pages par segment",
+        min_value=0,
+        value=0,
+        step=10,
+        help="Découpe les gros PDF en segments de N pages lus en parallèle (0 = un processus par fichier)"
+    )
+    incremental_mode = st.checkbox(
+        "♻️ Mise à jour incrémentale",
+        value=True,
+        help="Ne lit que les fichiers ajoutés depuis la dernière comparaison et ne recalcule que les commandes "
+             "concernées (décocher pour tout recalculer)"
+    )
+    backend = st.selectbox(
+        "🔍 Moteur d'extraction",
+        list(BACKENDS),
+        index=list(BACKENDS).index(DEFAULT_BACKEND),
+        help="pdfplumber : analyse de mise en page complète ; pdfminer : lignes reconstituées directement, plus rapide"
     )
     
     st.markdown("---")
     st.header("📊 Historique")
-    if st.session_state.historique:
-        st.write(f"**{len(st.session_state.historique)}** comparaison(s)")
+    historique = st.session_state.historique
+    if historique:
+        st.write(f"**{len(historique)}** comparaison(s)")
+        if len(historique) > 1:
+            entries = historique.entries()
+            labels = [
+                f"{i + 1}. {entry.timestamp:%d/%m %H:%M:%S}" + (" 💾" if entry.spilled else "")
+                for i, entry in enumerate(entries)
+            ]
+            selected = st.selectbox(
+                "Comparaison affichée",
+                range(len(entries)),
+                index=st.session_state.history_index % len(entries),
+                format_func=lambda i: labels[i],
+                help="💾 = conservée sur disque, relue à la sélection"
+            )
+            st.session_state.history_index = selected
+        st.caption(
+            f"Mémoire : {historique.memory_bytes() / 1024 / 1024:.1f} Mo | "
+            f"disque : {historique.disk_bytes() / 1024 / 1024:.1f} Mo"
+        )
         if st.button("🗑️ Supprimer tout l'historique", use_container_width=True):
-            st.session_state.historique = []
+            historique.clear()
+            st.session_state.history_index = -1
             st.success("Historique supprimé")
             st.rerun()
     else:
         st.info("Aucune comparaison enregistrée")
     
+    cache_stats = parse_cache.stats
+    st.caption(
+        f"🗄️ Cache d'extraction : {cache_stats['memory_hits'] + cache_stats['disk_hits']} hit(s) "
+        f"({cache_stats['memory_hits']} mémoire, {cache_stats['disk_hits']} disque) | "
+        f"{cache_stats['misses']} miss | {parse_cache.disk_usage() / 1024 / 1024:.1f} Mo"
+    )
+    
     # Gestion utilisateurs (Admin uniquement)
     if st.session_state.user_role == "admin":
         st.markdown("---")
@@ -357,194 +365,363 @@ with st.sidebar:
         if st.button("⚙️ Gérer les utilisateurs", use_container_width=True):
             st.session_state.show_help = "manage_users"
             st.rerun()
+        st.checkbox(
+            "⏱️ Panneau de performances",
+            key="show_timings",
+            help="Détail des temps par étape, par fichier et par page pour la prochaine comparaison"
+        )
+        with st.expander("🧠 Mémoire des sessions"):
+            usage = pd.DataFrame(session_usage())
+            if not usage.empty:
+                usage["memory_bytes"] = (usage["memory_bytes"] / 1024 / 1024).round(1)
+                usage["disk_bytes"] = (usage["disk_bytes"] / 1024 / 1024).round(1)
+                usage.columns = ["Utilisateur", "Comparaisons", "En mémoire", "Mémoire (Mo)", "Disque (Mo)"]
+                st.dataframe(usage, use_container_width=True, hide_index=True)
+            else:
+                st.info("Aucune session active")
+        with st.expander("⚡ File d'extraction"):
+            pool_stats = shared_pool.stats()
+            st.caption(
+                f"{pool_stats['running']}/{pool_stats['workers']} processus occupés | "
+                f"{pool_stats['queued']} tâche(s) en file | "
+                f"{sum(1 for j in job_registry.jobs() if j.status == 'running')} analyse(s) en cours, "
+                f"{sum(1 for j in job_registry.jobs() if j.status == 'pending')} en attente"
+            )
+            queues = pd.DataFrame(
+                [{"Utilisateur": owner, "En cours": q["running"], "En file": q["queued"]}
+                 for owner, q in pool_stats["by_owner"].items()]
+            )
+            if not queues.empty:
+                st.dataframe(queues, use_container_width=True, hide_index=True)
+        with st.expander("⏱️ Temps de réexécution"):
+            reruns = pd.DataFrame(rerun_profiler.report())
+            if not reruns.empty:
+                reruns.columns = ["État", "Mesures", "p50 (ms)", "p95 (ms)", "Max (ms)"]
+                st.dataframe(reruns, use_container_width=True, hide_index=True)
+            else:
+                st.info("Aucune réexécution mesurée")
     
     st.markdown("---")
+    if st.button("🗄️ Commandes archivées", use_container_width=True):
+        st.session_state.show_help = "archive"
+        st.rerun()
     if st.button("❓ Comment utiliser", use_container_width=True):
         st.session_state.show_help = "guide"
         st.rerun()
 
+job = job_registry.get(st.session_state.job_id)
+
 # Boutons principaux avec disposition optimisée
 col1, col2 = st.columns([4, 1])
 with col1:
-    launch_button = st.button("🔍 Lancer la comparaison", use_container_width=True, type="primary")
+    launch_button = st.button(
+        "🔍 Lancer la comparaison",
+        use_container_width=True,
+        type="primary",
+        disabled=job is not None and job.running
+    )
 with col2:
     if st.button("❓ Aide", use_container_width=True):
         st.session_state.show_help = "guide"
         st.rerun()
 
 if launch_button:
-    if not commande_files or not bl_files:
-        st.error("⚠️ Veuillez téléverser des commandes ET des bons de livraison.")
+    if not archive_files and (not commande_files or not bl_files):
+        st.error("⚠️ Veuillez téléverser des commandes ET des bons de livraison, ou une archive ZIP.")
+        record_rerun(page_state(job))
         st.stop()
-    with st.spinner("🔄 Analyse en cours..."):
-        commandes_dict = defaultdict(list)
-        all_command_records = []
-        for f in commande_files:
-            res = extract_records_from_command_pdf(f)
-            all_command_records.extend(res["records"])
-            for rec in res["records"]:
-                commandes_dict[rec["order_num"]].append(rec)
-        for k in commandes_dict.keys():
-            df = pd.DataFrame(commandes_dict[k])
-            df = df.groupby(["ref", "code_article"], as_index=False).agg({"qte_commande": "sum"})
-            commandes_dict[k] = df
-        bls_dict = defaultdict(list)
-        all_bl_records = []
-        for f in bl_files:
-            res = extract_records_from_bl_pdf(f)
-            all_bl_records.extend(res["records"])
-            for rec in res["records"]:
-                bls_dict[rec["order_num"]].append(rec)
-        for k in bls_dict.keys():
-            df = pd.DataFrame(bls_dict[k])
-            df = df.groupby("ref", as_index=False).agg({"qte_bl": "sum"})
-            bls_dict[k] = df
-        results = {}
-        for order_num, df_cmd in commandes_dict.items():
-            df_bl = bls_dict.get(order_num, pd.DataFrame(columns=["ref", "qte_bl"]))
-            merged = pd.merge(df_cmd, df_bl, on="ref", how="left")
-            merged["qte_commande"] = pd.to_numeric(merged["qte_commande"], errors="coerce").fillna(0)
-            merged["qte_bl"] = pd.to_numeric(merged.get("qte_bl", pd.Series()), errors="coerce").fillna(0)
-            def status_row(r):
-                if r["qte_bl"] == 0:
-                    return "MISSING_IN_BL"
-                return "OK" if r["qte_commande"] == r["qte_bl"] else "QTY_DIFF"
-            merged["status"] = merged.apply(status_row, axis=1)
-            merged["diff"] = merged["qte_bl"] - merged["qte_commande"]
-            merged["taux_service"] = merged.apply(
-                lambda r: calculate_service_rate(r["qte_commande"], r["qte_bl"]), axis=1
+    files = (
+        [("commande", f.name, f.getvalue()) for f in commande_files]
+        + [("bl", f.name, f.getvalue()) for f in bl_files]
+    )
+    incremental = st.session_state.incremental
+    timings = Timings(detail=st.session_state.show_timings and st.session_state.user_role == "admin")
+    username = st.session_state.username
+    
+    # Exécuté dans le thread du travail : aucune lecture de st.session_state
+    def run_job(job):
+        run_start = time.perf_counter()
+        run = incremental.run(
+            files,
+            cache=parse_cache,
+            shard_pages=shard_pages or None,
+            progress=job.file_done,
+            timings=timings,
+            backend=backend,
+            full=not incremental_mode,
+            store=line_store,
+            # Avec une archive, l'avancement se compte en fichiers (membres compris)
+            page_progress=None if archive_files else job.page_done,
+            cancel=job.cancel_event,
+            pool=shared_pool,
+            owner=username,
+            archives=archive_files or ()
+        )
+        with timings.measure("aggregates"):
+            aggregates = summarize(run["comparison"]["table"], hide_unmatched)
+        line = emit_metrics(
+            timings,
+            user=username,
+            n_files=len(run["parsed"]),
+            errors=len(run["errors"]),
+            orders=len(run["comparison"]["results"]),
+            workers=shared_pool.workers,
+            backend=backend,
+            mode=run["update"]["mode"],
+            touched_orders=run["update"]["touched_orders"],
+            seconds=round(time.perf_counter() - run_start, 4)
+        )
+        emit_reconciliation(run["comparison"]["reconciliation"], user=username, run_id=line["run_id"])
+        return {"run": run, "timings": timings, "run_id": line["run_id"], "hide_unmatched": hide_unmatched,
+                "aggregates": aggregates}
+    
+    st.session_state.job_id = job_registry.submit(username, run_job).id
+    st.rerun()
+
+@st.fragment(run_every=0.5)
+def job_progress(job_id):
+    """Avancement de l'analyse, seul rafraîchi pendant qu'elle tourne ; la page entière n'est réexécutée
+    qu'une fois, à la fin du travail, pour rattacher son résultat à l'historique"""
+    job = job_registry.get(job_id)
+    if job is None or not job.running:
+        st.rerun()
+    if job.status == "pending":
+        ahead = job_registry.queue_position(job)
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.progress(0.0)
+            st.caption(f"⏳ Serveur occupé : analyse en attente d'une place ({ahead} analyse(s) avant la vôtre)")
+        with col2:
+            if st.button("⛔ Annuler", use_container_width=True):
+                job.cancel()
+                st.rerun()
+        return
+    progress = job.progress()
+    files_total = progress["files_total"] if progress["files_total"] is not None else "?"
+    details = [f"{progress['files_done']}/{files_total} fichier(s)"]
+    if progress["pages_total"]:
+        details.append(f"{progress['pages_done']}/{progress['pages_total']} pages")
+    if progress["pages_per_second"]:
+        details.append(f"{progress['pages_per_second']:.1f} pages/s")
+    if progress["eta_seconds"] is not None:
+        details.append(f"reste ~{progress['eta_seconds']:.0f} s")
+    if progress["file_errors"]:
+        details.append(f"⚠️ {len(progress['file_errors'])} erreur(s)")
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        st.progress(progress["fraction"])
+        st.caption("🔄 Analyse en cours : " + " | ".join(details))
+        if progress["last_file"]:
+            st.caption(f"Dernier fichier lu : {progress['last_file']}")
+    with col2:
+        if job.cancel_event.is_set():
+            st.button("⏳ Annulation...", use_container_width=True, disabled=True)
+        elif st.button("⛔ Annuler", use_container_width=True):
+            job.cancel()
+            st.rerun(scope="fragment")
+
+if job is not None and job.running:
+    job_progress(job.id)
+elif job is not None:
+    # Travail terminé : son résultat rejoint l'historique une seule fois
+    st.session_state.job_id = None
+    job_registry.discard(job.id)
+    if job.status == "done":
+        run = job.result["run"]
+        st.session_state.timings = job.result["timings"]
+        for res in run["errors"]:
+            st.error(f"Erreur lecture PDF {KIND_LABELS.get(res['kind'], 'document')} ({res['name']}): {res['error']}")
+        update = run["update"]
+        skipped = run.get("skipped", [])
+        members = [res for res in run["parsed"] + skipped if "classified_by" in res]
+        if members:
+            with st.expander(f"🗜️ {len(members)} PDF lu(s) depuis les archives ({len(skipped)} ignoré(s))"):
+                st.dataframe(
+                    pd.DataFrame({
+                        "Fichier": [res["name"] for res in members],
+                        "Type": [KIND_LABELS.get(res["kind"], "inconnu") for res in members],
+                        "Classé d'après": [res["classified_by"] or "" for res in members],
+                        "Lignes": [len(res["records"]) if res["records"] is not None else 0 for res in members],
+                        "Erreur": [res["error"] or "" for res in members],
+                    }),
+                    use_container_width=True,
+                    hide_index=True
+                )
+        if update["mode"] == "incremental":
+            st.info(
+                f"♻️ Mise à jour incrémentale : {update['added']} fichier(s) ajouté(s), "
+                f"{update['removed']} retiré(s), {update['touched_orders']} commande(s) recalculée(s)"
             )
-            results[order_num] = merged
-        comparison_data = {
-            "timestamp": datetime.now(),
-            "results": results,
-            "commandes_dict": commandes_dict,
-            "bls_dict": bls_dict,
-            "hide_unmatched": hide_unmatched
-        }
-        st.session_state.historique.append(comparison_data)
+        comparison = run["comparison"]
+        st.session_state.historique.append(
+            timestamp=datetime.now(),
+            hide_unmatched=job.result["hide_unmatched"],
+            table=comparison["table"],
+            bl=comparison["bl"],
+            aggregates=job.result["aggregates"],
+            reconciliation=comparison["reconciliation"],
+            # Export et graphiques sont mesurés plus tard : leurs lignes de métriques reprennent le run_id
+            # de la comparaison affichée, pas celui de la dernière analyse
+            run_id=job.result["run_id"]
+        )
+        st.session_state.history_index = -1
+    elif job.status == "cancelled":
+        st.warning("⛔ Analyse annulée : la comparaison précédente est conservée")
+    else:
+        st.error(f"❌ Échec de l'analyse : {job.error}")
+    job = None
 
 if st.session_state.historique:
-    latest = st.session_state.historique[-1]
+    latest = st.session_state.historique[st.session_state.history_index]
     results = latest["results"]
-    commandes_dict = latest["commandes_dict"]
-    bls_dict = latest["bls_dict"]
     hide_unmatched = latest["hide_unmatched"]
+    # Totaux calculés une fois à la comparaison (aggregates.summarize) : aucune vue ne les recalcule
+    aggregates = latest["aggregates"]
+    order_stats = aggregates["orders"][aggregates["orders"]["included"]]
+    totals = aggregates["totals"]
     
-    def order_included(df):
-        total_bl = df["qte_bl"].sum() if "qte_bl" in df.columns else 0
-        if hide_unmatched and total_bl == 0:
-            return False
-        return True
+    total_commande = totals["qte_commande"]
+    total_livre = totals["qte_bl"]
+    total_manquant = totals["qte_manquante"]
+    taux_service_global = totals["taux_service"]
+    total_articles_ok = totals["n_ok"]
+    total_articles_diff = totals["n_diff"]
+    total_articles_missing = totals["n_missing"]
     
-    total_commande = sum([df["qte_commande"].sum() for df in results.values() if order_included(df)])
-    total_livre = sum([df["qte_bl"].sum() for df in results.values() if order_included(df)])
-    total_manquant = total_commande - total_livre
-    taux_service_global = (total_livre / total_commande * 100) if total_commande > 0 else 0
-    total_articles_ok = sum([(df["status"] == "OK").sum() for df in results.values() if order_included(df)])
-    total_articles_diff = sum([(df["status"] == "QTY_DIFF").sum() for df in results.values() if order_included(df)])
-    total_articles_missing = sum([(df["status"] == "MISSING_IN_BL").sum() for df in results.values() if order_included(df)])
+    # Rattachements conservés avec la comparaison : visibles tant qu'elle reste dans l'historique
+    reconciliation = latest["reconciliation"]
+    if len(reconciliation):
+        with st.expander(
+            f"🔗 {len(reconciliation)} ligne(s) de BL lue(s) sans n° de commande rattachée(s) "
+            f"({reconciliation['qte_bl'].sum():g} unité(s))"
+        ):
+            st.caption(
+                "unique : une seule commande attend cet EAN ; largest_outstanding : plusieurs commandes, "
+                "la plus grande quantité restant à livrer d'abord"
+            )
+            st.dataframe(
+                reconciliation.rename(columns={"order_num": "Commande", "ref": "EAN", "qte_bl": "Qté rattachée",
+                                               "rule": "Règle"}),
+                use_container_width=True,
+                hide_index=True
+            )
     
     st.markdown("### 📋 Détails par commande")
-    for order_num, df in results.items():
-        if not order_included(df):
-            continue
-        n_ok = (df["status"] == "OK").sum()
-        n_diff = (df["status"] == "QTY_DIFF").sum()
-        n_miss = (df["status"] == "MISSING_IN_BL").sum()
-        total_cmd = df["qte_commande"].sum()
-        total_bl = df["qte_bl"].sum()
-        taux = (total_bl / total_cmd * 100) if total_cmd > 0 else 0
+    # Index construit une fois par comparaison : filtres et couleurs ne sont pas recalculés à l'affichage
+    order_index = st.session_state.get("order_index")
+    if order_index is None or order_index[0] != latest["key"]:
+        order_index = st.session_state.order_index = (latest["key"], OrderIndex(latest["table"], aggregates["orders"]))
+    order_index = order_index[1]
+    col1, col2, col3 = st.columns([2, 2, 3])
+    with col1:
+        status_filter = st.multiselect(
+            "Statut",
+            list(STATUS_FILTERS),
+            help="Commandes ayant au moins un article dans l'un de ces statuts"
+        )
+    with col2:
+        rate_filter = st.slider("Taux de service (%)", 0, 100, (0, 100))
+    with col3:
+        order_query = st.text_input("🔎 N° de commande ou EAN")
+    page_size = 10
+    filter_key = (latest["key"], tuple(status_filter), rate_filter, order_query)
+    if st.session_state.get("order_filter") != filter_key:
+        st.session_state.order_filter = filter_key
+        st.session_state.order_page = 1
+    # Plage complète : pas de filtre (le taux dépasse 100 % en cas de surlivraison)
+    matching = order_index.filter(status_filter, None if rate_filter == (0, 100) else rate_filter, order_query)
+    n_pages = page_count(len(matching), page_size)
+    col1, col2 = st.columns([1, 4])
+    with col1:
+        page_number = st.number_input("Page", min_value=1, max_value=n_pages, key="order_page")
+    with col2:
+        st.caption(f"{len(matching)} commande(s) sur {len(order_index)} | page {page_number}/{n_pages}")
+    if matching.empty:
+        st.info("Aucune commande ne correspond aux filtres.")
+    for order in page_rows(matching, page_number, page_size).itertuples(index=False):
         with st.expander(
-            f"📦 Commande **{order_num}** — Taux de service: **{taux:.1f}%** | "
-            f"✅ {n_ok} | ⚠️ {n_diff} | ❌ {n_miss}"
+            f"📦 Commande **{order.order_num}** — Taux de service: **{order.taux_service:.1f}%** | "
+            f"✅ {order.n_ok} | ⚠️ {order.n_diff} | ❌ {order.n_missing}"
         ):
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("Commandé", int(total_cmd))
+                st.metric("Commandé", int(order.qte_commande))
             with col2:
-                st.metric("Livré", int(total_bl))
+                st.metric("Livré", int(order.qte_bl))
             with col3:
-                st.metric("Manquant", int(total_cmd - total_bl))
-            def color_status(val):
-                if val == "OK":
-                    return "background-color: #d4edda"
-                if val == "QTY_DIFF":
-                    return "background-color: #fff3cd"
-                if val == "MISSING_IN_BL":
-                    return "background-color: #f8d7da"
-                return ""
+                st.metric("Manquant", int(order.qte_manquante))
+            start, stop = results.span(order.order_num)
             st.dataframe(
-                df.style.applymap(color_status, subset=["status"]),
+                order_index.style(results[order.order_num], start, stop),
                 use_container_width=True,
                 height=400
             )
     
     st.markdown("---")
     st.markdown("### 📥 Export")
-    output = io.BytesIO()
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"Comparaison_{timestamp}.xlsx"
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        for order_num, df in results.items():
-            total_bl = df["qte_bl"].sum() if "qte_bl" in df.columns else 0
-            if hide_unmatched and total_bl == 0:
-                continue
-            df_export = df.copy()
-            sheet_name = f"C_{order_num}"[:31]
-            df_export.to_excel(writer, sheet_name=sheet_name, index=False)
-            workbook = writer.book
-            worksheet = writer.sheets[sheet_name]
-            ok_format = workbook.add_format({'bg_color': '#d4edda'})
-            diff_format = workbook.add_format({'bg_color': '#fff3cd'})
-            miss_format = workbook.add_format({'bg_color': '#f8d7da'})
-            for idx, row in df_export.iterrows():
-                excel_row = idx + 1
-                if row.get('status') == 'OK':
-                    worksheet.set_row(excel_row, None, ok_format)
-                elif row.get('status') == 'QTY_DIFF':
-                    worksheet.set_row(excel_row, None, diff_format)
-                elif row.get('status') == 'MISSING_IN_BL':
-                    worksheet.set_row(excel_row, None, miss_format)
-        summary_data = {
-            'Commande': [],
-            'Taux de service (%)': [],
-            'Qté commandée': [],
-            'Qté livrée': [],
-            'Qté manquante': [],
-            'Articles OK': [],
-            'Articles différence': [],
-            'Articles manquants': []
-        }
-        for order_num, df in results.items():
-            total_bl = df["qte_bl"].sum() if "qte_bl" in df.columns else 0
-            if hide_unmatched and total_bl == 0:
-                continue
-            total_cmd = df["qte_commande"].sum()
-            total_bl = df["qte_bl"].sum()
-            taux = (total_bl / total_cmd * 100) if total_cmd > 0 else 0
-            summary_data['Commande'].append(order_num)
-            summary_data['Taux de service (%)'].append(round(taux, 2))
-            summary_data['Qté commandée'].append(int(total_cmd))
-            summary_data['Qté livrée'].append(int(total_bl))
-            summary_data['Qté manquante'].append(int(total_cmd - total_bl))
-            summary_data['Articles OK'].append((df["status"] == "OK").sum())
-            summary_data['Articles différence'].append((df["status"] == "QTY_DIFF").sum())
-            summary_data['Articles manquants'].append((df["status"] == "MISSING_IN_BL").sum())
-        df_summary = pd.DataFrame(summary_data)
-        df_summary.to_excel(writer, sheet_name="Récapitulatif", index=False)
+    timestamp = latest["timestamp"].strftime("%Y%m%d_%H%M%S")
+    export_format = st.radio(
+        "Format",
+        ["xlsx"] + list(LONG_FORMATS),
+        format_func=lambda fmt: "Excel (une feuille par commande)" if fmt == "xlsx"
+        else f"{LONG_FORMATS[fmt][0]} (table longue)",
+        horizontal=True,
+        help="Table longue : une ligne par article avec son n° de commande, plus le récapitulatif, "
+             "pour les outils d'analyse ; plus rapide à produire que le classeur Excel"
+    )
+    # L'export n'est construit qu'à la demande, une fois par comparaison et par format
+    export_key = (latest["key"], hide_unmatched, export_format)
+    report_export = st.session_state.get("report_export")
+    if report_export is not None and report_export[0] != export_key:
+        report_export = st.session_state.report_export = None
     col1, col2 = st.columns([3, 1])
     with col1:
-        st.download_button(
-            "📥 Télécharger le rapport Excel",
-            data=output.getvalue(),
-            file_name=filename,
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            use_container_width=True
-        )
+        if report_export is None:
+            label = "Excel" if export_format == "xlsx" else LONG_FORMATS[export_format][0]
+            if st.button(f"📊 Générer l'export {label}", use_container_width=True):
+                with st.spinner("📊 Génération de l'export..."):
+                    export_start = time.perf_counter()
+                    if export_format == "xlsx":
+                        output = io.BytesIO()
+                        write_excel_report(latest["table"], hide_unmatched, output, aggregates)
+                        stage = "excel_build"
+                        downloads = [(
+                            "📥 Télécharger le rapport Excel",
+                            output,
+                            f"Comparaison_{timestamp}.xlsx",
+                            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                        )]
+                    else:
+                        name, ext, mime = LONG_FORMATS[export_format]
+                        output, summary_output = io.BytesIO(), io.BytesIO()
+                        write_long_report(latest["table"], hide_unmatched, output, export_format, summary_output,
+                                          aggregates)
+                        stage = "long_export"
+                        downloads = [
+                            (f"📥 Lignes ({name})", output, f"Comparaison_{timestamp}_lignes{ext}", mime),
+                            (f"📥 Récapitulatif ({name})", summary_output,
+                             f"Comparaison_{timestamp}_recapitulatif{ext}", mime),
+                        ]
+                    export_seconds = time.perf_counter() - export_start
+                    if "timings" in st.session_state:
+                        st.session_state.timings.set(stage, export_seconds)
+                        emit_stages(st.session_state.timings, [stage], latest["run_id"],
+                                    user=st.session_state.username, format=export_format)
+                # Les tampons sont passés tels quels aux boutons : pas de copie du contenu
+                st.session_state.report_export = (export_key, downloads, export_seconds)
+                st.rerun()
+        else:
+            _, downloads, export_seconds = report_export
+            download_cols = st.columns(len(downloads))
+            for download_col, (label, output, name, mime) in zip(download_cols, downloads):
+                with download_col:
+                    st.download_button(label, data=output, file_name=name, mime=mime, use_container_width=True)
+            export_size = sum(output.getbuffer().nbytes for _, output, _, _ in downloads)
+            st.caption(f"📦 {export_size / 1024 / 1024:.1f} Mo générés en {export_seconds:.2f} s")
     with col2:
         if st.button("🗑️ Supprimer ce résultat", use_container_width=True):
-            st.session_state.historique.pop()
+            st.session_state.historique.pop(st.session_state.history_index)
+            st.session_state.history_index = -1
             st.rerun()
     
     st.markdown("---")
@@ -581,7 +758,10 @@ if st.session_state.historique:
     st.markdown("<br>", unsafe_allow_html=True)
     
     col1, col2 = st.columns(2)
+    chart_start = time.perf_counter()
     if PLOTLY_AVAILABLE:
+        import plotly.express as px
+        import plotly.graph_objects as go
         with col1:
             status_data = pd.DataFrame({
                 'Statut': ['✅ OK', '⚠️ Différence', '❌ Manquant'],
@@ -597,18 +777,10 @@ if st.session_state.historique:
             fig_status.update_traces(textposition='inside', textinfo='percent+label')
             st.plotly_chart(fig_status, use_container_width=True)
         with col2:
-            service_rates = []
-            for order_num, df in results.items():
-                if not order_included(df):
-                    continue
-                total_cmd = df["qte_commande"].sum()
-                total_bl = df["qte_bl"].sum()
-                rate = (total_bl / total_cmd * 100) if total_cmd > 0 else 0
-                service_rates.append({
-                    'Commande': str(order_num),
-                    'Taux de service': rate
-                })
-            df_service = pd.DataFrame(service_rates)
+            df_service = pd.DataFrame({
+                'Commande': order_stats["order_num"].astype(str).to_numpy(),
+                'Taux de service': order_stats["taux_service"].to_numpy()
+            })
             if not df_service.empty:
                 fig_service = go.Figure(data=[
                     go.Bar(
@@ -642,66 +814,77 @@ if st.session_state.historique:
             st.metric("Articles avec différence", total_articles_diff)
             st.metric("Articles manquants", total_articles_missing)
         with col2:
-            for order_num, df in results.items():
-                if not order_included(df):
-                    continue
-                total_cmd = df["qte_commande"].sum()
-                total_bl = df["qte_bl"].sum()
-                rate = (total_bl / total_cmd * 100) if total_cmd > 0 else 0
-                st.metric(f"Commande {order_num}", f"{rate:.1f}%")
+            for order in order_stats.itertuples(index=False):
+                st.metric(f"Commande {order.order_num}", f"{order.taux_service:.1f}%")
+    
+    if "timings" in st.session_state:
+        st.session_state.timings.set("chart_render", time.perf_counter() - chart_start)
+        # Un seul suivi par run : les graphiques sont redessinés à chaque réexécution
+        if st.session_state.get("chart_metrics_run") != latest["run_id"]:
+            st.session_state.chart_metrics_run = latest["run_id"]
+            emit_stages(st.session_state.timings, ["chart_render"], latest["run_id"],
+                        user=st.session_state.username)
     
     tabs = st.tabs(["📈 Statistiques", "🏆 Top produits"])
     with tabs[0]:
         st.markdown("### 📈 Articles manquants par code article")
-        missing_by_code = {}
-        for order_num, df in results.items():
-            if not order_included(df):
-                continue
-            missing = df[df["status"] == "MISSING_IN_BL"]
-            for _, row in missing.iterrows():
-                code = row["code_article"]
-                if code not in missing_by_code:
-                    missing_by_code[code] = {"Code article": code, "Qté totale manquante": 0}
-                missing_by_code[code]["Qté totale manquante"] += int(row["qte_commande"])
-        if missing_by_code:
-            df_missing = pd.DataFrame(list(missing_by_code.values()))
-            df_missing = df_missing.sort_values("Qté totale manquante", ascending=False).head(10)
+        articles = aggregates["articles"]
+        missing_articles = articles[articles["n_absentes"] > 0]
+        if not missing_articles.empty:
+            df_missing = top(missing_articles, "qte_absente")
+            df_missing = pd.DataFrame({
+                "Code article": df_missing["code_article"].astype(str).to_numpy(),
+                "Qté totale manquante": df_missing["qte_absente"].astype(int).to_numpy()
+            })
             st.markdown("#### Top 10 des codes articles manquants")
             st.dataframe(df_missing, use_container_width=True, hide_index=True)
         else:
             st.success("✅ Aucun article manquant !")
     with tabs[1]:
         st.markdown("### 🏆 Classement des produits")
-        all_products = []
-        for order_num, df in results.items():
-            if not order_included(df):
-                continue
-            for _, row in df.iterrows():
-                all_products.append({
-                    "Code article": row["code_article"],
-                    "EAN": row["ref"],
-                    "Qté commandée": int(row["qte_commande"]),
-                    "Qté livrée": int(row["qte_bl"])
-                })
-        if all_products:
-            df_products = pd.DataFrame(all_products)
-        else:
-            df_products = pd.DataFrame(columns=["Code article", "EAN", "Qté commandée", "Qté livrée"])
+        articles = aggregates["articles"]
         col1, col2 = st.columns(2)
         with col1:
             st.markdown("#### 📦 Top 10 commandés")
-            if not df_products.empty:
-                top_cmd = df_products.groupby("Code article")["Qté commandée"].sum().sort_values(ascending=False).head(10)
-                st.dataframe(top_cmd.reset_index(), use_container_width=True, hide_index=True)
+            if not articles.empty:
+                top_cmd = top(articles, "qte_commande")
+                st.dataframe(pd.DataFrame({
+                    "Code article": top_cmd["code_article"].astype(str).to_numpy(),
+                    "Qté commandée": top_cmd["qte_commande"].astype(int).to_numpy()
+                }), use_container_width=True, hide_index=True)
             else:
                 st.info("Aucun produit à afficher.")
         with col2:
             st.markdown("#### 📋 Top 10 livrés")
-            if not df_products.empty:
-                top_livre = df_products.groupby("Code article")["Qté livrée"].sum().sort_values(ascending=False).head(10)
-                st.dataframe(top_livre.reset_index(), use_container_width=True, hide_index=True)
+            if not articles.empty:
+                top_livre = top(articles, "qte_bl")
+                st.dataframe(pd.DataFrame({
+                    "Code article": top_livre["code_article"].astype(str).to_numpy(),
+                    "Qté livrée": top_livre["qte_bl"].astype(int).to_numpy()
+                }), use_container_width=True, hide_index=True)
             else:
                 st.info("Aucun produit à afficher.")
+    
+    if st.session_state.user_role == "admin" and st.session_state.show_timings and "timings" in st.session_state:
+        timings = st.session_state.timings
+        with st.expander("⏱️ Performances de la dernière comparaison"):
+            st.markdown("#### Par étape")
+            st.dataframe(pd.DataFrame(timings.summary()), use_container_width=True, hide_index=True)
+            prescreen = timings.prescreen_report()
+            if prescreen is not None:
+                st.caption(
+                    f"Pré-filtre : {prescreen['skipped']}/{prescreen['screened']} page(s) écartée(s) "
+                    f"sans extraction, gain estimé {prescreen['saved_seconds']:.2f} s"
+                )
+            if timings.files:
+                st.markdown("#### Par fichier")
+                df_files = pd.DataFrame([{k: v for k, v in f.items() if k != "pages"} for f in timings.files])
+                st.dataframe(df_files, use_container_width=True, hide_index=True)
+                detailed = [f for f in timings.files if f.get("pages")]
+                if detailed:
+                    st.markdown("#### Par page")
+                    selected_file = st.selectbox("Fichier", range(len(detailed)), format_func=lambda i: detailed[i]["name"])
+                    st.dataframe(pd.DataFrame(detailed[selected_file]["pages"]), use_container_width=True, hide_index=True)
 else:
     st.info("👆 Téléversez vos fichiers et lancez la comparaison pour commencer")
 
@@ -776,6 +959,42 @@ if st.session_state.show_help == "manage_users":
         st.session_state.show_help = False
         st.rerun()
 
+elif st.session_state.show_help == "archive":
+    st.markdown("---")
+    st.markdown("## 🗄️ Commandes archivées")
+    store_stats = line_store.stats()
+    st.caption(
+        f"{store_stats['files'].get('commande', 0)} PDF de commande et {store_stats['files'].get('bl', 0)} BL "
+        f"archivés | {store_stats['lines']:,} lignes | {store_stats['bytes'] / 1024 / 1024:.1f} Mo"
+    )
+    search_col1, search_col2 = st.columns(2)
+    with search_col1:
+        archive_order = st.text_input("🔎 Numéro de commande")
+    with search_col2:
+        archive_ean = st.text_input("🔎 EAN")
+    if archive_order.strip():
+        summary = line_store.order_summary(archive_order.strip())
+        if summary.empty:
+            st.info("Aucune ligne archivée pour cette commande")
+        else:
+            st.markdown("#### Commandé / livré par article")
+            st.dataframe(summary, use_container_width=True, hide_index=True)
+            st.markdown("#### Lignes archivées")
+            st.dataframe(line_store.order_lines(archive_order.strip()), use_container_width=True, hide_index=True)
+    elif archive_ean.strip():
+        if not re.fullmatch(r"[0-9]+", archive_ean.strip()):
+            st.error("⚠️ L'EAN ne doit contenir que des chiffres")
+        else:
+            ean_lines = line_store.ean_lines(archive_ean.strip())
+            if ean_lines.empty:
+                st.info("Aucune ligne archivée pour cet EAN")
+            else:
+                st.dataframe(ean_lines, use_container_width=True, hide_index=True)
+    
+    if st.button("↩️ Retour", type="secondary"):
+        st.session_state.show_help = False
+        st.rerun()
+
 elif st.session_state.show_help == "guide":
     st.markdown("---")
     st.markdown("## 📖 Guide d'utilisation")
@@ -791,7 +1010,7 @@ elif st.session_state.show_help == "guide":
         
         3. **Consultez les résultats** :
            - Détails par commande
-           - Rapport Excel téléchargeable
+           - Rapport Excel, ou table longue Parquet / CSV, téléchargeable
            - Statistiques et KPIs
         """)
     
@@ -810,7 +1029,7 @@ elif st.session_state.show_help == "guide":
     with st.expander("⚙️ Options avancées"):
         st.markdown("""
         ### Masquer les commandes sans correspondance
-        Exclut de l'export Excel les commandes qui n'ont pas de BL correspondant.
+        Exclut des exports les commandes qui n'ont pas de BL correspondant.
         
         ### Historique
         Toutes vos comparaisons sont sauvegardées temporairement dans la session.
@@ -826,3 +1045,5 @@ st.markdown("""
     <strong>Powered by IC - 2025</strong>
 </div>
 """, unsafe_allow_html=True)
+
+record_rerun(page_state(job))
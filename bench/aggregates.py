@@ -0,0 +1,150 @@
+"""Temps d'une réexécution de l'interface : totaux recalculés par commande (origine) contre agrégats précalculés.
+
+La partie « calcul » d'une réexécution de la section résultats est rejouée
+sans Streamlit : KPIs, en-têtes des expanders, graphique des taux de
+service (et son équivalent sans Plotly), onglets Statistiques et Top
+produits, Récapitulatif Excel. L'origine refait ces calculs commande par
+commande (order_included, iterrows) à chaque réexécution ; la nouvelle
+version relit les tables de aggregates.summarize, calculées une fois à la
+comparaison. Les valeurs affichées doivent être identiques ; le code de
+sortie vaut 1 sinon.
+
+Usage : python -m bench.aggregates [--orders 2000] [--lines-per-order 50] [--reruns 5]
+"""
+import argparse
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from bench.compare import records_frame_input, synthetic_records
+from desathor.aggregates import summarize, top
+from desathor.compare import compare_records
+from desathor.export import summary_frame
+
+
+def legacy_rerun(results, hide_unmatched):
+    """Calculs de l'ancienne section résultats, tels qu'ils étaient faits à chaque réexécution"""
+    def order_included(df):
+        total_bl = df["qte_bl"].sum() if "qte_bl" in df.columns else 0
+        if hide_unmatched and total_bl == 0:
+            return False
+        return True
+
+    total_commande = sum([df["qte_commande"].sum() for df in results.values() if order_included(df)])
+    total_livre = sum([df["qte_bl"].sum() for df in results.values() if order_included(df)])
+    taux_service_global = (total_livre / total_commande * 100) if total_commande > 0 else 0
+    total_articles_ok = sum([(df["status"] == "OK").sum() for df in results.values() if order_included(df)])
+    total_articles_diff = sum([(df["status"] == "QTY_DIFF").sum() for df in results.values() if order_included(df)])
+    total_articles_missing = sum([(df["status"] == "MISSING_IN_BL").sum() for df in results.values()
+                                  if order_included(df)])
+    headers = []
+    for order_num, df in results.items():
+        if not order_included(df):
+            continue
+        total_cmd = df["qte_commande"].sum()
+        total_bl = df["qte_bl"].sum()
+        taux = (total_bl / total_cmd * 100) if total_cmd > 0 else 0
+        headers.append((order_num, round(taux, 6), (df["status"] == "OK").sum(), (df["status"] == "QTY_DIFF").sum(),
+                        (df["status"] == "MISSING_IN_BL").sum(), int(total_cmd), int(total_bl)))
+    # Graphique des taux et repli sans Plotly : même boucle, faite deux fois selon le cas
+    service_rates = []
+    for order_num, df in results.items():
+        if not order_included(df):
+            continue
+        total_cmd = df["qte_commande"].sum()
+        total_bl = df["qte_bl"].sum()
+        service_rates.append(round((total_bl / total_cmd * 100) if total_cmd > 0 else 0, 6))
+    missing_by_code = {}
+    for order_num, df in results.items():
+        if not order_included(df):
+            continue
+        for _, row in df[df["status"] == "MISSING_IN_BL"].iterrows():
+            code = row["code_article"]
+            missing_by_code[code] = missing_by_code.get(code, 0) + int(row["qte_commande"])
+    all_products = []
+    for order_num, df in results.items():
+        if not order_included(df):
+            continue
+        for _, row in df.iterrows():
+            all_products.append({"Code article": row["code_article"], "EAN": row["ref"],
+                                 "Qté commandée": int(row["qte_commande"]), "Qté livrée": int(row["qte_bl"])})
+    df_products = pd.DataFrame(all_products)
+    by_code = df_products.groupby("Code article")[["Qté commandée", "Qté livrée"]].sum()
+    return {
+        "totals": (int(total_commande), int(total_livre), round(taux_service_global, 6),
+                   int(total_articles_ok), int(total_articles_diff), int(total_articles_missing)),
+        "headers": headers,
+        "rates": service_rates,
+        "missing": {str(code): qty for code, qty in missing_by_code.items()},
+        "ordered": {str(code): int(qty) for code, qty in by_code["Qté commandée"].items()},
+        "delivered": {str(code): int(qty) for code, qty in by_code["Qté livrée"].items()},
+    }
+
+
+def rerun(aggregates):
+    """Mêmes valeurs, relues dans les agrégats précalculés"""
+    totals = aggregates["totals"]
+    order_stats = aggregates["orders"][aggregates["orders"]["included"]]
+    articles = aggregates["articles"]
+    missing = articles[articles["n_absentes"] > 0]
+    summary_frame(order_stats)
+    top(missing, "qte_absente")
+    top(articles, "qte_commande")
+    top(articles, "qte_bl")
+    return {
+        "totals": (int(totals["qte_commande"]), int(totals["qte_bl"]), round(totals["taux_service"], 6),
+                   totals["n_ok"], totals["n_diff"], totals["n_missing"]),
+        "headers": [(o.order_num, round(o.taux_service, 6), o.n_ok, o.n_diff, o.n_missing, int(o.qte_commande),
+                     int(o.qte_bl)) for o in order_stats.itertuples(index=False)],
+        "rates": [round(rate, 6) for rate in order_stats["taux_service"]],
+        "missing": dict(zip(missing["code_article"].astype(str), missing["qte_absente"].astype(int))),
+        "ordered": dict(zip(articles["code_article"].astype(str), articles["qte_commande"].astype(int))),
+        "delivered": dict(zip(articles["code_article"].astype(str), articles["qte_bl"].astype(int))),
+    }
+
+
+def timed(fn, *args, repeat=1):
+    seconds = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        seconds.append(time.perf_counter() - t0)
+    return out, statistics.median(seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--lines-per-order", type=int, default=50)
+    parser.add_argument("--reruns", type=int, default=5)
+    args = parser.parse_args()
+
+    command_records, bl_records = synthetic_records(args.orders * args.lines_per_order, args.lines_per_order)
+    comparison = compare_records(records_frame_input(command_records, "commande"),
+                                 records_frame_input(bl_records, "bl"))
+    print(f"{len(comparison['results'])} commandes, {len(comparison['table'])} lignes")
+    mismatches = []
+    for hide_unmatched in (True, False):
+        expected, before = timed(legacy_rerun, comparison["results"], hide_unmatched, repeat=min(args.reruns, 2))
+        aggregates, once = timed(summarize, comparison["table"], hide_unmatched, repeat=args.reruns)
+        actual, after = timed(rerun, aggregates, repeat=args.reruns)
+        print(f"hide_unmatched={hide_unmatched!s:<5} | réexécution avant {before * 1000:>9.1f} ms | "
+              f"après {after * 1000:>7.1f} ms | x{before / after:.0f} | agrégats (une fois) {once * 1000:.1f} ms")
+        for name in expected:
+            same = expected[name] == actual[name]
+            if name in ("rates",):
+                same = np.allclose(expected[name], actual[name])
+            if not same:
+                mismatches.append(f"hide_unmatched={hide_unmatched} : {name} différent")
+    for message in mismatches:
+        print("ÉCART " + message)
+    if not mismatches:
+        print("Valeurs affichées identiques (KPIs, commandes, taux, onglets)")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""Extraction d'une archive ZIP membre par membre : résultat identique, mémoire bornée.
+
+Le corpus synthétique (bench.corpus) est placé dans une archive : la moitié
+des PDF sous un nom qui dit leur type (commandes/commande_001.pdf, bl/...),
+les autres sous un nom neutre (scan_003.pdf) à classer d'après leurs
+premières pages (la première est un bordereau sans données), plus un PDF
+sans données (à ignorer) et un fichier texte. La comparaison de l'archive
+doit être identique à celle des mêmes PDF fournis séparément, chaque membre
+doit être classé dans son type par la règle attendue, le PDF sans
+données doit être signalé sans bloquer les autres, et un second passage
+servi par le cache d'extraction doit donner la même comparaison.
+
+La mémoire du processus appelant (tracemalloc, extraction dans les
+processus) est mesurée pour des archives de tailles croissantes : lignes
+extraites conservées d'une part, pic de travail au-delà de ces lignes
+d'autre part, à côté du volume des PDF décompressés, que la lecture de tous
+les fichiers d'un coup garde en mémoire. Le code de sortie vaut 1 en cas
+d'écart, ou si le pic de travail grandit avec l'archive.
+
+Usage : python -m bench.archive [--orders 30] [--files 2,8] [--filler 10] [--workers 2] [--backend pdfminer]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+from bench.corpus import filler_pages, write_corpus, write_pdf
+from desathor.archive import parse_archive
+from desathor.backends import BACKENDS, DEFAULT_BACKEND
+from desathor.cache import ParseCache
+from desathor.core import run_comparison
+
+
+def build_archive(out_dir, n_orders, n_files, filler):
+    """Archive du corpus ; retourne (chemin, [(kind, nom, contenu)] dans l'ordre de l'archive, membres attendus)"""
+    meta = write_corpus(os.path.join(out_dir, "corpus"), n_orders, n_files, filler=filler)
+    notice = os.path.join(out_dir, "notice.pdf")
+    write_pdf(notice, filler_pages(2, "Notice d'utilisation"))
+    path = os.path.join(out_dir, f"lot_{n_files}.zip")
+    files, expected = [], {}
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for k, f in enumerate(meta["files"]):
+            base = os.path.basename(f["path"])
+            if k % 2:
+                name, rule = f"scan_{k + 1:03d}.pdf", "contenu"
+            else:
+                name, rule = f"{'commandes' if f['kind'] == 'commande' else 'bl'}/{base}", "nom"
+            with open(f["path"], "rb") as src:
+                data = src.read()
+            zf.writestr(name, data)
+            files.append((f["kind"], name, data))
+            expected[name] = (f["kind"], rule)
+        zf.write(notice, "divers/notice.pdf")
+        expected["divers/notice.pdf"] = (None, None)
+        zf.writestr("LISEZMOI.txt", "Lot de documents fournisseur")
+    return path, files, expected
+
+
+def check(path, files, expected, workers, backend, cache_dir):
+    errors = []
+    cache = ParseCache(cache_dir=cache_dir)
+    run = run_comparison([], workers=workers, cache=cache, backend=backend, archives=[path])
+    # Deuxième passage : tous les membres reconnus viennent du cache
+    cached = run_comparison([], workers=workers, cache=ParseCache(cache_dir=cache_dir), backend=backend,
+                            archives=[path])
+    if not cached["comparison"]["table"].equals(run["comparison"]["table"]):
+        errors.append("table différente au second passage (cache)")
+    plain = run_comparison(files, workers=workers, backend=backend)
+    for name, res in ((res["name"], res) for res in run["parsed"] + run["skipped"]):
+        got = (res["kind"], res["classified_by"])
+        if got != expected.get(name):
+            errors.append(f"{name} classé {got} au lieu de {expected.get(name)}")
+    missing = expected.keys() - {res["name"] for res in run["parsed"] + run["skipped"]}
+    if missing:
+        errors.append("membres absents : " + ", ".join(sorted(missing)))
+    if [res["name"] for res in run["skipped"]] != ["divers/notice.pdf"]:
+        errors.append(f"membres ignorés : {[res['name'] for res in run['skipped']]}")
+    if [res["name"] for res in run["errors"]] != ["divers/notice.pdf"]:
+        errors.append(f"membres en erreur : {[res['name'] for res in run['errors']]}")
+    for key in ("table", "bl"):
+        if not run["comparison"][key].equals(plain["comparison"][key]):
+            errors.append(f"{key} différent de la comparaison des fichiers séparés")
+    return errors
+
+
+def peak_memory(path, workers, backend):
+    """(octets conservés par les résultats, pic au-delà, secondes) de parse_archive dans le processus appelant"""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    results = parse_archive(path, workers=workers, backend=backend)
+    seconds = time.perf_counter() - t0
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+    return retained, peak - retained, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=30, help="commandes par paire de fichiers")
+    parser.add_argument("--files", default="2,8", help="paires commande/BL par archive, une archive par valeur")
+    parser.add_argument("--filler", type=int, default=10, help="pages sans données par PDF")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--backend", choices=list(BACKENDS), default=DEFAULT_BACKEND)
+    args = parser.parse_args()
+
+    errors = []
+    measures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_files in [int(n) for n in args.files.split(",")]:
+            out_dir = os.path.join(tmp, str(n_files))
+            path, files, expected = build_archive(out_dir, args.orders * n_files, n_files, args.filler)
+            errors += [f"{n_files} paire(s) : {message}" for message in
+                       check(path, files, expected, args.workers, args.backend, os.path.join(out_dir, "cache"))]
+            retained, peak, seconds = peak_memory(path, args.workers, args.backend)
+            volume = sum(len(data) for _, _, data in files)
+            measures.append((peak, volume))
+            print(f"{len(expected)} PDF | archive {os.path.getsize(path) / 1e6:.1f} Mo, PDF décompressés "
+                  f"{volume / 1e6:.1f} Mo | lignes conservées {retained / 1e6:.1f} Mo, pic de travail "
+                  f"{peak / 1e6:.1f} Mo | {seconds:.1f} s")
+
+    if len(measures) > 1:
+        (first_peak, first_volume), (last_peak, last_volume) = measures[0], measures[-1]
+        peak_growth = last_peak - first_peak
+        volume_growth = last_volume - first_volume
+        print(f"le pic de travail varie de {peak_growth / 1e6:+.1f} Mo pour {volume_growth / 1e6:.1f} Mo de PDF "
+              f"en plus")
+        if peak_growth > volume_growth / 4:
+            errors.append("le pic de travail suit la taille de l'archive")
+
+    for message in errors:
+        print("ÉCART " + message)
+    if not errors:
+        print("Comparaison identique aux fichiers séparés, membres classés comme attendu")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
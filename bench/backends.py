@@ -0,0 +1,89 @@
+"""Équivalence et vitesse des moteurs d'extraction du texte.
+
+Chaque PDF est extrait avec chacun des moteurs de desathor.backends ; les
+lignes extraites (commande, EAN, code article, quantité) et les numéros de
+commande doivent être identiques à ceux du moteur de référence (pdfplumber).
+Le code de sortie vaut 1 si un fichier diffère.
+
+Corpus synthétique par défaut, ou dossiers de PDF réels avec --orders/--bl.
+
+Usage : python -m bench.backends [--orders-count 200] [--files 2]
+                                 [--orders DOSSIER] [--bl DOSSIER]
+"""
+import argparse
+import io
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from bench.corpus import write_corpus
+from desathor.backends import BACKENDS
+from desathor.core import list_pdfs
+from desathor.parallel import PARSERS
+
+REFERENCE = "pdfplumber"
+
+
+def extract(kind, data, backend):
+    t0 = time.perf_counter()
+    res = PARSERS[kind](io.BytesIO(data), backend=backend)
+    seconds = time.perf_counter() - t0
+    assert not res.get("error"), res["error"]
+    frame = res["records"].to_frame()
+    if "code_article" in frame.columns:
+        frame["code_article"] = frame["code_article"].astype(str)
+    return frame, res["order_numbers"], seconds
+
+
+def check_files(files):
+    """[(kind, chemin)] -> (temps total par moteur, fichiers en écart)"""
+    totals = dict.fromkeys(BACKENDS, 0.0)
+    mismatches = []
+    for kind, path in files:
+        with open(path, "rb") as f:
+            data = f.read()
+        results = {}
+        for backend in BACKENDS:
+            results[backend] = extract(kind, data, backend)
+            totals[backend] += results[backend][2]
+        ref_frame, ref_orders, _ = results[REFERENCE]
+        for backend, (frame, orders, _) in results.items():
+            try:
+                pd.testing.assert_frame_equal(frame, ref_frame)
+                assert orders == ref_orders, "numéros de commande différents"
+            except AssertionError as e:
+                mismatches.append((path, backend, str(e).splitlines()[0]))
+    return totals, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders-count", type=int, default=200, help="commandes du corpus synthétique")
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--orders", help="dossier de PDF de commande réels")
+    parser.add_argument("--bl", help="dossier de PDF de BL réels")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.orders or args.bl:
+            files = [("commande", p) for p in (list_pdfs(args.orders) if args.orders else [])]
+            files += [("bl", p) for p in (list_pdfs(args.bl) if args.bl else [])]
+        else:
+            meta = write_corpus(tmp, args.orders_count, args.files)
+            files = [(f["kind"], f["path"]) for f in meta["files"]]
+        totals, mismatches = check_files(files)
+
+    print(f"{len(files)} fichier(s)")
+    for backend, seconds in totals.items():
+        print(f"{backend:12s} {seconds:>7.2f} s | x{totals[REFERENCE] / seconds:.1f}")
+    for path, backend, message in mismatches:
+        print(f"ÉCART {backend} {path} : {message}")
+    if not mismatches:
+        print("Lignes extraites identiques pour tous les moteurs")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
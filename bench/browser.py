@@ -0,0 +1,124 @@
+"""Détails par commande : un Styler par commande retenue (origine) contre navigateur paginé.
+
+Mesure le travail de préparation d'une réexécution : l'origine construit
+et calcule un Styler (applymap sur status) pour chaque commande retenue ;
+le navigateur filtre sur l'index (browser.OrderIndex, construit une fois
+par comparaison) puis ne met en forme que la page visible. Vérifie aussi,
+contre un calcul direct sur la table longue, les filtres par statut, taux
+de service, numéro de commande et EAN, et les couleurs des lignes. Le code
+de sortie vaut 1 en cas d'écart.
+
+Usage : python -m bench.browser [--orders 2000] [--lines-per-order 50] [--page-size 10]
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from bench.compare import records_frame_input, synthetic_records
+from desathor.aggregates import summarize
+from desathor.browser import OrderIndex, page_rows
+from desathor.compare import compare_records
+
+
+def color_status(val):
+    if val == "OK":
+        return "background-color: #d4edda"
+    if val == "QTY_DIFF":
+        return "background-color: #fff3cd"
+    if val == "MISSING_IN_BL":
+        return "background-color: #f8d7da"
+    return ""
+
+
+def legacy_render(results, order_stats):
+    cells = 0
+    for order_num in order_stats["order_num"]:
+        styler = results[order_num].style
+        # applymap dans l'interface d'origine, renommé map depuis pandas 2.1
+        (getattr(styler, "map", None) or styler.applymap)(color_status, subset=["status"])._compute()
+        cells += results[order_num].size
+    return cells
+
+
+def paged_render(index, results, statuses, rate_range, query, page_size):
+    cells = 0
+    for order_num in page_rows(index.filter(statuses, rate_range, query), 1, page_size)["order_num"]:
+        start, stop = results.span(order_num)
+        df = results[order_num]
+        index.style(df, start, stop)._compute()
+        cells += df.size
+    return cells
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def check_filters(index, table, orders):
+    """Écarts entre OrderIndex.filter et un calcul direct sur la table longue"""
+    errors = []
+    included = orders[orders["included"]]
+    lines = table[table["order_num"].isin(included["order_num"])]
+    for status in ("OK", "QTY_DIFF", "MISSING_IN_BL"):
+        expected = set(lines.loc[lines["status"] == status, "order_num"])
+        if set(index.filter([status])["order_num"]) != expected:
+            errors.append(f"filtre statut {status}")
+    expected = set(included.loc[included["taux_service"].between(50, 90), "order_num"])
+    if set(index.filter(rate_range=(50, 90))["order_num"]) != expected:
+        errors.append("filtre taux de service")
+    rng = np.random.default_rng(0)
+    for ean in rng.choice(lines["ref"].unique(), 20):
+        expected = set(lines.loc[lines["ref"] == ean, "order_num"])
+        if set(index.filter(query=ean)["order_num"]) != expected:
+            errors.append(f"recherche EAN {ean}")
+    order = str(included["order_num"].iloc[len(included) // 2])
+    expected = {o for o in included["order_num"] if order[:-1] in str(o)}
+    if set(index.filter(query=order[:-1])["order_num"]) != expected:
+        errors.append(f"recherche commande {order[:-1]}")
+    if list(index.colors) != [color_status(v) for v in table["status"]]:
+        errors.append("couleurs des lignes")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--lines-per-order", type=int, default=50)
+    parser.add_argument("--page-size", type=int, default=10)
+    args = parser.parse_args()
+
+    command_records, bl_records = synthetic_records(args.orders * args.lines_per_order, args.lines_per_order)
+    comparison = compare_records(records_frame_input(command_records, "commande"),
+                                 records_frame_input(bl_records, "bl"))
+    table, results = comparison["table"], comparison["results"]
+    aggregates = summarize(table, True)
+    orders = aggregates["orders"]
+    included = orders[orders["included"]]
+    print(f"{len(results)} commandes ({len(included)} retenues), {len(table)} lignes")
+
+    cells_before, before = timed(legacy_render, results, included)
+    index, build = timed(OrderIndex, table, orders)
+    print(f"avant : {len(included)} Styler | {before * 1000:>8.1f} ms par réexécution | {cells_before:,} cellules envoyées")
+    print(f"index : {build * 1000:.1f} ms, une fois par comparaison")
+    for label, filters in (
+        ("sans filtre", (None, None, "")),
+        ("manquants, taux < 90 %", (["MISSING_IN_BL"], (0, 90), "")),
+        ("recherche EAN", (None, None, table["ref"].iloc[len(table) // 3])),
+    ):
+        cells, after = timed(paged_render, index, results, *filters, args.page_size)
+        print(f"après ({label:<22}) : {after * 1000:>7.1f} ms | {cells:,} cellules | x{before / after:.0f}")
+
+    errors = check_filters(index, table, orders)
+    for message in errors:
+        print("ÉCART " + message)
+    if not errors:
+        print("Filtres et couleurs identiques au calcul direct")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""Benchmark de la comparaison commandes / BL : fusion par commande + apply (origine)
+contre groupby et jointure uniques (desathor.compare).
+
+Usage : python -m bench.compare [--lines 10000 100000 1000000] [--legacy-max 100000]
+"""
+import argparse
+import random
+import time
+from collections import defaultdict
+
+import pandas as pd
+
+from desathor.compare import compare_records
+from desathor.records import QTY_COLUMN, RecordBuilder
+
+
+# --- Référence : une fusion et deux apply(axis=1) par commande ---
+
+def calculate_service_rate(qte_cmd, qte_bl):
+    if pd.isna(qte_bl) or qte_cmd == 0:
+        return 0
+    return min((qte_bl / qte_cmd) * 100, 100)
+
+
+def legacy_compare(command_records, bl_records):
+    commandes_dict = defaultdict(list)
+    for rec in command_records:
+        commandes_dict[rec["order_num"]].append(rec)
+    for k in commandes_dict.keys():
+        df = pd.DataFrame(commandes_dict[k])
+        commandes_dict[k] = df.groupby(["ref", "code_article"], as_index=False).agg({"qte_commande": "sum"})
+    bls_dict = defaultdict(list)
+    for rec in bl_records:
+        bls_dict[rec["order_num"]].append(rec)
+    for k in bls_dict.keys():
+        df = pd.DataFrame(bls_dict[k])
+        bls_dict[k] = df.groupby("ref", as_index=False).agg({"qte_bl": "sum"})
+    results = {}
+    for order_num, df_cmd in commandes_dict.items():
+        df_bl = bls_dict.get(order_num, pd.DataFrame(columns=["ref", "qte_bl"]))
+        merged = pd.merge(df_cmd, df_bl, on="ref", how="left")
+        merged["qte_commande"] = pd.to_numeric(merged["qte_commande"], errors="coerce").fillna(0)
+        merged["qte_bl"] = pd.to_numeric(merged.get("qte_bl", pd.Series()), errors="coerce").fillna(0)
+
+        def status_row(r):
+            if r["qte_bl"] == 0:
+                return "MISSING_IN_BL"
+            return "OK" if r["qte_commande"] == r["qte_bl"] else "QTY_DIFF"
+        merged["status"] = merged.apply(status_row, axis=1)
+        merged["diff"] = merged["qte_bl"] - merged["qte_commande"]
+        merged["taux_service"] = merged.apply(
+            lambda r: calculate_service_rate(r["qte_commande"], r["qte_bl"]), axis=1
+        )
+        results[order_num] = merged
+    return results
+
+
+def random_ean(rng):
+    return rng.choice(["300", "311", "540", "400"]) + "".join(rng.choice("0123456789") for _ in range(10))
+
+
+def synthetic_records(n_lines, lines_per_order=50, seed=0):
+    """Lignes de commande et de BL : ~50 lignes par commande, livraisons partielles ou manquantes"""
+    rng = random.Random(seed)
+    eans = [random_ean(rng) for _ in range(5000)]
+    command_records, bl_records = [], []
+    order = 4500000
+    while len(command_records) < n_lines:
+        order_num = str(order)
+        for _ in range(lines_per_order):
+            ean = rng.choice(eans)
+            qte = rng.randint(1, 60)
+            command_records.append({"ref": ean, "code_article": str(rng.randint(1000, 1500)),
+                                    "qte_commande": qte, "order_num": order_num})
+            roll = rng.random()
+            if roll < 0.8:
+                bl_records.append({"ref": ean, "qte_bl": float(qte), "order_num": order_num})
+            elif roll < 0.9:
+                bl_records.append({"ref": ean, "qte_bl": float(rng.randint(1, qte)), "order_num": order_num})
+        order += 1
+    return command_records[:n_lines], bl_records
+
+
+def records_frame_input(records, kind):
+    builder = RecordBuilder(kind)
+    qty = QTY_COLUMN[kind]
+    for rec in records:
+        builder.append(rec["order_num"], rec["ref"], rec[qty], rec.get("code_article", ""))
+    return builder.finish()
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - t0, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--legacy-max", type=int, default=100000,
+                        help="au-delà, la référence n'est pas mesurée (plusieurs minutes)")
+    args = parser.parse_args()
+
+    for n_lines in args.lines:
+        command_records, bl_records = synthetic_records(n_lines)
+        # Entrée au format produit par les extracteurs
+        command_columns = records_frame_input(command_records, "commande")
+        bl_columns = records_frame_input(bl_records, "bl")
+        after, comparison = timed(compare_records, command_columns, bl_columns)
+        line = f"{n_lines:>8d} lignes | {len(comparison['results']):>6d} commandes | après {after:>7.2f} s"
+        if n_lines <= args.legacy_max:
+            before, legacy = timed(legacy_compare, command_records, bl_records)
+            assert list(legacy) == list(comparison["results"]), "ordre des commandes différent"
+            for order_num, df in legacy.items():
+                view = comparison["results"][order_num]
+                view = view.assign(code_article=view["code_article"].astype(str))
+                pd.testing.assert_frame_equal(df, view, check_dtype=False, check_index_type=False)
+            line += f" | avant {before:>7.2f} s | x{before / after:.1f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
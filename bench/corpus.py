@@ -0,0 +1,220 @@
+"""Génération de PDF de test (commandes et BL) sans dépendance externe.
+
+Usage : python -m bench.corpus --out DIR [--orders 200] [--lines-per-order 40] [--files 4] [--filler 0]
+"""
+import argparse
+import os
+import random
+
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+LINE_HEIGHT = 12
+TOP = 800
+BOTTOM = 50
+LINES_PER_PAGE = (TOP - BOTTOM) // LINE_HEIGHT
+
+
+def _escape(text):
+    raw = text.encode("cp1252", errors="replace")
+    return raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def write_pdf(path_or_file, pages):
+    """Écrit un PDF minimal : une page par liste de lignes, police Helvetica (WinAnsi)"""
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(None)
+    pages_id = add(None)
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    page_ids = []
+    for lines in pages:
+        stream = [b"BT /F1 9 Tf"]
+        y = TOP
+        for line in lines:
+            stream.append(b"1 0 0 1 40 %d Tm (%s) Tj" % (y, _escape(line)))
+            y -= LINE_HEIGHT
+        stream.append(b"ET")
+        content = b"\n".join(stream)
+        content_id = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+            % (pages_id, PAGE_WIDTH, PAGE_HEIGHT, font_id, content_id)
+        ))
+    objects[catalog_id - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+    kids = b" ".join(b"%d 0 R" % pid for pid in page_ids)
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog_id, xref
+    )
+    if hasattr(path_or_file, "write"):
+        path_or_file.write(bytes(out))
+    else:
+        with open(path_or_file, "wb") as f:
+            f.write(out)
+
+
+def random_ean(rng, excluded_rate=0.1):
+    if rng.random() < excluded_rate:
+        prefix = rng.choice(["302", "376"])
+    else:
+        prefix = rng.choice(["300", "311", "340", "400", "540", "800"])
+    return prefix + "".join(rng.choice("0123456789") for _ in range(10))
+
+
+def paginate(lines, lines_per_page=LINES_PER_PAGE):
+    return [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+
+
+def bl_pages(n_pages, seed=0, first_order=4500000):
+    """Pages d'un BL : blocs "Bon de Livraison Nr." suivis de lignes EAN / quantité"""
+    rng = random.Random(seed)
+    lines = []
+    order = first_order
+    while len(lines) < n_pages * LINES_PER_PAGE:
+        lines.append(f"Bon de Livraison Nr. {order}")
+        for i in range(rng.randint(15, 60)):
+            lines.append(
+                f"{random_ean(rng)} Article de test {rng.randint(1, 60)},00 {rng.randint(1, 99)}.{rng.randint(0, 99):02d}"
+            )
+        order += 1
+    return paginate(lines[:n_pages * LINES_PER_PAGE])
+
+
+def order_book(n_orders, seed=0, first_order=4500000, lines_per_order=(10, 60)):
+    """Commandes aléatoires : [(order_num, [(code_article, ean, qte), ...]), ...]"""
+    rng = random.Random(seed)
+    book = []
+    for k in range(n_orders):
+        lines = [
+            (str(rng.randint(1000, 99999)), random_ean(rng), rng.randint(1, 60))
+            for _ in range(rng.randint(*lines_per_order))
+        ]
+        book.append((str(first_order + k), lines))
+    return book
+
+
+def command_pages(book, lines_per_page=LINES_PER_PAGE):
+    """Pages d'un PDF de commande au format fournisseur.
+
+    Chaque page reprend "Commande n°" et l'en-tête "L Réf. frn Code ean" et
+    se termine par "Page N" ; chaque commande se clôt par un "Récapitulatif".
+    Le bloc adresse contient un EAN hors tableau, qui ne doit pas être lu."""
+    pages = []
+    page = []
+
+    def start_page(order_num, continued=False):
+        page.append(f"Commande n° {order_num} du 12/03/2025" + (" (suite)" if continued else ""))
+        page.append("Livraison : Entrepôt Nord, 59000 Lille - GLN 3012345678901")
+        page.append("L Réf. frn Code ean Libellé Qté UC")
+
+    def end_page():
+        page.append(f"Page {len(pages) + 1}")
+        pages.append(list(page))
+        page.clear()
+
+    for order_num, lines in book:
+        start_page(order_num)
+        for i, (code, ean, qte) in enumerate(lines, start=1):
+            if len(page) >= lines_per_page - 1:
+                end_page()
+                start_page(order_num, continued=True)
+            page.append(f"{i} {code} {ean} Article de test {qte} {random.Random(i).randint(1, 12)}")
+        if len(page) >= lines_per_page - 4:
+            end_page()
+            start_page(order_num, continued=True)
+        page.append("Récapitulatif")
+        page.append(f"Nombre de lignes {len(lines)}")
+        page.append(f"Total {sum(q for _, _, q in lines)} unités")
+        end_page()
+    return pages
+
+
+def delivery_pages(book, seed=0, missing_rate=0.1, partial_rate=0.1):
+    """Pages du BL correspondant : livraisons complètes, partielles ou manquantes"""
+    rng = random.Random(seed)
+    lines = []
+    for order_num, order_lines in book:
+        lines.append(f"Bon de Livraison Nr. {order_num}")
+        for _, ean, qte in order_lines:
+            roll = rng.random()
+            if roll < missing_rate:
+                continue
+            if roll < missing_rate + partial_rate:
+                qte = rng.randint(0, qte)
+            lines.append(f"{ean} Article de test {qte},00 {rng.randint(1, 99)}.{rng.randint(0, 99):02d}")
+    return paginate(lines)
+
+
+def filler_pages(n_pages, title="Conditions générales de vente"):
+    """Pages sans données (couverture, conditions générales) : ni EAN ni numéro de commande"""
+    pages = []
+    for k in range(n_pages):
+        lines = [title, "Document fournisseur - ne pas retourner", ""]
+        for i in range(1, LINES_PER_PAGE - 5):
+            lines.append(f"Article {i}. Les marchandises voyagent aux risques du destinataire (édition 12/03/2025).")
+        lines.append(f"Page {k + 1}")
+        pages.append(lines)
+    return pages
+
+
+def count_lines(pages):
+    return sum(len(lines) for lines in pages)
+
+
+def write_corpus(out_dir, n_orders, n_files=1, seed=0, lines_per_order=(10, 60), filler=0):
+    """Écrit n_files PDF de commande (orders/) et de BL (bl/) couvrant n_orders commandes.
+
+    filler : pages sans données ajoutées à chaque PDF (une couverture en tête,
+    les autres en conditions générales à la fin). Retourne les métadonnées du corpus (chemins, pages et lignes par fichier)."""
+    book = order_book(n_orders, seed=seed, lines_per_order=lines_per_order)
+    per_file = -(-len(book) // n_files)
+    meta = {"orders": n_orders, "files": []}
+    for kind, folder, make_pages in (
+        ("commande", "orders", command_pages),
+        ("bl", "bl", lambda part: delivery_pages(part, seed=seed)),
+    ):
+        os.makedirs(os.path.join(out_dir, folder), exist_ok=True)
+        for k in range(n_files):
+            part = book[k * per_file:(k + 1) * per_file]
+            if not part:
+                continue
+            pages = make_pages(part)
+            if filler:
+                pages = filler_pages(1, "Bordereau d'envoi") + pages + filler_pages(filler - 1)
+            path = os.path.join(out_dir, folder, f"{kind}_{k + 1:03d}.pdf")
+            write_pdf(path, pages)
+            meta["files"].append({"kind": kind, "path": path, "pages": len(pages), "lines": count_lines(pages)})
+    return meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--lines-per-order", type=int, nargs=2, default=[10, 60], metavar=("MIN", "MAX"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--filler", type=int, default=0, help="pages sans données par PDF")
+    args = parser.parse_args()
+    meta = write_corpus(args.out, args.orders, args.files, args.seed, tuple(args.lines_per_order), args.filler)
+    for f in meta["files"]:
+        print(f"{f['path']} : {f['pages']} pages, {f['lines']} lignes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Temps de génération du rapport Excel : ExcelWriter + iterrows/set_row (origine)
+contre desathor.export (constant_memory, mise en forme conditionnelle par plage).
+
+La table longue (write_long_report) est ensuite écrite en Parquet et en CSV
+aux côtés du classeur : temps et taille de chaque format. Relue, elle doit
+contenir exactement les lignes des feuilles C_<commande> (mêmes commandes
+retenues, mêmes valeurs), et son récapitulatif la feuille Récapitulatif. Le
+code de sortie vaut 1 en cas d'écart.
+
+Usage : python -m bench.export [--orders 2000] [--lines-per-order 50]
+"""
+import argparse
+import io
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from bench.compare import records_frame_input, synthetic_records
+from desathor.aggregates import summarize
+from desathor.compare import RESULT_COLUMNS, compare_records
+from desathor.export import LONG_FORMATS, SUMMARY_COLUMNS, write_excel_report, write_long_report
+
+
+def legacy_export(results, hide_unmatched, output):
+    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
+        for order_num, df in results.items():
+            total_bl = df["qte_bl"].sum() if "qte_bl" in df.columns else 0
+            if hide_unmatched and total_bl == 0:
+                continue
+            df_export = df.copy()
+            sheet_name = f"C_{order_num}"[:31]
+            df_export.to_excel(writer, sheet_name=sheet_name, index=False)
+            workbook = writer.book
+            worksheet = writer.sheets[sheet_name]
+            ok_format = workbook.add_format({'bg_color': '#d4edda'})
+            diff_format = workbook.add_format({'bg_color': '#fff3cd'})
+            miss_format = workbook.add_format({'bg_color': '#f8d7da'})
+            for idx, row in df_export.iterrows():
+                excel_row = idx + 1
+                if row.get('status') == 'OK':
+                    worksheet.set_row(excel_row, None, ok_format)
+                elif row.get('status') == 'QTY_DIFF':
+                    worksheet.set_row(excel_row, None, diff_format)
+                elif row.get('status') == 'MISSING_IN_BL':
+                    worksheet.set_row(excel_row, None, miss_format)
+        summary_data = {
+            'Commande': [],
+            'Taux de service (%)': [],
+            'Qté commandée': [],
+            'Qté livrée': [],
+            'Qté manquante': [],
+            'Articles OK': [],
+            'Articles différence': [],
+            'Articles manquants': []
+        }
+        for order_num, df in results.items():
+            total_bl = df["qte_bl"].sum() if "qte_bl" in df.columns else 0
+            if hide_unmatched and total_bl == 0:
+                continue
+            total_cmd = df["qte_commande"].sum()
+            total_bl = df["qte_bl"].sum()
+            taux = (total_bl / total_cmd * 100) if total_cmd > 0 else 0
+            summary_data['Commande'].append(order_num)
+            summary_data['Taux de service (%)'].append(round(taux, 2))
+            summary_data['Qté commandée'].append(int(total_cmd))
+            summary_data['Qté livrée'].append(int(total_bl))
+            summary_data['Qté manquante'].append(int(total_cmd - total_bl))
+            summary_data['Articles OK'].append((df["status"] == "OK").sum())
+            summary_data['Articles différence'].append((df["status"] == "QTY_DIFF").sum())
+            summary_data['Articles manquants'].append((df["status"] == "MISSING_IN_BL").sum())
+        pd.DataFrame(summary_data).to_excel(writer, sheet_name="Récapitulatif", index=False)
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - t0
+
+
+def read_table(data, fmt, text_columns):
+    """Table relue depuis l'export, identifiants en texte comme dans le classeur"""
+    buffer = io.BytesIO(data)
+    if fmt == "parquet":
+        frame = pd.read_parquet(buffer)
+    else:
+        frame = pd.read_csv(buffer, dtype=dict.fromkeys(text_columns, str))
+    return frame.astype(dict.fromkeys(text_columns, str))
+
+
+def check_long(workbook, fmt, lines, summary):
+    """Écarts entre la table longue relue et les feuilles du classeur"""
+    errors = []
+    sheets = pd.read_excel(io.BytesIO(workbook), sheet_name=None, dtype={"ref": str, "code_article": str})
+    expected = pd.concat(
+        [df.assign(order_num=name[2:]) for name, df in sheets.items() if name.startswith("C_")], ignore_index=True
+    )
+    frame = read_table(lines, fmt, ["order_num", "ref", "code_article"])
+    if len(frame) != len(expected) or list(frame["order_num"].unique()) != list(expected["order_num"].unique()):
+        errors.append(f"{fmt} : {len(frame)} lignes au lieu de {len(expected)}, ou commandes différentes")
+        return errors
+    for column in RESULT_COLUMNS:
+        left, right = frame[column].to_numpy(), expected[column].to_numpy()
+        same = np.allclose(left.astype(float), right.astype(float)) if left.dtype.kind in "if" else \
+            (left.astype(str) == right.astype(str)).all()
+        if not same:
+            errors.append(f"{fmt} : colonne {column} différente du classeur")
+    recap = read_table(summary, fmt, ["Commande"])
+    if list(recap.columns) != SUMMARY_COLUMNS or not np.allclose(
+            recap[SUMMARY_COLUMNS[1:]].to_numpy(float), sheets["Récapitulatif"][SUMMARY_COLUMNS[1:]].to_numpy(float)):
+        errors.append(f"{fmt} : récapitulatif différent de la feuille Récapitulatif")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--lines-per-order", type=int, default=50)
+    args = parser.parse_args()
+
+    command_records, bl_records = synthetic_records(args.orders * args.lines_per_order, args.lines_per_order)
+    comparison = compare_records(records_frame_input(command_records, "commande"),
+                                 records_frame_input(bl_records, "bl"))
+    legacy_out, new_out = io.BytesIO(), io.BytesIO()
+    before = timed(legacy_export, comparison["results"], True, legacy_out)
+    after = timed(write_excel_report, comparison["table"], True, new_out)
+    print(f"{args.orders} commandes, {len(comparison['table'])} lignes")
+    print(f"avant {before:>7.2f} s | {len(legacy_out.getvalue()) / 1024 / 1024:.1f} Mo")
+    print(f"après {after:>7.2f} s | {len(new_out.getvalue()) / 1024 / 1024:.1f} Mo | x{before / after:.1f}")
+
+    errors = []
+    aggregates = summarize(comparison["table"], True)
+    for fmt, (name, _, _) in LONG_FORMATS.items():
+        lines, summary = io.BytesIO(), io.BytesIO()
+        seconds = timed(write_long_report, comparison["table"], True, lines, fmt, summary, aggregates)
+        size = len(lines.getvalue()) + len(summary.getvalue())
+        print(f"{name:<8} {seconds:>6.2f} s | {size / 1024 / 1024:.1f} Mo | x{after / seconds:.1f} face au classeur")
+        errors += check_long(new_out.getvalue(), fmt, lines.getvalue(), summary.getvalue())
+
+    for message in errors:
+        print("ÉCART " + message)
+    if not errors:
+        print("Tables longues identiques aux feuilles du classeur")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
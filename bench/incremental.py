@@ -0,0 +1,95 @@
+"""Mise à jour incrémentale d'une comparaison : identique au recalcul complet, et plus rapide.
+
+Scénarios sur un corpus synthétique : un BL tardif ajouté après la
+comparaison de tous les autres fichiers, un fichier de commande retiré, un
+fichier fourni deux fois, puis un BL sans numéro de commande (lignes
+rattachées aux commandes par reconcile) ajouté et retiré. Après chaque mise à jour, la table longue et les
+lignes de BL agrégées doivent être identiques à celles d'un recalcul
+complet sur les mêmes fichiers. Le code de sortie vaut 1 sinon.
+
+Usage : python -m bench.incremental [--orders 300] [--files 6] [--workers 4] [--backend pdfminer]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from bench.corpus import order_book, paginate, write_corpus, write_pdf
+from desathor.backends import BACKENDS, DEFAULT_BACKEND
+from desathor.cache import ParseCache
+from desathor.core import read_files, run_comparison
+from desathor.incremental import IncrementalComparison, order_count
+
+
+def write_orphan_bl(path, n_orders, n_lines=60, seed=1):
+    """BL dont aucune ligne n'est précédée d'un numéro de commande : EAN et quantités tirés des commandes"""
+    rng = random.Random(seed)
+    lines = [
+        f"{ean} Article de test {qte},00 {rng.randint(1, 99)}.{rng.randint(0, 99):02d}"
+        for _, order_lines in order_book(n_orders) for _, ean, qte in order_lines
+        if rng.random() < n_lines / (n_orders * 35)
+    ]
+    write_pdf(path, paginate(lines))
+
+
+def same(comparison, reference):
+    try:
+        pd.testing.assert_frame_equal(comparison["table"], reference["table"])
+        pd.testing.assert_frame_equal(comparison["bl"], reference["bl"])
+        pd.testing.assert_frame_equal(comparison["reconciliation"], reference["reconciliation"])
+    except AssertionError as e:
+        return str(e).splitlines()[0]
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=300)
+    parser.add_argument("--files", type=int, default=6)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--backend", choices=list(BACKENDS), default=DEFAULT_BACKEND)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        meta = write_corpus(tmp, args.orders, args.files)
+        commandes = read_files("commande", [f["path"] for f in meta["files"] if f["kind"] == "commande"])
+        bls = read_files("bl", [f["path"] for f in meta["files"] if f["kind"] == "bl"])
+        # Extractions en cache pour les deux chemins : on mesure la comparaison, pas la lecture des PDF
+        cache = ParseCache(cache_dir=None)
+        write_orphan_bl(os.path.join(tmp, "bl_sans_commande.pdf"), args.orders)
+        orphan = read_files("bl", [os.path.join(tmp, "bl_sans_commande.pdf")])
+        run_comparison(commandes + bls + orphan, workers=args.workers, cache=cache, backend=args.backend)
+        scenarios = [
+            ("BL tardif", commandes + bls),
+            ("commande retirée", commandes[1:] + bls),
+            ("fichier en double", commandes[1:] + bls + bls[:1]),
+            ("BL sans commande", commandes[1:] + bls + orphan),
+            ("sans commande retiré", commandes[1:] + bls),
+        ]
+        incremental = IncrementalComparison()
+        incremental.run(commandes + bls[:-1], workers=1, cache=cache, backend=args.backend)
+        failures = 0
+        for label, files in scenarios:
+            t0 = time.perf_counter()
+            update = incremental.run(files, workers=1, cache=cache, backend=args.backend)
+            t_incremental = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            full = run_comparison(files, workers=1, cache=cache, backend=args.backend)
+            t_full = time.perf_counter() - t0
+            error = same(update["comparison"], full["comparison"])
+            info = update["update"]
+            print(f"{label:20s} +{info['added']} -{info['removed']} fichier(s), "
+                  f"{info['touched_orders']}/{order_count(full['comparison'])} commande(s) recalculée(s), "
+                  f"{len(update['comparison']['reconciliation'])} rattachement(s) | "
+                  f"complet {t_full:.3f} s, incrémental {t_incremental:.3f} s | "
+                  + ("identique" if error is None else f"ÉCART {error}"))
+            failures += error is not None
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Comparaison en tâche de fond : avancement par page, annulation et résultat identique.
+
+Un travail (jobs.ComparisonJob) compare le corpus synthétique pendant que
+le thread principal relève son avancement, comme le fait l'interface à
+chaque réexécution. Sa table longue doit être identique à celle d'un appel
+direct à run_comparison. Un second travail est annulé dès ses premières
+pages : il doit s'arrêter sans résultat, avant la fin de l'extraction. Le
+code de sortie vaut 1 sinon.
+
+Usage : python -m bench.jobs [--orders 300] [--files 4] [--workers 1] [--backend pdfplumber]
+"""
+import argparse
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from bench.corpus import write_corpus
+from desathor.backends import BACKENDS, DEFAULT_BACKEND
+from desathor.core import read_files, run_comparison
+from desathor.jobs import JobRegistry
+
+
+def watch(job, interval=0.2):
+    """Relevés d'avancement jusqu'à la fin du travail"""
+    samples = []
+    while job.running:
+        samples.append(job.progress())
+        time.sleep(interval)
+    samples.append(job.progress())
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=300)
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--backend", choices=list(BACKENDS), default=DEFAULT_BACKEND)
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        meta = write_corpus(tmp, args.orders, args.files)
+        files = (read_files("commande", [f["path"] for f in meta["files"] if f["kind"] == "commande"])
+                 + read_files("bl", [f["path"] for f in meta["files"] if f["kind"] == "bl"]))
+        registry = JobRegistry()
+
+        def target(job):
+            return run_comparison(files, workers=args.workers, backend=args.backend, progress=job.file_done,
+                                  page_progress=job.page_done, cancel=job.cancel_event)
+
+        t0 = time.perf_counter()
+        reference = run_comparison(files, workers=args.workers, backend=args.backend)
+        t_direct = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        job = registry.submit("bench", target)
+        samples = watch(job)
+        t_job = time.perf_counter() - t0
+        last = samples[-1]
+        print(f"{len(files)} fichier(s), {last['pages_total']} pages, {args.workers} processus, moteur {args.backend}")
+        print(f"direct {t_direct:.2f} s | travail {t_job:.2f} s | {len(samples)} relevé(s)")
+        for sample in samples[1:-1:max(len(samples) // 5, 1)]:
+            rate = sample["pages_per_second"]
+            eta = sample["eta_seconds"]
+            print(f"  {sample['fraction']:>4.0%} | {sample['files_done']}/{sample['files_total'] or '?'} fichier(s) | "
+                  f"{sample['pages_done']}/{sample['pages_total']} pages | "
+                  f"{rate or 0:.1f} pages/s | reste {eta if eta is not None else float('nan'):.1f} s")
+        if job.status != "done":
+            failures.append(f"travail terminé en {job.status} : {job.error}")
+        else:
+            if last["pages_done"] != last["pages_total"] or last["files_done"] != len(files):
+                failures.append(f"avancement final incomplet : {last}")
+            try:
+                pd.testing.assert_frame_equal(job.result["comparison"]["table"], reference["comparison"]["table"])
+                pd.testing.assert_frame_equal(job.result["comparison"]["bl"], reference["comparison"]["bl"])
+            except AssertionError as e:
+                failures.append("résultat différent : " + str(e).splitlines()[0])
+
+        job = registry.submit("bench", target)
+        while job.running and job.pages_done < 2:
+            time.sleep(0.01)
+        t0 = time.perf_counter()
+        job.cancel()
+        watch(job, interval=0.01)
+        t_stop = time.perf_counter() - t0
+        print(f"annulation après {job.pages_done}/{job.pages_total} pages : arrêt en {t_stop:.2f} s ({job.status})")
+        if job.status != "cancelled" or job.result is not None:
+            failures.append(f"annulation ignorée : travail terminé en {job.status}")
+
+    for message in failures:
+        print("ÉCHEC " + message)
+    if not failures:
+        print("Résultat du travail identique à l'appel direct ; annulation effective")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""Micro-benchmark du classement des lignes (lignes/s), avant/après compilation des motifs.
+
+Usage : python -m bench.line_classifier [--lines 200000]
+"""
+import argparse
+import random
+import re
+import time
+
+from desathor.parsing import initial_state, scan_bl_page, scan_command_page
+from desathor.records import EAN_WIDTH, QTY_COLUMN, RecordBuilder
+
+
+# --- Référence : cascade de regex par ligne d'origine + re-scan du texte complet ---
+
+def legacy_find_order_numbers_in_text(text):
+    if not text:
+        return []
+    patterns = [
+        r"Commande\s*n[°º]?\s*[:\s-]*?(\d{5,10})",
+        r"N[°º]?\s*commande\s*[:\s-]*?(\d{5,10})",
+        r"Bon\s+de\s+Livraison\s+Nr\.?\s*[:\s-]*?(\d{5,10})",
+    ]
+    found = []
+    for pat in patterns:
+        for m in re.finditer(pat, text, flags=re.IGNORECASE):
+            num = m.group(1)
+            if num and num not in found:
+                found.append(num)
+    return found
+
+
+def legacy_is_valid_ean13(code):
+    if not code or len(code) != 13:
+        return False
+    if code.startswith(('302', '376')):
+        return False
+    return True
+
+
+def legacy_command(lines):
+    records = []
+    current_order = None
+    in_data_section = False
+    for ligne in lines:
+        order_nums = legacy_find_order_numbers_in_text(ligne)
+        if order_nums:
+            current_order = order_nums[0]
+        if re.search(r"^L\s+Réf\.\s*frn\s+Code\s+ean", ligne, re.IGNORECASE):
+            in_data_section = True
+            continue
+        if re.search(r"^Récapitulatif|^Page\s+\d+", ligne, re.IGNORECASE):
+            in_data_section = False
+            continue
+        if not in_data_section:
+            continue
+        ean_matches = re.findall(r"\b(\d{13})\b", ligne)
+        valid_eans = [ean for ean in ean_matches if legacy_is_valid_ean13(ean)]
+        if not valid_eans:
+            continue
+        ean = valid_eans[0]
+        parts = ligne.split()
+        ean_pos = None
+        for idx, part in enumerate(parts):
+            if ean in part:
+                ean_pos = idx
+                break
+        code_article = ""
+        if ean_pos and ean_pos > 1:
+            candidate = parts[ean_pos - 1]
+            if re.match(r"^\d{3,6}$", candidate):
+                code_article = candidate
+        qty_match = re.search(r"Conditionnement\s*:\s*\d+\s+\d+(\d+)\s+(\d+)", ligne)
+        if qty_match:
+            qte = int(qty_match.group(1))
+        else:
+            nums = re.findall(r"\b(\d+)\b", ligne)
+            nums = [int(n) for n in nums if n != ean and len(n) < 6]
+            if nums:
+                qte = nums[-2] if len(nums) >= 2 else nums[-1]
+            else:
+                continue
+        records.append({"ref": ean, "code_article": code_article, "qte_commande": qte,
+                        "order_num": current_order or "__NO_ORDER__"})
+    order_numbers = legacy_find_order_numbers_in_text("\n".join(lines))
+    return records, order_numbers
+
+
+def legacy_bl(lines):
+    records = []
+    current_order = None
+    for ligne in lines:
+        order_nums = legacy_find_order_numbers_in_text(ligne)
+        if order_nums:
+            current_order = order_nums[0]
+        ean_matches = re.findall(r"\b(\d{13})\b", ligne)
+        valid_eans = [ean for ean in ean_matches if legacy_is_valid_ean13(ean)]
+        if not valid_eans:
+            continue
+        ean = valid_eans[0]
+        nums = re.findall(r"[\d,.]+", ligne)
+        qte = None
+        if nums:
+            candidate = nums[-2] if len(nums) >= 2 else nums[-1]
+            try:
+                qte = float(candidate.replace(",", "."))
+            except ValueError:
+                continue
+        if qte is None:
+            continue
+        records.append({"ref": ean, "qte_bl": qte, "order_num": current_order or "__NO_ORDER__"})
+    order_numbers = legacy_find_order_numbers_in_text("\n".join(lines))
+    return records, order_numbers
+
+
+# --- Moteur actuel ---
+
+def current_command(lines):
+    state = initial_state("commande")
+    out, orders = RecordBuilder("commande"), {}
+    scan_command_page("\n".join(lines), state, out, orders)
+    return out, list(orders)
+
+
+def current_bl(lines):
+    state = initial_state("bl")
+    out, orders = RecordBuilder("bl"), {}
+    scan_bl_page("\n".join(lines), state, out, orders)
+    return out, list(orders)
+
+
+def random_ean(rng):
+    prefix = rng.choice(["300", "311", "540", "400", "302", "376"])
+    return prefix + "".join(rng.choice("0123456789") for _ in range(10))
+
+
+def synthetic_command_lines(n_lines, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    while len(lines) < n_lines:
+        lines.append(f"Commande n° {rng.randint(4500000, 4599999)} du 12/03/2025")
+        lines.append("Adresse de livraison : Entrepôt Nord, 59000 Lille")
+        lines.append("L Réf. frn Code ean Libellé Qté UC PU")
+        for i in range(rng.randint(20, 40)):
+            lines.append(
+                f"{i + 1} {rng.randint(1000, 99999)} {random_ean(rng)} Article test {i} "
+                f"{rng.randint(1, 60)} {rng.randint(1, 12)} {rng.randint(1, 99)},{rng.randint(0, 99):02d}"
+            )
+        lines.append(f"Page {rng.randint(1, 9)}")
+        lines.append("Conditions générales de vente disponibles sur demande")
+    return lines[:n_lines]
+
+
+def synthetic_bl_lines(n_lines, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    while len(lines) < n_lines:
+        lines.append(f"Bon de Livraison Nr. {rng.randint(4500000, 4599999)}")
+        lines.append("Transporteur : Messagerie Express")
+        for i in range(rng.randint(20, 40)):
+            lines.append(f"{random_ean(rng)} Article test {i} {rng.randint(1, 60)},00 PCE")
+        lines.append("Total colis : 12")
+    return lines[:n_lines]
+
+
+def measure(fn, lines, repeat=3):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(lines)
+        best = min(best, time.perf_counter() - t0)
+    return len(lines) / best, result
+
+
+def as_dicts(records):
+    """Un dict par ligne de RecordColumns, au format des records de référence (ref en chaîne de 13 chiffres)"""
+    qty = QTY_COLUMN[records.kind]
+    out = []
+    for i in range(len(records)):
+        rec = {"ref": str(records.ean[i]).zfill(EAN_WIDTH)}
+        if records.kind == "commande":
+            rec["code_article"] = records.article_categories[records.article[i]]
+        rec[qty] = records.qte[i].item()
+        rec["order_num"] = records.order_categories[records.order[i]]
+        out.append(rec)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, default=200000)
+    args = parser.parse_args()
+
+    cases = [
+        ("commande", synthetic_command_lines(args.lines), legacy_command, current_command),
+        ("bl", synthetic_bl_lines(args.lines), legacy_bl, current_bl),
+    ]
+    for kind, lines, legacy, current in cases:
+        before, (legacy_records, legacy_orders) = measure(legacy, lines)
+        after, (raw_records, orders) = measure(current, lines)
+        records = as_dicts(raw_records.finish())
+        assert records == legacy_records, f"{kind}: records différents"
+        assert set(orders) == set(legacy_orders), f"{kind}: numéros de commande différents"
+        print(f"{kind:9s} {len(lines):>8d} lignes | avant {before:>10,.0f} l/s | "
+              f"après {after:>10,.0f} l/s | x{after / before:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Pic mémoire de l'extraction selon le nombre de pages.
+
+Chaque BL est extrait par le chemin de production
+(parsing.extract_records_from_bl_pdf, celui de parallel.parse_files) : le
+texte est lu page par page et le cache de mise en page de chaque page est
+libéré aussitôt (backends). Les lignes extraites, conservées dans le
+résultat, croissent avec le document ; le pic de travail au-delà de ces
+lignes (tracemalloc) doit rester à peu près constant quand le nombre de
+pages augmente. La lecture d'origine (texte complet + pages gardées en vie)
+sert de référence. Le code de sortie vaut 1 si le pic de travail croît.
+
+Usage : python -m bench.memory [--pages 20 80 320] [--backend pdfplumber] [--skip-legacy]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import tracemalloc
+
+import pdfplumber
+
+from bench.corpus import bl_pages, write_pdf
+from desathor.backends import BACKENDS, DEFAULT_BACKEND
+from desathor.parsing import extract_records_from_bl_pdf
+
+# Tolérance sur le pic de travail entre le plus petit et le plus grand document :
+# seuls restent les objets Page de pdfplumber (quelques Ko chacun)
+MAX_GROWTH = 2.0
+
+
+def legacy_read(path):
+    """Lecture d'origine : concaténation du texte, pages en cache jusqu'à la fin"""
+    full_text = ""
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages:
+            txt = page.extract_text() or ""
+            full_text += "\n" + txt
+    return len(full_text)
+
+
+def production_read(path, backend):
+    # Fichier ouvert comme dans l'application : le moteur pdfminer attend un flux, pas un chemin
+    with open(path, "rb") as f:
+        res = extract_records_from_bl_pdf(f, backend=backend)
+    if res.get("error"):
+        raise RuntimeError(res["error"])
+    return res
+
+
+def peak_memory(fn, *args):
+    """(octets conservés par le résultat, pic au-delà) de fn(*args)"""
+    tracemalloc.start()
+    try:
+        result = fn(*args)
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return retained, peak - retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[20, 80, 320])
+    parser.add_argument("--backend", choices=list(BACKENDS), default=DEFAULT_BACKEND)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    peaks = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_pages in args.pages:
+            path = os.path.join(tmp, f"bl_{n_pages}.pdf")
+            write_pdf(path, bl_pages(n_pages))
+            retained, peak = peak_memory(production_read, path, args.backend)
+            peaks.append(peak)
+            line = (f"{n_pages:>6d} pages | lignes conservées {retained / 1024 / 1024:>6.1f} Mo, "
+                    f"pic de travail {peak / 1024 / 1024:>6.1f} Mo")
+            if not args.skip_legacy:
+                # Le résultat est un entier : tout ce qui reste tracé est du travail (pages en cycles)
+                legacy_peak = sum(peak_memory(legacy_read, path))
+                line += f" | origine {legacy_peak / 1024 / 1024:>8.1f} Mo"
+            print(line)
+    growth = peaks[-1] / peaks[0]
+    print(f"croissance du pic de travail : x{growth:.2f}")
+    if growth > MAX_GROWTH:
+        print(f"ÉCART le pic de travail croît avec le nombre de pages (x{growth:.2f})")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""Sessions simultanées : pool d'extraction partagé et équitable contre extraction par session.
+
+Un utilisateur envoie un gros lot (--big-orders commandes sur --big-files
+fichiers de chaque type), puis --sessions collègues envoient chacun une
+petite commande et son BL, comme à l'ouverture du matin. Quatre modes :
+
+- thread : chaque session extrait dans son propre thread (ancien comportement
+  de l'interface, tous les parseurs se disputent le GIL) ;
+- session : chaque session crée son propre pool de --workers processus ;
+- shared : un seul pool.SharedPool de --workers processus, file équitable ;
+- fifo : le même pool partagé, mais une seule file pour tout le monde
+  (premier arrivé, premier servi).
+
+Pour chaque mode : temps d'attente des petites sessions (médiane, max),
+durée du gros lot et durée totale. Les résultats de chaque session doivent
+être identiques à une extraction séquentielle ; le code de sortie vaut 1
+sinon.
+
+Usage : python -m bench.pool [--sessions 6] [--workers 2] [--big-orders 400] [--big-files 4]
+                             [--shard-pages 0] [--backend pdfminer] [--modes thread,session,fifo,shared]
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+from bench.corpus import write_corpus
+from desathor.backends import BACKENDS
+from desathor.core import read_files
+from desathor.parallel import parse_files
+from desathor.pool import SharedPool
+
+
+def session_files(out_dir, n_orders, n_files, seed):
+    meta = write_corpus(out_dir, n_orders, n_files, seed=seed)
+    return (read_files("commande", [f["path"] for f in meta["files"] if f["kind"] == "commande"])
+            + read_files("bl", [f["path"] for f in meta["files"] if f["kind"] == "bl"]))
+
+
+def run_sessions(sessions, mode, workers, backend, delay, shard_pages=None):
+    """Lance chaque session dans son thread ; retourne (durée par session, résultats, durée totale)"""
+    pool = SharedPool(workers) if mode in ("shared", "fifo") else None
+    if pool is not None:
+        # Processus démarrés avant la mesure, comme sur un serveur déjà lancé
+        pool.submit("warmup", sum, ()).result()
+    seconds = [None] * len(sessions)
+    results = [None] * len(sessions)
+
+    def session(k, files):
+        t0 = time.perf_counter()
+        if mode == "thread":
+            results[k] = parse_files(files, workers=1, backend=backend)
+        elif mode == "session":
+            results[k] = parse_files(files, workers=workers, backend=backend, shard_pages=shard_pages)
+        else:
+            owner = f"user{k}" if mode == "shared" else "tous"
+            results[k] = parse_files(files, backend=backend, shard_pages=shard_pages, pool=pool, owner=owner)
+        seconds[k] = time.perf_counter() - t0
+
+    threads = [threading.Thread(target=session, args=(k, files)) for k, files in enumerate(sessions)]
+    t0 = time.perf_counter()
+    for k, thread in enumerate(threads):
+        thread.start()
+        if k == 0:
+            # Le gros lot a pris de l'avance quand les collègues arrivent
+            time.sleep(delay)
+    for thread in threads:
+        thread.join()
+    total = time.perf_counter() - t0
+    if pool is not None:
+        pool.shutdown()
+    return seconds, results, total
+
+
+def frames(parsed):
+    out = []
+    for res in parsed:
+        frame = res["records"].to_frame()
+        # L'ordre des catégories dépend du découpage en segments, pas les valeurs
+        for column in ("order_num", "code_article"):
+            if column in frame.columns:
+                frame[column] = frame[column].astype(str)
+        out.append(frame)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=6, help="petites sessions en plus du gros lot")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--big-orders", type=int, default=400)
+    parser.add_argument("--big-files", type=int, default=4)
+    parser.add_argument("--small-orders", type=int, default=10)
+    parser.add_argument("--delay", type=float, default=1.0, help="avance du gros lot (s)")
+    parser.add_argument("--shard-pages", type=int, default=0, help="segments de N pages (0 = un fichier par tâche)")
+    parser.add_argument("--backend", choices=list(BACKENDS), default="pdfminer")
+    parser.add_argument("--modes", default="thread,session,fifo,shared")
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        sessions = [session_files(f"{tmp}/big", args.big_orders, args.big_files, seed=0)]
+        sessions += [session_files(f"{tmp}/s{k}", args.small_orders, 1, seed=k + 1) for k in range(args.sessions)]
+        reference = [frames(parse_files(files, workers=1, backend=args.backend)) for files in sessions]
+        print(f"gros lot {len(sessions[0])} fichier(s) + {args.sessions} session(s) de 2 fichiers | "
+              f"{args.workers} processus | moteur {args.backend}")
+        print(f"{'mode':<8} {'petites méd.':>12} {'petites max':>12} {'gros lot':>9} {'total':>8}")
+        for mode in args.modes.split(","):
+            seconds, results, total = run_sessions(sessions, mode, args.workers, args.backend, args.delay,
+                                                   args.shard_pages or None)
+            small = seconds[1:]
+            print(f"{mode:<8} {statistics.median(small):>11.2f}s {max(small):>11.2f}s "
+                  f"{seconds[0]:>8.2f}s {total:>7.2f}s")
+            for k, (parsed, expected) in enumerate(zip(results, reference)):
+                try:
+                    for frame, ref in zip(frames(parsed), expected):
+                        pd.testing.assert_frame_equal(frame, ref)
+                except AssertionError as e:
+                    failures.append(f"{mode} session {k} : " + str(e).splitlines()[0])
+
+    for message in failures:
+        print("ÉCART " + message)
+    if not failures:
+        print("Résultats identiques à l'extraction séquentielle dans tous les modes")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Pré-filtre des pages : pages écartées, temps gagné, et aucune ligne perdue.
+
+Chaque PDF du corpus (avec pages de couverture et de conditions générales)
+est extrait avec et sans pré-filtre, d'un bloc puis en segments de pages
+recollés : les lignes extraites et les numéros de commande doivent être
+identiques. Le gain estimé par le rapport du pré-filtre
+(Timings.prescreen_report) doit avoir le signe du gain mesuré entre les
+deux extractions. Le code de sortie vaut 1 si un fichier diffère ou si
+l'estimation contredit la mesure.
+
+Usage : python -m bench.prescreen [--orders 100] [--files 2] [--filler 6]
+                                  [--backend pdfplumber] [--shard-pages 4]
+"""
+import argparse
+import io
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from bench.corpus import write_corpus
+from desathor.backends import BACKENDS, DEFAULT_BACKEND
+from desathor.metrics import Timings
+from desathor.parallel import page_ranges
+from desathor.parsing import extract_pages, stitch_segments
+
+
+def extract(kind, data, backend, prescreen, shard_pages=None, timings=None):
+    n_pages = None
+    if shard_pages:
+        from desathor.parallel import count_pages
+        n_pages = count_pages(data)
+    ranges = page_ranges(n_pages, shard_pages) if n_pages else [(0, None)]
+    segments = [
+        extract_pages(io.BytesIO(data), kind, start, stop, timings=timings, backend=backend, prescreen=prescreen)
+        for start, stop in ranges
+    ]
+    res = stitch_segments(kind, segments)
+    frame = res["records"].to_frame()
+    if "code_article" in frame.columns:
+        frame["code_article"] = frame["code_article"].astype(str)
+    return frame, res["order_numbers"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=100)
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--filler", type=int, default=6, help="pages sans données par PDF")
+    parser.add_argument("--backend", choices=list(BACKENDS), default=DEFAULT_BACKEND)
+    parser.add_argument("--shard-pages", type=int, default=4)
+    args = parser.parse_args()
+
+    timings = Timings()
+    seconds = {False: 0.0, True: 0.0}
+    mismatches = []
+    with tempfile.TemporaryDirectory() as tmp:
+        meta = write_corpus(tmp, args.orders, args.files, filler=args.filler)
+        for f in meta["files"]:
+            with open(f["path"], "rb") as fh:
+                data = fh.read()
+            results = {}
+            for prescreen in (False, True):
+                t0 = time.perf_counter()
+                results[prescreen] = extract(f["kind"], data, args.backend, prescreen,
+                                             timings=timings if prescreen else None)
+                seconds[prescreen] += time.perf_counter() - t0
+            results["segments"] = extract(f["kind"], data, args.backend, True, args.shard_pages)
+            ref_frame, ref_orders = results[False]
+            for variant in (True, "segments"):
+                frame, orders = results[variant]
+                try:
+                    pd.testing.assert_frame_equal(frame, ref_frame)
+                    assert orders == ref_orders, "numéros de commande différents"
+                except AssertionError as e:
+                    mismatches.append((f["path"], variant, str(e).splitlines()[0]))
+
+    report = timings.prescreen_report()
+    measured = seconds[False] - seconds[True]
+    print(f"{len(meta['files'])} fichier(s), {sum(f['pages'] for f in meta['files'])} pages, moteur {args.backend}")
+    print(f"pages écartées {report['skipped']}/{report['screened']} | surcoût du pré-filtre "
+          f"{report['screen_seconds']:.2f} s | gain estimé {report['saved_seconds']:.2f} s, mesuré {measured:.2f} s")
+    print(f"sans pré-filtre {seconds[False]:>7.2f} s | avec {seconds[True]:>7.2f} s | x{seconds[False] / seconds[True]:.2f}")
+    for path, variant, message in mismatches:
+        print(f"ÉCART ({'segments' if variant == 'segments' else 'pré-filtre'}) {path} : {message}")
+    estimate_off = (report["saved_seconds"] > 0) != (measured > 0)
+    if estimate_off:
+        print(f"ÉCART gain estimé {report['saved_seconds']:.2f} s, de signe contraire au gain mesuré {measured:.2f} s")
+    if not mismatches:
+        print("Aucune ligne perdue : lignes extraites identiques avec et sans pré-filtre")
+    return 1 if mismatches or estimate_off else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""Rattachement des lignes de BL sans numéro de commande (__NO_ORDER__) : exactitude et passage à l'échelle.
+
+Des lignes synthétiques (bench.compare) sont rendues orphelines : une part
+des lignes de BL perd son numéro de commande, comme une page lue avant le
+premier numéro, et une partie des EAN est partagée entre commandes. Les
+attributions de reconcile.reconcile_orphans sont comparées à un calcul
+direct (dictionnaires, mêmes règles). La quantité livrée totale doit être
+conservée, et les commandes sans EAN orphelin doivent rester identiques à une
+comparaison sans rattachement. Le temps de l'étape est mesuré à plusieurs
+tailles, à côté d'un balayage deux à deux (une passe sur toutes les lignes
+de commande par ligne orpheline). Le code de sortie vaut 1 en cas d'écart.
+
+Usage : python -m bench.reconcile [--lines 10000,100000] [--orphans 0.03] [--shared 0.2]
+"""
+import argparse
+import random
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from bench.compare import records_frame_input, synthetic_records
+from desathor.compare import compare_records
+from desathor.metrics import Timings
+from desathor.reconcile import RULE_LARGEST, RULE_UNIQUE
+from desathor.records import EAN_WIDTH, NO_ORDER
+
+
+def orphan_records(n_lines, orphan_rate, shared_rate, seed=0):
+    """Lignes synthétiques avec EAN partagés entre commandes, lignes de BL et quelques lignes de commande orphelines"""
+    command_records, bl_records = synthetic_records(n_lines)
+    rng = random.Random(seed)
+    pool = [str(7000000000000 + k) for k in range(max(n_lines // 200, 10))]
+    shared = {}
+    for rec in command_records:
+        if rng.random() < shared_rate:
+            shared[rec["ref"]] = rng.choice(pool)
+    for rec in command_records + bl_records:
+        rec["ref"] = shared.get(rec["ref"], rec["ref"])
+    for rec in bl_records:
+        if rng.random() < orphan_rate:
+            rec["order_num"] = NO_ORDER
+    # Lignes de commande lues elles aussi sans numéro : elles gardent leur part du BL orphelin
+    for rec in rng.sample(command_records, max(len(command_records) // 1000, 1)):
+        rec["order_num"] = NO_ORDER
+    return command_records, bl_records
+
+
+def reference(command_records, bl_records):
+    """Attributions par le calcul direct : {(commande, EAN, règle): quantité}"""
+    position = {}
+    for rec in command_records + bl_records:
+        position.setdefault(rec["order_num"], len(position))
+    ordered, delivered = defaultdict(float), defaultdict(float)
+    orphans, claimed = defaultdict(float), defaultdict(float)
+    for rec in bl_records:
+        if rec["order_num"] == NO_ORDER:
+            orphans[rec["ref"]] += rec["qte_bl"]
+        else:
+            delivered[rec["order_num"], rec["ref"]] += rec["qte_bl"]
+    for rec in command_records:
+        if rec["order_num"] == NO_ORDER:
+            claimed[rec["ref"]] += rec["qte_commande"]
+        else:
+            ordered[rec["order_num"], rec["ref"]] += rec["qte_commande"]
+    candidates = defaultdict(list)
+    for (order_num, ref), qte in ordered.items():
+        rest = qte - delivered.get((order_num, ref), 0.0)
+        if rest > 0 and ref in orphans:
+            candidates[ref].append((-rest, position[order_num], order_num, rest))
+    out = {}
+    for ref, lines in candidates.items():
+        available = max(orphans[ref] - claimed[ref], 0.0)
+        rule = RULE_UNIQUE if len(lines) == 1 else RULE_LARGEST
+        for _, _, order_num, rest in sorted(lines):
+            if available <= 0:
+                break
+            assigned = min(available, rest)
+            out[order_num, ref.zfill(EAN_WIDTH), rule] = assigned
+            available -= assigned
+    return out
+
+
+def pairwise_scan(command_records, bl_records):
+    """Ligne orpheline par ligne orpheline, recherche de ses commandes dans toutes les lignes de commande"""
+    refs = np.array([rec["ref"] for rec in command_records])
+    found = 0
+    for rec in bl_records:
+        if rec["order_num"] == NO_ORDER:
+            found += int(np.count_nonzero(refs == rec["ref"]))
+    return found
+
+
+def check(command_records, bl_records, comparison, plain):
+    errors = []
+    expected = reference(command_records, bl_records)
+    actual = {(row.order_num, row.ref, row.rule): row.qte_bl
+              for row in comparison["reconciliation"].itertuples(index=False)}
+    if expected.keys() != actual.keys() or not all(np.isclose(expected[k], actual[k]) for k in expected):
+        errors.append(f"attributions : {len(actual)} au lieu de {len(expected)} attendues")
+    if not np.isclose(comparison["bl"]["qte_bl"].sum(), plain["bl"]["qte_bl"].sum()):
+        errors.append("quantité livrée totale non conservée")
+    touched = set(comparison["reconciliation"]["order_num"]) | {NO_ORDER}
+    table, base = comparison["table"], plain["table"]
+    kept = ~table["order_num"].isin(touched).to_numpy()
+    if not table[kept].reset_index(drop=True).equals(base[~base["order_num"].isin(touched).to_numpy()]
+                                                     .reset_index(drop=True)):
+        errors.append("commandes sans rattachement modifiées")
+    # Par (commande, EAN) : un EAN sous plusieurs codes article n'a qu'une ligne de BL
+    ordered = table.groupby(["order_num", "ref"], observed=True)["qte_commande"].sum()
+    after = comparison["bl"].set_index(["order_num", "ref"])["qte_bl"]
+    before = plain["bl"].set_index(["order_num", "ref"])["qte_bl"].reindex(after.index, fill_value=0)
+    limit = np.maximum(ordered.reindex(after.index, fill_value=0), before)
+    over = (after > limit + 1e-9) & (after.index.get_level_values("order_num") != NO_ORDER)
+    if over.any():
+        errors.append(f"{int(over.sum())} ligne(s) de commande livrée(s) au-delà du commandé par rattachement")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", default="10000,100000")
+    parser.add_argument("--orphans", type=float, default=0.03, help="part des lignes de BL sans commande")
+    parser.add_argument("--shared", type=float, default=0.2, help="part des lignes dont l'EAN est partagé")
+    args = parser.parse_args()
+
+    errors = []
+    for n_lines in [int(n) for n in args.lines.split(",")]:
+        command_records, bl_records = orphan_records(n_lines, args.orphans, args.shared)
+        cmd_input = records_frame_input(command_records, "commande")
+        bl_input = records_frame_input(bl_records, "bl")
+        plain = compare_records(cmd_input, bl_input, reconcile=False)
+        timings = Timings()
+        t0 = time.perf_counter()
+        comparison = compare_records(cmd_input, bl_input, timings)
+        total = time.perf_counter() - t0
+        stage = timings.stages["reconcile"]["seconds"]
+        t0 = time.perf_counter()
+        pairwise_scan(command_records, bl_records)
+        pairwise = time.perf_counter() - t0
+        reconciliation = comparison["reconciliation"]
+        n_orphans = sum(rec["order_num"] == NO_ORDER for rec in bl_records)
+        missing_before = int((plain["table"]["status"] == "MISSING_IN_BL").sum())
+        missing_after = int((comparison["table"]["status"] == "MISSING_IN_BL").sum())
+        print(f"{n_lines:>7} lignes | {n_orphans} ligne(s) de BL orpheline(s) | {len(reconciliation)} attribution(s) "
+              f"({(reconciliation['rule'] == RULE_UNIQUE).sum()} {RULE_UNIQUE}, "
+              f"{(reconciliation['rule'] == RULE_LARGEST).sum()} {RULE_LARGEST}) | "
+              f"MISSING_IN_BL {missing_before} -> {missing_after}")
+        print(f"        rattachement {stage * 1000:.1f} ms ({stage / n_lines * 1e6:.2f} µs/ligne) sur "
+              f"{total * 1000:.0f} ms de comparaison | balayage deux à deux {pairwise * 1000:.0f} ms")
+        errors += [f"{n_lines} lignes : {message}" for message in
+                   check(command_records, bl_records, comparison, plain)]
+
+    for message in errors:
+        print("ÉCART " + message)
+    if not errors:
+        print("Attributions identiques au calcul direct, quantités conservées")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Mémoire et temps de construction des lignes extraites : liste de dicts + DataFrame
+(origine) contre colonnes typées RecordBuilder -> to_frame.
+
+Usage : python -m bench.records [--lines 100000 1000000]
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+import pandas as pd
+
+from desathor.records import RecordBuilder
+
+
+def synthetic_lines(n_lines, seed=0):
+    """(order_num, ean, code_article, qte) comme produits par l'analyse des lignes de commande"""
+    rng = random.Random(seed)
+    eans = [rng.choice(["300", "311", "540"]) + "".join(rng.choice("0123456789") for _ in range(10))
+            for _ in range(5000)]
+    lines = []
+    order = 4500000
+    while len(lines) < n_lines:
+        for _ in range(50):
+            lines.append((str(order), rng.choice(eans), str(rng.randint(1000, 1500)), rng.randint(1, 60)))
+        order += 1
+    return lines[:n_lines]
+
+
+def dict_path(lines):
+    records = []
+    for order_num, ean, code_article, qte in lines:
+        records.append({"ref": ean, "code_article": code_article, "qte_commande": qte, "order_num": order_num})
+    return records, pd.DataFrame(records)
+
+
+def columnar_path(lines):
+    builder = RecordBuilder("commande")
+    for order_num, ean, code_article, qte in lines:
+        builder.append(order_num, ean, qte, code_article)
+    columns = builder.finish()
+    return columns, columns.to_frame()
+
+
+def measure(fn, lines):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    records, df = fn(lines)
+    elapsed = time.perf_counter() - t0
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, retained, peak, df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lines", type=int, nargs="+", default=[100000, 1000000])
+    args = parser.parse_args()
+
+    mb = 1024 * 1024
+    for n_lines in args.lines:
+        lines = synthetic_lines(n_lines)
+        for label, fn in (("dicts", dict_path), ("colonnes", columnar_path)):
+            elapsed, retained, peak, df = measure(fn, lines)
+            print(f"{n_lines:>8d} lignes | {label:8s} | {elapsed:>6.2f} s | "
+                  f"conservé {retained / mb:>7.1f} Mo | pic {peak / mb:>7.1f} Mo | "
+                  f"DataFrame {df.memory_usage(deep=True).sum() / mb:>7.1f} Mo | ref {df['ref'].dtype}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Coût fixe d'une réexécution de l'interface : imports, en-tête et profileur.
+
+- Imports : temps d'import, dans un interpréteur neuf, des modules desathor
+  de l'interface, avec les bibliothèques PDF et xlsxwriter chargées d'avance
+  comme auparavant (origine) contre imports à la demande. pdfplumber,
+  pdfminer et xlsxwriter ne doivent pas être chargés par la seconde version.
+- En-tête : lecture et encodage base64 du logo à chaque réexécution (origine)
+  contre chaîne construite une fois par processus.
+- Profileur : coût de RerunProfiler.record, et p50/p95 comparés aux
+  centiles « rang le plus proche » de numpy.
+
+Le code de sortie vaut 1 si un module lourd est chargé par l'interface ou si
+les centiles diffèrent.
+
+Usage : python -m bench.reruns [--runs 5] [--reruns 1000]
+"""
+import argparse
+import base64
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from desathor.metrics import RerunProfiler
+
+APP_IMPORTS = """
+from desathor.aggregates import summarize, top
+from desathor.backends import BACKENDS, DEFAULT_BACKEND
+from desathor.browser import STATUS_FILTERS, OrderIndex, page_count, page_rows
+from desathor.cache import ParseCache
+from desathor.core import KIND_LABELS
+from desathor.export import write_excel_report
+from desathor.history import HistoryStore, session_usage
+from desathor.incremental import IncrementalComparison
+from desathor.jobs import JobRegistry
+from desathor.metrics import RerunProfiler, Timings, emit_metrics, emit_reruns
+from desathor.pool import SharedPool
+from desathor.store import LineStore
+"""
+# Bibliothèques importées par les modules desathor avant les imports à la demande
+EAGER = "import pdfplumber, pdfplumber.utils, pdfminer.pdfinterp, pdfminer.pdfpage, xlsxwriter\n"
+HEAVY = ["pdfplumber", "pdfminer", "xlsxwriter", "plotly"]
+
+
+def import_run(eager):
+    """(secondes d'import, modules lourds chargés) dans un interpréteur neuf, pandas déjà importé"""
+    code = (
+        "import sys, time, json\nimport pandas\nt0 = time.perf_counter()\n"
+        + (EAGER if eager else "")
+        + APP_IMPORTS
+        + f"print(json.dumps([time.perf_counter() - t0, sorted({{m.split('.')[0] for m in sys.modules}} & {set(HEAVY)!r})]))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def legacy_header():
+    with open("Desathor.png", "rb") as f:
+        data = f.read()
+    return base64.b64encode(data).decode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--reruns", type=int, default=1000)
+    args = parser.parse_args()
+    failures = []
+
+    before = [import_run(True) for _ in range(args.runs)]
+    after = [import_run(False) for _ in range(args.runs)]
+    t_before = statistics.median(r[0] for r in before)
+    t_after = statistics.median(r[0] for r in after)
+    loaded = after[0][1]
+    print(f"imports de l'interface (pandas déjà chargé) : avant {t_before * 1000:.0f} ms | "
+          f"après {t_after * 1000:.0f} ms | modules lourds chargés : {', '.join(loaded) or 'aucun'}")
+    if loaded:
+        failures.append("modules lourds chargés par l'interface : " + ", ".join(loaded))
+
+    t0 = time.perf_counter()
+    for _ in range(args.reruns):
+        legacy_header()
+    per_rerun = (time.perf_counter() - t0) / args.reruns
+    print(f"en-tête : {per_rerun * 1000:.3f} ms par réexécution avant, construit une fois ensuite "
+          f"({len(legacy_header()) / 1024:.0f} Ko encodés)")
+
+    rng = np.random.default_rng(0)
+    profiler = RerunProfiler(window=args.reruns, report_every=0)
+    samples = {state: rng.lognormal(-3, 0.5, args.reruns) for state in ("login", "idle", "results")}
+    t0 = time.perf_counter()
+    for state, values in samples.items():
+        for value in values:
+            profiler.record(state, float(value))
+    per_record = (time.perf_counter() - t0) / (args.reruns * len(samples))
+    print(f"profileur : {per_record * 1e6:.2f} µs par mesure")
+    for row in profiler.report():
+        values = samples[row["state"]]
+        expected = [round(float(np.percentile(values, q, method="inverted_cdf")) * 1000, 1) for q in (50, 95)]
+        print(f"  {row['state']:<8} n={row['count']} p50 {row['p50_ms']} ms | p95 {row['p95_ms']} ms")
+        if [row["p50_ms"], row["p95_ms"]] != expected:
+            failures.append(f"centiles {row['state']} : {row['p50_ms']}, {row['p95_ms']} au lieu de {expected}")
+
+    for message in failures:
+        print("ÉCART " + message)
+    if not failures:
+        print("Aucun module lourd chargé par l'interface, centiles identiques à numpy")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Extraction d'un PDF en segments de pages recollés : identique à l'extraction séquentielle.
+
+Le corpus place les repères qui portent l'état d'une page à la suivante
+sur les limites de page : numéros de commande ("Commande n°", "Bon de
+Livraison Nr."), en-tête du tableau "L Réf. frn Code ean" et pieds de
+section ("Récapitulatif", "Page N") tombent tour à tour en dernière et en
+première ligne de page, et une couverture sans données précède les
+commandes. Chaque PDF est extrait par parse_segment puis stitch_segments
+en segments de 1, 2 et 3 pages et d'un seul bloc, avec et sans
+pré-filtre, puis par parse_files dans des processus : les lignes et les
+numéros de commande doivent être identiques à ceux de
+extract_records_from_command_pdf / extract_records_from_bl_pdf sur le
+fichier entier. Le code de sortie vaut 1 en cas d'écart, ou si un repère
+ne tombe jamais sur une limite de page.
+
+Usage : python -m bench.shard [--orders 8] [--shards 1,2,3] [--workers 2] [--backend pdfplumber]
+"""
+import argparse
+import io
+import re
+import sys
+
+import pandas as pd
+
+from bench.corpus import LINES_PER_PAGE, filler_pages, order_book, write_pdf
+from desathor.backends import BACKENDS, DEFAULT_BACKEND
+from desathor.parallel import PARSERS, count_pages, page_ranges, parse_files, parse_segment
+from desathor.parsing import stitch_segments
+
+# Lignes qui changent l'état reporté d'une page à la suivante (commande en cours, section de données)
+MARK_RE = re.compile(r"^(Commande n°|Bon de Livraison Nr\.|L Réf\. frn|Récapitulatif|Page )")
+
+
+def command_lines(book):
+    """Flux de lignes d'un PDF de commande ; une commande longue est coupée par un pied "Page" et reprise"""
+    lines = []
+    for order_num, order_lines in book:
+        lines += [f"Commande n° {order_num} du 12/03/2025",
+                  "Livraison : Entrepôt Nord, 59000 Lille - GLN 3012345678901",
+                  "L Réf. frn Code ean Libellé Qté UC"]
+        for i, (code, ean, qte) in enumerate(order_lines, start=1):
+            if i == 20:
+                lines += [f"Page {order_num}", f"Commande n° {order_num} du 12/03/2025 (suite)",
+                          "L Réf. frn Code ean Libellé Qté UC"]
+            lines.append(f"{i} {code} {ean} Article de test {qte} 6")
+        lines += ["Récapitulatif", f"Nombre de lignes {len(order_lines)}",
+                  f"Total {sum(q for _, _, q in order_lines)} unités"]
+    return lines
+
+
+def bl_lines(book):
+    lines = []
+    for order_num, order_lines in book:
+        lines.append(f"Bon de Livraison Nr. {order_num}")
+        lines += [f"{ean} Article de test {qte},00 12.50" for _, ean, qte in order_lines]
+    return lines
+
+
+def boundary_pages(lines, lines_per_page=LINES_PER_PAGE):
+    """Pages dont chaque ligne repère (MARK_RE) finit une page ou en commence une, en alternance par repère"""
+    pages, page = [], []
+    at_end = {}
+    for line in lines:
+        mark = MARK_RE.match(line)
+        end = mark is not None and at_end.setdefault(mark.group(1), True)
+        if mark is not None and not end and page:
+            pages.append(page)
+            page = []
+        page.append(line)
+        if mark is not None:
+            at_end[mark.group(1)] = not end
+            if end:
+                pages.append(page)
+                page = []
+        elif len(page) >= lines_per_page:
+            pages.append(page)
+            page = []
+    if page:
+        pages.append(page)
+    return pages
+
+
+def uncovered_marks(pages):
+    """Repères qui ne tombent jamais en dernière ligne de page, ou jamais en première"""
+    kinds = {m.group(1) for lines in pages for m in map(MARK_RE.match, lines) if m}
+    last = {m.group(1) for m in (MARK_RE.match(lines[-1]) for lines in pages) if m}
+    first = {m.group(1) for m in (MARK_RE.match(lines[0]) for lines in pages) if m}
+    return sorted(f"{kind!r} en {where} de page" for kind in kinds
+                  for where, seen in (("fin", last), ("début", first)) if kind not in seen)
+
+
+def frame(records):
+    df = records.to_frame()
+    if "code_article" in df.columns:
+        df["code_article"] = df["code_article"].astype(str)
+    return df
+
+
+def difference(res, reference):
+    try:
+        pd.testing.assert_frame_equal(frame(res["records"]), frame(reference["records"]))
+        assert res["order_numbers"] == reference["order_numbers"], "numéros de commande différents"
+    except AssertionError as e:
+        return str(e).splitlines()[0]
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=8)
+    parser.add_argument("--shards", default="1,2,3", help="pages par segment ; le fichier entier est toujours testé")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--backend", choices=list(BACKENDS), default=DEFAULT_BACKEND)
+    args = parser.parse_args()
+
+    book = order_book(args.orders, lines_per_order=(15, 45))
+    errors = []
+    for kind, lines in (("commande", command_lines(book)), ("bl", bl_lines(book))):
+        pages = filler_pages(1, "Bordereau d'envoi") + boundary_pages(lines)
+        errors += [f"{kind} : repère {message} absent du corpus" for message in uncovered_marks(pages[1:])]
+        out = io.BytesIO()
+        write_pdf(out, pages)
+        data = out.getvalue()
+        n_pages = count_pages(data)
+        reference = PARSERS[kind](io.BytesIO(data), backend=args.backend, prescreen=False)
+        print(f"{kind:8s} {n_pages} pages, {len(reference['records'])} lignes, "
+              f"{len(reference['order_numbers'])} commandes")
+        for shard_pages in [int(n) for n in args.shards.split(",")] + [n_pages]:
+            for prescreen in (False, True):
+                segments = [parse_segment(kind, data, start, stop, backend=args.backend, prescreen=prescreen)
+                            for start, stop in page_ranges(n_pages, shard_pages)]
+                error = difference(stitch_segments(kind, segments), reference)
+                label = f"segments de {shard_pages} page(s), pré-filtre {'oui' if prescreen else 'non'}"
+                if error is not None:
+                    errors.append(f"{kind} : {label} : {error}")
+        [res] = parse_files([(kind, f"{kind}.pdf", data)], workers=args.workers, shard_pages=2,
+                            backend=args.backend)
+        error = res["error"] or difference(res, reference)
+        if error is not None:
+            errors.append(f"{kind} : parse_files en segments de 2 pages : {error}")
+
+    for message in errors:
+        print("ÉCART " + message)
+    if not errors:
+        print("Segments recollés identiques à l'extraction séquentielle, repères sur toutes les limites de page")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""Suite de benchmarks de l'extraction et de la comparaison sur un corpus synthétique.
+
+Mesure, pour les PDF de commande et de BL : pages/s, lignes/s et pic RSS
+(chaque cas tourne dans un processus neuf), puis le temps de bout en bout
+de run_comparison. Les résultats sont écrits en JSON ; avec --baseline, toute
+métrique dégradée de plus de --tolerance est signalée et le code de sortie
+vaut 1.
+
+Usage : python -m bench.suite [--orders 300] [--backend pdfminer] [--out results.json]
+                              [--baseline baseline.json] [--save-baseline baseline.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+from bench.corpus import write_corpus
+from desathor.backends import BACKENDS, DEFAULT_BACKEND
+
+# Sens d'amélioration de chaque métrique
+HIGHER_IS_BETTER = {"pages_per_sec", "lines_per_sec"}
+LOWER_IS_BETTER = {"seconds", "peak_rss_mb"}
+# Comptes qui doivent rester identiques à corpus égal
+EXACT = {"records", "orders"}
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss : kilo-octets sous Linux, octets sous macOS
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def parse_case(kind, files, backend):
+    from desathor.parallel import parse_bytes
+
+    contents = []
+    for f in files:
+        with open(f["path"], "rb") as fh:
+            contents.append(fh.read())
+    t0 = time.perf_counter()
+    n_records = 0
+    for data in contents:
+        res = parse_bytes(kind, data, backend=backend)
+        assert not res["error"], res["error"]
+        n_records += len(res["records"])
+    seconds = time.perf_counter() - t0
+    pages = sum(f["pages"] for f in files)
+    lines = sum(f["lines"] for f in files)
+    return {
+        "seconds": seconds,
+        "pages_per_sec": pages / seconds,
+        "lines_per_sec": lines / seconds,
+        "records": n_records,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def comparison_case(files, workers, backend):
+    from desathor.core import read_files, run_comparison
+
+    inputs = []
+    for kind in ("commande", "bl"):
+        inputs += read_files(kind, [f["path"] for f in files if f["kind"] == kind])
+    t0 = time.perf_counter()
+    run = run_comparison(inputs, workers=workers, backend=backend)
+    seconds = time.perf_counter() - t0
+    assert not run["errors"], run["errors"]
+    return {
+        "seconds": seconds,
+        "orders": len(run["comparison"]["results"]),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _run_isolated(queue, fn, args):
+    queue.put(fn(*args))
+
+
+def isolated(fn, *args):
+    """Exécute fn dans un processus neuf pour que le pic RSS ne mesure que ce cas"""
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_isolated, args=(queue, fn, args))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def run_suite(n_orders, n_files, workers, backend, seed=0):
+    with tempfile.TemporaryDirectory() as tmp:
+        meta = write_corpus(tmp, n_orders, n_files, seed)
+        results = {}
+        for kind in ("commande", "bl"):
+            results[f"parse_{kind}"] = isolated(parse_case, kind, [f for f in meta["files"] if f["kind"] == kind], backend)
+        results["comparison"] = isolated(comparison_case, meta["files"], workers, backend)
+    return {
+        "corpus": {
+            "orders": n_orders,
+            "files": n_files,
+            "seed": seed,
+            "pages": {k: sum(f["pages"] for f in meta["files"] if f["kind"] == k) for k in ("commande", "bl")},
+        },
+        "environment": {"python": platform.python_version(), "cpus": os.cpu_count(), "workers": workers,
+                        "backend": backend},
+        "results": results,
+    }
+
+
+def regressions(current, baseline, tolerance):
+    """[(cas, métrique, référence, actuel)] des métriques dégradées de plus de tolerance"""
+    found = []
+    for case, metrics in current["results"].items():
+        reference = baseline.get("results", {}).get(case, {})
+        for name, value in metrics.items():
+            ref = reference.get(name)
+            if not ref:
+                continue
+            if name in EXACT and value != ref:
+                found.append((case, name, ref, value))
+            elif name in HIGHER_IS_BETTER and value < ref * (1 - tolerance):
+                found.append((case, name, ref, value))
+            elif name in LOWER_IS_BETTER and value > ref * (1 + tolerance):
+                found.append((case, name, ref, value))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=300)
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--backend", choices=list(BACKENDS), default=DEFAULT_BACKEND)
+    parser.add_argument("--out", help="fichier JSON des résultats")
+    parser.add_argument("--baseline", help="résultats de référence à comparer")
+    parser.add_argument("--save-baseline", help="enregistre les résultats comme nouvelle référence")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="dégradation tolérée (0.15 = 15 %%)")
+    args = parser.parse_args()
+
+    current = run_suite(args.orders, args.files, args.workers, args.backend)
+    for case, metrics in current["results"].items():
+        print(f"{case:16s} " + " | ".join(f"{name} {value:,.2f}" for name, value in metrics.items()))
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(current, f, indent=2)
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("corpus") != current["corpus"]:
+        print("Attention : corpus différent de celui de la référence")
+    found = regressions(current, baseline, args.tolerance)
+    for case, name, ref, value in found:
+        print(f"RÉGRESSION {case}.{name} : {ref:,.2f} -> {value:,.2f}")
+    if not found:
+        print(f"Aucune régression (tolérance {args.tolerance:.0%})")
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
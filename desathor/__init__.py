@@ -0,0 +1 @@
+"""Cœur de traitement DESATHOR (extraction PDF, cache, comparaison)."""
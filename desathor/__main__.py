@@ -0,0 +1,5 @@
+import sys
+
+from desathor.cli import main
+
+sys.exit(main())
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+STATUSES = ["OK", "QTY_DIFF", "MISSING_IN_BL"]
+STATUS_COUNTS = {"OK": "n_ok", "QTY_DIFF": "n_diff", "MISSING_IN_BL": "n_missing"}
+
+ORDER_COLUMNS = ["order_num", "qte_commande", "qte_bl", "qte_manquante", "taux_service",
+                 "n_ok", "n_diff", "n_missing", "included"]
+LINE_COLUMNS = ["qte_commande", "qte_bl", "qte_manquante", "qte_absente", "n_lignes", "n_absentes"]
+
+
+def service_rate(qte_cmd, qte_bl):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(qte_cmd > 0, qte_bl / qte_cmd * 100, 0.0)
+
+
+def order_totals(table, hide_unmatched):
+    """Une ligne par commande (ordre de la table longue) : quantités, taux de service, articles par statut.
+
+    included est faux pour une commande sans aucune quantité livrée quand
+    hide_unmatched est actif."""
+    if not len(table):
+        return pd.DataFrame(columns=ORDER_COLUMNS)
+    # Codes de commande 0..n-1 dans l'ordre d'apparition (la table longue est groupée par commande)
+    codes, orders = pd.factorize(table["order_num"].to_numpy())
+    n = len(orders)
+    qte_cmd = np.bincount(codes, weights=table["qte_commande"].to_numpy(dtype=float), minlength=n)
+    qte_bl = np.bincount(codes, weights=table["qte_bl"].to_numpy(dtype=float), minlength=n)
+    status = table["status"].to_numpy()
+    out = pd.DataFrame({
+        "order_num": orders,
+        "qte_commande": qte_cmd,
+        "qte_bl": qte_bl,
+        "qte_manquante": qte_cmd - qte_bl,
+        "taux_service": service_rate(qte_cmd, qte_bl),
+    })
+    for name, column in STATUS_COUNTS.items():
+        out[column] = np.bincount(codes[status == name], minlength=n)
+    out["included"] = (qte_bl != 0) | (not hide_unmatched)
+    return out
+
+
+def line_totals(table, key):
+    """Quantités par key (ref ou code_article) sur les lignes données, clés triées.
+
+    qte_absente et n_absentes : quantité commandée et nombre des lignes MISSING_IN_BL."""
+    missing = table["status"].to_numpy() == "MISSING_IN_BL"
+    lines = table[[key, "qte_commande", "qte_bl"]].assign(
+        qte_absente=np.where(missing, table["qte_commande"].to_numpy(dtype=float), 0.0),
+        n_lignes=1,
+        n_absentes=missing.astype(int),
+    )
+    out = lines.groupby(key, observed=True, sort=True).sum()
+    out["qte_manquante"] = out["qte_commande"] - out["qte_bl"]
+    return out[LINE_COLUMNS].reset_index()
+
+
+def summarize(table, hide_unmatched):
+    """Agrégats d'une comparaison, calculés une fois et relus par toutes les vues.
+
+    orders : une ligne par commande (order_totals) ; ean et articles :
+    quantités par EAN et par code article sur les commandes retenues ;
+    totals : totaux globaux des commandes retenues."""
+    orders = order_totals(table, hide_unmatched)
+    included = orders.loc[orders["included"], "order_num"]
+    if len(included) == len(orders):
+        lines = table
+    else:
+        lines = table[table["order_num"].isin(included)]
+    qte_cmd = float(orders.loc[orders["included"], "qte_commande"].sum())
+    qte_bl = float(orders.loc[orders["included"], "qte_bl"].sum())
+    totals = {
+        "orders": int(len(included)),
+        "qte_commande": qte_cmd,
+        "qte_bl": qte_bl,
+        "qte_manquante": qte_cmd - qte_bl,
+        "taux_service": float(service_rate(np.float64(qte_cmd), np.float64(qte_bl))),
+    }
+    for column in STATUS_COUNTS.values():
+        totals[column] = int(orders.loc[orders["included"], column].sum())
+    return {
+        "hide_unmatched": hide_unmatched,
+        "orders": orders,
+        "ean": line_totals(lines, "ref"),
+        "articles": line_totals(lines, "code_article"),
+        "totals": totals,
+    }
+
+
+def top(frame, column, n=10):
+    """n premières lignes par column décroissante (à égalité, dans l'ordre des clés)"""
+    return frame.sort_values(column, ascending=False, kind="stable").head(n)
+
+
+def nbytes(aggregates):
+    return sum(int(aggregates[name].memory_usage(deep=True).sum()) for name in ("orders", "ean", "articles"))
@@ -0,0 +1,182 @@
+import io
+import multiprocessing
+import os
+import re
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import partial
+
+from desathor.backends import DEFAULT_BACKEND, page_texts
+from desathor.cache import content_key
+from desathor.parallel import DEFAULT_WORKERS, POLL_INTERVAL, parse_bytes
+from desathor.parsing import ExtractionCancelled
+from desathor.records import RecordColumns
+from desathor.store import file_hash
+
+# Mots du chemin d'un membre qui désignent son type (dossiers compris)
+NAME_TOKENS = {
+    "commande": {"commande", "commandes", "cde", "cdes", "cmd", "order", "orders", "po"},
+    "bl": {"bl", "bls", "livraison", "livraisons", "desadv", "delivery"},
+}
+# Texte des premières pages, quand le nom ne suffit pas : un BL rappelle souvent la commande,
+# une commande ne parle pas de bon de livraison
+CONTENT_RULES = [
+    ("bl", re.compile(r"Bon\s+de\s+Livraison", re.IGNORECASE)),
+    ("commande", re.compile(r"Commande\s*n[°º]|N[°º]?\s*commande|L\s+Réf\.\s*frn\s+Code\s+ean", re.IGNORECASE)),
+]
+# Moteur et pages lus pour la classification : une couverture ou un bordereau précède souvent les données
+CLASSIFY_BACKEND = "pdfminer"
+CLASSIFY_PAGES = 3
+
+
+def pdf_members(zf):
+    """Membres PDF d'une archive, dans l'ordre de l'archive (dossiers et métadonnées macOS exclus)"""
+    return [
+        info for info in zf.infolist()
+        if not info.is_dir() and info.filename.lower().endswith(".pdf")
+        and not info.filename.startswith("__MACOSX/") and not os.path.basename(info.filename).startswith("._")
+    ]
+
+
+def member_count(archive):
+    """Nombre de PDF d'une archive (lecture du seul répertoire central)"""
+    with zipfile.ZipFile(archive) as zf:
+        count = len(pdf_members(zf))
+    if hasattr(archive, "seek"):
+        archive.seek(0)
+    return count
+
+
+def kind_from_name(name):
+    tokens = set(re.split(r"[^a-z0-9]+", os.path.splitext(name.lower())[0]))
+    kinds = [kind for kind, words in NAME_TOKENS.items() if tokens & words]
+    return kinds[0] if len(kinds) == 1 else None
+
+
+def kind_from_content(data):
+    try:
+        for text in page_texts(io.BytesIO(data), 0, CLASSIFY_PAGES, backend=CLASSIFY_BACKEND):
+            for kind, pattern in CONTENT_RULES:
+                if text and pattern.search(text):
+                    return kind
+    except Exception:
+        return None
+    return None
+
+
+def classify_member(name, data):
+    """(type, règle) d'un membre : d'après son chemin, sinon d'après ses premières pages ; (None, None) si inconnu"""
+    kind = kind_from_name(name)
+    if kind is not None:
+        return kind, "nom"
+    kind = kind_from_content(data)
+    if kind is not None:
+        return kind, "contenu"
+    return None, None
+
+
+def parse_archive(archive, workers=DEFAULT_WORKERS, cache=None, progress=None, detail=False,
+                  backend=DEFAULT_BACKEND, cancel=None, pool=None, owner=None, window=None):
+    """Extrait les PDF d'une archive ZIP (chemin ou fichier ouvert) membre par membre.
+
+    Chaque membre est décompressé seul, classé commande ou BL
+    (classify_member), puis extrait ; au plus window membres (par défaut
+    deux par processus) sont en mémoire ou en file à la fois, quelle que soit
+    la taille de l'archive. Les membres déjà en cache ne sont pas extraits.
+
+    Retourne un résultat par membre, dans l'ordre de l'archive, au format de
+    parallel.parse_files, plus hash (contenu, pour store.LineStore) et
+    classified_by ("nom" ou "contenu"). Un membre de type inconnu a kind None
+    et une erreur. progress(result, done, total) est appelé à chaque membre
+    terminé. cancel, pool et owner : voir parallel.parse_files ; l'arrêt
+    intervient au plus tard à la fin des membres en cours."""
+    if pool is not None:
+        workers = pool.workers
+    window = window or 2 * max(workers, 1)
+    results = {}
+    done = 0
+    executor = None
+
+    def finish(i, res):
+        nonlocal done
+        # Seuls les membres extraits portent leur clé de cache
+        key = res.pop("key", None)
+        if key is not None and res["error"] is None and cache is not None:
+            cache.put(key, {"records": res["records"], "order_numbers": res["order_numbers"]})
+        results[i] = res
+        done += 1
+        if progress is not None:
+            progress(res, done, total)
+
+    def on_page(page):
+        if cancel is not None and cancel.is_set():
+            raise ExtractionCancelled()
+
+    with zipfile.ZipFile(archive) as zf:
+        members = pdf_members(zf)
+        total = len(members)
+        inline = pool is None and (workers <= 1 or total <= 1)
+        if pool is not None:
+            submit = partial(pool.submit, owner)
+        elif not inline:
+            # "spawn" : on ne duplique pas les threads du serveur Streamlit par fork
+            executor = ProcessPoolExecutor(max_workers=min(workers, total),
+                                           mp_context=multiprocessing.get_context("spawn"))
+            submit = executor.submit
+        inflight = {}
+
+        def collect(block):
+            """Finalise les membres terminés ; si block, attend qu'au moins un se termine"""
+            while inflight:
+                if cancel is not None and cancel.is_set():
+                    for future in inflight:
+                        future.cancel()
+                    wait(inflight)
+                    raise ExtractionCancelled()
+                finished, _ = wait(inflight, timeout=POLL_INTERVAL if block else 0, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    i, base = inflight.pop(future)
+                    try:
+                        res = future.result()
+                    except Exception as e:
+                        res = {"records": RecordColumns.empty(base["kind"]), "order_numbers": [], "error": str(e),
+                               "timings": None}
+                    finish(i, {**base, **res})
+                if finished or not block:
+                    return
+
+        try:
+            for i, info in enumerate(members):
+                if cancel is not None and cancel.is_set():
+                    raise ExtractionCancelled()
+                collect(block=len(inflight) >= window)
+                name = info.filename
+                try:
+                    data = zf.read(info)
+                except Exception as e:
+                    finish(i, {"name": name, "kind": None, "records": None, "order_numbers": [],
+                               "error": f"membre illisible : {e}", "timings": None, "hash": None,
+                               "classified_by": None})
+                    continue
+                kind, rule = classify_member(name, data)
+                base = {"name": name, "kind": kind, "hash": file_hash(data), "classified_by": rule}
+                if kind is None:
+                    finish(i, {**base, "records": None, "order_numbers": [], "timings": None,
+                               "error": "type de document non reconnu (ni commande ni BL)"})
+                    continue
+                key = content_key(kind, data, backend=backend)
+                cached = cache.get(key) if cache is not None else None
+                if cached is not None:
+                    finish(i, {**base, "error": None, "timings": None, **cached})
+                elif inline:
+                    track = on_page if cancel is not None else None
+                    finish(i, {**base, "key": key, **parse_bytes(kind, data, detail, backend, track)})
+                else:
+                    inflight[submit(parse_bytes, kind, data, detail, backend)] = (i, {**base, "key": key})
+                del data
+            while inflight:
+                collect(block=True)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+    return [results[i] for i in range(total)]
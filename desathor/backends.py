@@ -0,0 +1,191 @@
+"""Moteurs d'extraction du texte des pages PDF.
+
+Chaque moteur est un générateur (pdf_file, start, stop, timings, screen) qui
+produit le texte des pages [start, stop), une page à la fois, lignes séparées
+par "\\n". Si screen est fourni, il reçoit d'abord le texte brut de la page
+(caractères dans l'ordre du flux, sans mise en page) ; une page refusée n'est
+pas extraite et le moteur produit None à sa place.
+
+Les parseurs n'ont besoin que de l'ordre des lignes et des mots de chaque
+ligne : le moteur "pdfminer" reconstitue les lignes directement à partir des
+caractères émis par l'interpréteur pdfminer, sans l'analyse de mise en page
+ni les objets caractère de pdfplumber.
+
+pdfplumber et pdfminer ne sont importés qu'à la première extraction : le
+processus de l'interface, qui ne fait que choisir le moteur et lancer les
+analyses, ne les charge pas tant qu'il n'a rien extrait lui-même.
+"""
+import os
+import time
+
+# Tolérances de regroupement, identiques aux valeurs par défaut de pdfplumber (points)
+X_TOLERANCE = 3
+Y_TOLERANCE = 3
+
+
+def record_screened(timings, page, kept, screen_seconds, work_seconds, chars):
+    """Temps d'une page passée au pré-filtre.
+
+    screen_seconds : surcoût de la décision (prescreen) ; work_seconds :
+    travail d'extraction de la page, en extract_text si elle est gardée, en
+    page_skipped (une par page écartée) sinon. chars (caractères du texte
+    brut) est compté en chars_kept ou chars_skipped, pour estimer le gain
+    (metrics.Timings.prescreen_report)."""
+    if timings is None:
+        return
+    timings.add("prescreen", screen_seconds, page=page)
+    timings.add("extract_text" if kept else "page_skipped", work_seconds, page=page)
+    timings.count("chars_kept" if kept else "chars_skipped", chars)
+
+
+def pdfplumber_page_texts(pdf_file, start=0, stop=None, timings=None, screen=None):
+    """Texte des pages par page.extract_text() de pdfplumber.
+
+    Le pré-filtre lit les caractères avec CharCollector, bien moins coûteux
+    que les objets caractère de pdfplumber : une page refusée n'est jamais
+    analysée par pdfplumber. Le cache de mise en page de chaque page
+    (caractères, objets pdfminer) est libéré dès que son texte est extrait :
+    la mémoire ne croît pas avec le nombre de pages déjà lues."""
+    import pdfplumber
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+
+    from desathor.collector import CharCollector
+
+    t0 = time.perf_counter()
+    with pdfplumber.open(pdf_file) as pdf:
+        pages = pdf.pages
+        if screen is not None:
+            rsrcmgr = PDFResourceManager(caching=True)
+            collector = CharCollector(rsrcmgr)
+            interpreter = PDFPageInterpreter(rsrcmgr, collector)
+        if timings is not None:
+            timings.add("pdf_open", time.perf_counter() - t0)
+        stop = len(pages) if stop is None else min(stop, len(pages))
+        for i in range(start, stop):
+            t0 = time.perf_counter()
+            page = pages[i]
+            kept = True
+            if screen is not None:
+                collector.chars = []
+                interpreter.process_page(page.page_obj)
+                raw = collector.raw_text()
+                kept = screen(raw)
+                collector.chars = []
+            t_extract = time.perf_counter()
+            txt = (page.extract_text() or "") if kept else None
+            page.close()
+            # Objets PDF décodés (flux de contenu) mis en cache par pdfminer ; attribut privé, absent
+            # de certaines versions
+            cached = getattr(pdf.doc, "_cached_objs", None)
+            if cached is not None:
+                cached.clear()
+            if screen is not None:
+                record_screened(timings, i, kept, t_extract - t0, time.perf_counter() - t_extract, len(raw))
+            elif timings is not None:
+                timings.add("extract_text", time.perf_counter() - t0, page=i)
+            yield txt
+
+
+def chars_to_text(chars):
+    """Lignes de texte à partir des caractères (y, x0, x1, texte) d'une page.
+
+    Même règles que pdfplumber : les caractères sont regroupés en lignes par
+    position verticale (écart <= Y_TOLERANCE), triés de gauche à droite, et
+    un espace sépare deux mots dès que l'écart horizontal dépasse X_TOLERANCE
+    ou qu'un blanc figure dans le flux."""
+    if not chars:
+        return ""
+    # Haut de page d'abord (y décroissant en coordonnées PDF)
+    chars.sort(key=lambda ch: -ch[0])
+    lines = []
+    line = [chars[0]]
+    last_y = chars[0][0]
+    for ch in chars[1:]:
+        if last_y - ch[0] > Y_TOLERANCE:
+            lines.append(line)
+            line = []
+        line.append(ch)
+        last_y = ch[0]
+    lines.append(line)
+    out = []
+    for line in lines:
+        line.sort(key=lambda ch: ch[1])
+        words = []
+        word = []
+        last_x1 = None
+        for _, x0, x1, text in line:
+            if text.isspace():
+                if word:
+                    words.append("".join(word))
+                    word = []
+                last_x1 = None
+                continue
+            if word and last_x1 is not None and x0 > last_x1 + X_TOLERANCE:
+                words.append("".join(word))
+                word = []
+            word.append(text)
+            last_x1 = x1
+        if word:
+            words.append("".join(word))
+        if words:
+            out.append(" ".join(words))
+    return "\n".join(out)
+
+
+def pdfminer_page_texts(pdf_file, start=0, stop=None, timings=None, screen=None):
+    """Texte des pages reconstitué à partir des caractères de l'interpréteur pdfminer"""
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+    from pdfminer.pdfparser import PDFParser
+
+    from desathor.collector import CharCollector
+
+    t0 = time.perf_counter()
+    doc = PDFDocument(PDFParser(pdf_file))
+    rsrcmgr = PDFResourceManager(caching=True)
+    device = CharCollector(rsrcmgr)
+    interpreter = PDFPageInterpreter(rsrcmgr, device)
+    if timings is not None:
+        timings.add("pdf_open", time.perf_counter() - t0)
+    for i, page in enumerate(PDFPage.create_pages(doc)):
+        if stop is not None and i >= stop:
+            break
+        if i < start:
+            continue
+        t0 = time.perf_counter()
+        device.chars = []
+        interpreter.process_page(page)
+        kept = True
+        if screen is not None:
+            t_screen = time.perf_counter()
+            raw = device.raw_text()
+            kept = screen(raw)
+            screen_seconds = time.perf_counter() - t_screen
+        txt = chars_to_text(device.chars) if kept else None
+        device.chars = []
+        cached = getattr(doc, "_cached_objs", None)
+        if cached is not None:
+            cached.clear()
+        if screen is not None:
+            # Seul le test du texte brut s'ajoute : la lecture des caractères est de toute façon nécessaire
+            record_screened(timings, i, kept, screen_seconds, time.perf_counter() - t0 - screen_seconds, len(raw))
+        elif timings is not None:
+            timings.add("extract_text", time.perf_counter() - t0, page=i)
+        yield txt
+
+
+BACKENDS = {
+    "pdfplumber": pdfplumber_page_texts,
+    "pdfminer": pdfminer_page_texts,
+}
+
+DEFAULT_BACKEND = os.environ.get("DESATHOR_BACKEND", "pdfplumber")
+
+
+def page_texts(pdf_file, start=0, stop=None, timings=None, backend=DEFAULT_BACKEND, screen=None):
+    try:
+        texts = BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Moteur d'extraction inconnu : {backend} (disponibles : {', '.join(BACKENDS)})") from None
+    return texts(pdf_file, start, stop, timings, screen)
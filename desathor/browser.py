@@ -0,0 +1,76 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from desathor.export import STATUS_COLORS
+from desathor.records import EAN_WIDTH
+
+STATUS_FILTERS = {"OK": "n_ok", "QTY_DIFF": "n_diff", "MISSING_IN_BL": "n_missing"}
+
+
+class OrderIndex:
+    """Index des commandes d'une comparaison pour le navigateur paginé, construit une fois par comparaison.
+
+    Filtrage côté serveur sur les agrégats par commande (aggregates.order_totals)
+    et sur un index EAN -> commandes ; la couleur de chaque ligne selon son
+    statut est calculée ici une fois pour toute la table longue, et non par
+    un Styler à chaque affichage."""
+
+    def __init__(self, table, order_stats):
+        self.orders = order_stats[order_stats["included"]].reset_index(drop=True)
+        self._order_text = self.orders["order_num"].astype(str)
+        position = pd.Series(np.arange(len(self.orders)), index=self.orders["order_num"].to_numpy())
+        # Position de la commande de chaque ligne (-1 : commande non retenue)
+        line_orders = position.reindex(table["order_num"].to_numpy()).fillna(-1).to_numpy(dtype=np.int64)
+        kept = line_orders >= 0
+        pairs = pd.DataFrame({"ref": table["ref"].to_numpy()[kept], "order": line_orders[kept]}).drop_duplicates()
+        order_of_pair = pairs["order"].to_numpy()
+        self._ean = {ref: order_of_pair[rows] for ref, rows in pairs.groupby("ref", sort=False).indices.items()}
+        status = table["status"].to_numpy()
+        self.colors = np.select(
+            [status == name for name in STATUS_COLORS],
+            [f"background-color: {color}" for color in STATUS_COLORS.values()],
+            default="",
+        ).astype(object)
+
+    def __len__(self):
+        return len(self.orders)
+
+    def filter(self, statuses=None, rate_range=None, query=""):
+        """Commandes retenues répondant aux filtres, dans l'ordre de la comparaison.
+
+        statuses : au moins un article dans l'un de ces statuts ; rate_range :
+        (min, max) du taux de service en % ; query : partie du numéro de
+        commande, ou EAN exact (commandes qui le contiennent)."""
+        mask = np.ones(len(self.orders), dtype=bool)
+        if statuses:
+            mask &= np.logical_or.reduce([self.orders[STATUS_FILTERS[s]].to_numpy() > 0 for s in statuses])
+        if rate_range is not None:
+            rate = self.orders["taux_service"].to_numpy()
+            mask &= (rate >= rate_range[0]) & (rate <= rate_range[1])
+        query = query.strip()
+        if query:
+            found = self._order_text.str.contains(query, regex=False).to_numpy(dtype=bool, copy=True)
+            if re.fullmatch(r"[0-9]+", query) and len(query) <= EAN_WIDTH:
+                positions = self._ean.get(query.zfill(EAN_WIDTH))
+                if positions is not None:
+                    found[positions] = True
+            mask &= found
+        return self.orders[mask]
+
+    def style(self, df, start, stop):
+        """Styler du tableau d'une commande (lignes [start, stop) de la table longue), couleurs précalculées"""
+        styles = pd.DataFrame("", index=df.index, columns=df.columns)
+        styles["status"] = self.colors[start:stop]
+        return df.style.apply(lambda _: styles, axis=None)
+
+
+def page_count(n_rows, page_size):
+    return max(-(-n_rows // page_size), 1)
+
+
+def page_rows(rows, number, page_size):
+    """Lignes de la page number (à partir de 1)"""
+    start = (number - 1) * page_size
+    return rows.iloc[start:start + page_size]
@@ -0,0 +1,146 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+# À incrémenter dès que la logique d'extraction change : invalide le cache
+PARSER_VERSION = "4"
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "DESATHOR_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "desathor", "parse"),
+)
+DEFAULT_MAX_DISK_BYTES = int(os.environ.get("DESATHOR_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+DEFAULT_MAX_MEMORY_ENTRIES = 256
+
+
+def content_key(kind, data, version=PARSER_VERSION, backend="pdfplumber"):
+    """Clé de cache : type de document + version du parseur + moteur d'extraction + hash du contenu"""
+    h = hashlib.sha256()
+    h.update(f"{kind}:{version}:{backend}:".encode())
+    h.update(data)
+    return h.hexdigest()
+
+
+class ParseCache:
+    """Cache des résultats d'extraction, en mémoire (LRU) et sur disque (LRU borné en taille).
+
+    Les entrées du disque (taille, ordre d'utilisation) sont relues une fois,
+    à la création, puis suivies à chaque lecture, écriture et éviction : une
+    écriture ne parcourt pas le répertoire."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_disk_bytes=DEFAULT_MAX_DISK_BYTES,
+                 max_memory_entries=DEFAULT_MAX_MEMORY_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_entries = max_memory_entries
+        self._memory = OrderedDict()
+        # clé -> taille du fichier, de la moins récemment utilisée à la plus récente
+        self._disk = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._scan_disk()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _scan_disk(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".pkl"):
+                continue
+            try:
+                st_ = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((st_.st_mtime, name[:-len(".pkl")], st_.st_size))
+        entries.sort()
+        self._disk = OrderedDict((key, size) for _, key, size in entries)
+        self._disk_bytes = sum(self._disk.values())
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return self._memory[key]
+        if self.cache_dir:
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    value = pickle.load(f)
+                # Rafraîchit la date d'accès pour l'éviction LRU (au prochain démarrage)
+                os.utime(path, None)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                value = None
+            if value is not None:
+                with self._lock:
+                    self._remember(key, value)
+                    if key in self._disk:
+                        self._disk.move_to_end(key)
+                    self.stats["disk_hits"] += 1
+                return value
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with self._lock:
+            self._disk_bytes += size - self._disk.pop(key, 0)
+            self._disk[key] = size
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """Supprime les entrées les moins récemment utilisées au-delà de la taille maximale (verrou tenu)"""
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def disk_usage(self):
+        if not self.cache_dir:
+            return 0
+        with self._lock:
+            return self._disk_bytes
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._disk.clear()
+            self._disk_bytes = 0
+            self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        if self.cache_dir and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".pkl"):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        pass
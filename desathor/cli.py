@@ -0,0 +1,198 @@
+import argparse
+import os
+import re
+import sys
+import time
+import zipfile
+
+from desathor.aggregates import summarize
+from desathor.backends import BACKENDS, DEFAULT_BACKEND
+from desathor.cache import DEFAULT_CACHE_DIR, ParseCache
+from desathor.core import KIND_LABELS, list_pdfs, read_files, run_comparison
+from desathor.export import LONG_FORMATS, write_excel_report, write_long_report
+from desathor.metrics import Timings, emit_metrics, emit_reconciliation
+from desathor.parallel import DEFAULT_WORKERS
+from desathor.store import DEFAULT_STORE_PATH, LineStore
+
+EXIT_OK = 0
+EXIT_PARSE_ERRORS = 1
+EXIT_USAGE = 2
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="desathor", description="Comparateur commandes / bons de livraison (DESADV)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compare = commands.add_parser("compare", help="compare les PDF de commande et de BL de deux dossiers")
+    compare.add_argument("--orders", help="dossier des PDF de commande")
+    compare.add_argument("--bl", help="dossier des PDF de bon de livraison")
+    compare.add_argument("--archive", action="append", default=[],
+                         help="archive ZIP de PDF classés commande ou BL d'après leur nom ou leur contenu "
+                              "(répétable ; --orders et --bl deviennent facultatifs)")
+    compare.add_argument("--out", help="rapport Excel à écrire (une feuille par commande)")
+    compare.add_argument("--long-out",
+                         help="table longue à écrire (.parquet ou .csv), une ligne par article, et son "
+                              "récapitulatif à côté (<nom>_recapitulatif.<ext>)")
+    compare.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                         help=f"processus d'extraction (défaut : {DEFAULT_WORKERS})")
+    compare.add_argument("--shard-pages", type=int, default=0,
+                         help="découpe les PDF de plus de N pages en segments parallèles (0 = non)")
+    compare.add_argument("--backend", choices=list(BACKENDS), default=DEFAULT_BACKEND,
+                         help=f"moteur d'extraction du texte (défaut : {DEFAULT_BACKEND})")
+    compare.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="cache d'extraction sur disque")
+    compare.add_argument("--no-cache", action="store_true", help="désactive le cache d'extraction")
+    compare.add_argument("--store", default=DEFAULT_STORE_PATH, help="base des lignes extraites (SQLite)")
+    compare.add_argument("--no-store", action="store_true", help="n'archive pas les lignes extraites")
+    compare.add_argument("--keep-unmatched", action="store_true",
+                         help="garde dans le rapport les commandes sans BL")
+    compare.add_argument("--timings", action="store_true", help="affiche les temps par étape et par fichier")
+    compare.add_argument("-q", "--quiet", action="store_true", help="n'affiche pas la progression")
+    lookup = commands.add_parser("lookup", help="lignes déjà archivées d'une commande ou d'un EAN, sans relire les PDF")
+    target = lookup.add_mutually_exclusive_group(required=True)
+    target.add_argument("--order", help="numéro de commande")
+    target.add_argument("--ean", help="EAN")
+    lookup.add_argument("--store", default=DEFAULT_STORE_PATH, help="base des lignes extraites (SQLite)")
+    return parser
+
+
+def print_timings(timings):
+    print("Étape            Temps (s)   Nombre", file=sys.stderr)
+    for row in timings.summary():
+        print(f"{row['stage']:16s} {row['seconds']:>9.3f} {row['count']:>8d}", file=sys.stderr)
+    prescreen = timings.prescreen_report()
+    if prescreen is not None:
+        print(f"Pré-filtre : {prescreen['skipped']}/{prescreen['screened']} page(s) écartée(s), "
+              f"gain estimé {prescreen['saved_seconds']:.3f} s", file=sys.stderr)
+    for f in timings.files:
+        pages = f.get("pages") or []
+        slowest = max(pages, key=lambda p: p.get("extract_text", 0), default=None)
+        line = f"{KIND_LABELS[f['kind']]} {f['name']} : {f['seconds']:.3f} s, {len(pages)} page(s)"
+        if f["cached"]:
+            line += " (cache)"
+        elif slowest is not None:
+            line += f", page la plus lente {slowest['page'] + 1} ({slowest.get('extract_text', 0):.3f} s)"
+        print(line, file=sys.stderr)
+
+
+def summary_path(path):
+    stem, ext = os.path.splitext(path)
+    return f"{stem}_recapitulatif{ext}"
+
+
+def compare_command(args):
+    if not args.out and not args.long_out:
+        print("Indiquez au moins un rapport à écrire (--out ou --long-out).", file=sys.stderr)
+        return EXIT_USAGE
+    long_format = None
+    if args.long_out:
+        formats = {ext: fmt for fmt, (_, ext, _) in LONG_FORMATS.items()}
+        long_format = formats.get(os.path.splitext(args.long_out)[1].lower())
+        if long_format is None:
+            print(f"Extension de --long-out non reconnue (attendue : {', '.join(formats)}).", file=sys.stderr)
+            return EXIT_USAGE
+    if not args.archive and not (args.orders and args.bl):
+        print("--orders et --bl sont requis sans --archive.", file=sys.stderr)
+        return EXIT_USAGE
+    for directory in (args.orders, args.bl):
+        if directory and not os.path.isdir(directory):
+            print(f"Dossier introuvable : {directory}", file=sys.stderr)
+            return EXIT_USAGE
+    for path in args.archive:
+        if not zipfile.is_zipfile(path):
+            print(f"Archive ZIP introuvable ou illisible : {path}", file=sys.stderr)
+            return EXIT_USAGE
+    order_paths = list_pdfs(args.orders) if args.orders else []
+    bl_paths = list_pdfs(args.bl) if args.bl else []
+    if not args.archive and (not order_paths or not bl_paths):
+        print("Aucun PDF de commande ou de BL à comparer.", file=sys.stderr)
+        return EXIT_USAGE
+    files = read_files("commande", order_paths) + read_files("bl", bl_paths)
+    cache = None if args.no_cache else ParseCache(cache_dir=args.cache_dir)
+    start = time.perf_counter()
+
+    def progress(res, done, total):
+        if args.quiet:
+            return
+        label = KIND_LABELS.get(res["kind"], "document")
+        status = f"ERREUR {res['error']}" if res["error"] else f"{len(res['records'])} lignes"
+        if res.get("classified_by"):
+            status += f" (classé d'après le {res['classified_by']})"
+        print(f"[{done}/{total}] {label} {res['name']} : {status}", file=sys.stderr)
+
+    timings = Timings(detail=args.timings)
+    store = None if args.no_store else LineStore(args.store)
+    run = run_comparison(files, workers=args.workers, cache=cache,
+                         shard_pages=args.shard_pages or None, progress=progress, timings=timings,
+                         backend=args.backend, store=store, archives=args.archive)
+    parsed_at = time.perf_counter()
+    table = run["comparison"]["table"]
+    hide_unmatched = not args.keep_unmatched
+    with timings.measure("aggregates"):
+        aggregates = summarize(table, hide_unmatched)
+    reports = []
+    if args.out:
+        with timings.measure("excel_build"):
+            write_excel_report(table, hide_unmatched, args.out, aggregates)
+        reports.append(("Excel", args.out, timings.stages["excel_build"]["seconds"]))
+    if args.long_out:
+        with timings.measure("long_export"):
+            write_long_report(table, hide_unmatched, args.long_out, long_format, summary_path(args.long_out),
+                              aggregates)
+        reports.append((LONG_FORMATS[long_format][0], args.long_out, timings.stages["long_export"]["seconds"]))
+    done_at = time.perf_counter()
+    line = emit_metrics(timings, source="cli", backend=args.backend, n_files=len(run["parsed"]),
+                        errors=len(run["errors"]), orders=len(run["comparison"]["results"]), workers=args.workers,
+                        seconds=round(done_at - start, 4))
+
+    totals = aggregates["totals"]
+    print(f"{len(run['parsed'])} fichier(s) lus en {parsed_at - start:.1f} s, "
+          f"rapport(s) écrit(s) en {done_at - parsed_at:.1f} s")
+    print(f"{totals['orders']} commande(s) dans {', '.join(path for _, path, _ in reports)} | "
+          f"taux de service global {totals['taux_service']:.1f}%")
+    for label, path, seconds in reports:
+        size = os.path.getsize(path) + (os.path.getsize(summary_path(path)) if path == args.long_out else 0)
+        print(f"{label} : {size / 1024 / 1024:.1f} Mo écrits en {seconds:.2f} s")
+    reconciliation = run["comparison"]["reconciliation"]
+    emit_reconciliation(reconciliation, source="cli", run_id=line["run_id"])
+    if len(reconciliation):
+        print(f"{len(reconciliation)} ligne(s) de BL sans n° de commande rattachée(s) "
+              f"({reconciliation['qte_bl'].sum():g} unité(s)) :")
+        for row in reconciliation.itertuples(index=False):
+            print(f"  EAN {row.ref} : {row.qte_bl:g} rattaché(s) à la commande {row.order_num} ({row.rule})")
+    for res in run["errors"]:
+        print(f"Erreur lecture PDF {KIND_LABELS.get(res['kind'], 'document')} ({res['name']}): {res['error']}",
+              file=sys.stderr)
+    if args.timings:
+        print_timings(timings)
+    if cache is not None and not args.quiet:
+        stats = cache.stats
+        print(f"Cache : {stats['memory_hits'] + stats['disk_hits']} hit(s), {stats['misses']} miss", file=sys.stderr)
+    return EXIT_PARSE_ERRORS if run["errors"] else EXIT_OK
+
+
+def lookup_command(args):
+    if not os.path.exists(args.store):
+        print(f"Base introuvable : {args.store}", file=sys.stderr)
+        return EXIT_USAGE
+    # str.isdigit accepte aussi les exposants ("²") et les chiffres non latins
+    if args.ean is not None and not re.fullmatch(r"[0-9]+", args.ean.strip()):
+        print("L'EAN ne doit contenir que des chiffres.", file=sys.stderr)
+        return EXIT_USAGE
+    store = LineStore(args.store)
+    lines = store.order_lines(args.order) if args.order else store.ean_lines(args.ean)
+    if lines.empty:
+        print("Aucune ligne archivée.", file=sys.stderr)
+        return EXIT_OK
+    print(lines.to_string(index=False))
+    if args.order:
+        print()
+        print(store.order_summary(args.order).to_string(index=False))
+    return EXIT_OK
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "compare":
+        return compare_command(args)
+    if args.command == "lookup":
+        return lookup_command(args)
+    return EXIT_USAGE
@@ -0,0 +1,25 @@
+from pdfminer.pdfdevice import PDFTextDevice
+from pdfminer.pdffont import PDFUnicodeNotDefined
+
+
+class CharCollector(PDFTextDevice):
+    """Périphérique pdfminer qui ne garde, pour chaque caractère, que (ligne de base, x0, x1, texte)"""
+
+    def __init__(self, rsrcmgr):
+        super().__init__(rsrcmgr)
+        self.chars = []
+
+    def render_char(self, matrix, font, fontsize, scaling, rise, cid, ncs, graphicstate):
+        try:
+            text = font.to_unichr(cid)
+        except PDFUnicodeNotDefined:
+            text = f"(cid:{cid})"
+        adv = font.char_width(cid) * fontsize * scaling
+        a, b, c, d, e, f = matrix
+        x0 = e + c * rise
+        self.chars.append((f, x0, x0 + a * adv, text))
+        return adv
+
+    def raw_text(self):
+        """Texte des caractères dans l'ordre du flux de contenu"""
+        return "".join(ch[3] for ch in self.chars)
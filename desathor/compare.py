@@ -0,0 +1,169 @@
+from collections.abc import Mapping
+from contextlib import nullcontext
+
+import numpy as np
+import pandas as pd
+
+from desathor.reconcile import empty_reconciliation, reconcile_orphans
+from desathor.records import QTY_COLUMN, RecordBuilder, RecordColumns, ean_to_str
+
+RESULT_COLUMNS = ["ref", "code_article", "qte_commande", "qte_bl", "status", "diff", "taux_service"]
+
+
+class OrderViews(Mapping):
+    """Tables par commande découpées à la demande dans une table longue triée par commande.
+
+    Se comporte comme l'ancien dict {order_num: DataFrame} (ordre d'apparition
+    des commandes, index 0..n-1, sans colonne order_num) sans matérialiser
+    un DataFrame par commande."""
+
+    def __init__(self, table):
+        self.table = table
+        self._bounds = {}
+        if len(table):
+            orders = table["order_num"].to_numpy()
+            starts = np.flatnonzero(np.r_[True, orders[1:] != orders[:-1]])
+            stops = np.r_[starts[1:], len(orders)]
+            for start, stop in zip(starts, stops):
+                self._bounds[orders[start]] = (int(start), int(stop))
+
+    def span(self, order_num):
+        """Lignes [start, stop) de la commande dans la table longue"""
+        return self._bounds[order_num]
+
+    def __getitem__(self, order_num):
+        start, stop = self._bounds[order_num]
+        return self.table.iloc[start:stop].drop(columns="order_num").reset_index(drop=True)
+
+    def __contains__(self, order_num):
+        # Mapping.__contains__ passerait par __getitem__, qui découpe la table
+        return order_num in self._bounds
+
+    def __iter__(self):
+        return iter(self._bounds)
+
+    def __len__(self):
+        return len(self._bounds)
+
+
+def measure(timings, stage, count=1):
+    return timings.measure(stage, count) if timings is not None else nullcontext()
+
+
+def records_frame(records, kind):
+    """DataFrame typé des lignes (RecordColumns, ou liste de dicts au format historique)"""
+    if not isinstance(records, RecordColumns):
+        builder = RecordBuilder(kind)
+        qty = QTY_COLUMN[kind]
+        for rec in records:
+            builder.append(rec["order_num"], rec["ref"], rec[qty], rec.get("code_article", ""))
+        records = builder.finish()
+    return records.to_frame()
+
+
+def appearance_order(df):
+    """Commandes dans l'ordre de première apparition"""
+    order_num = df["order_num"]
+    return list(order_num.cat.categories[pd.unique(order_num.cat.codes)])
+
+
+def aggregate(df, keys, value, orders):
+    """Somme value par (commande, *keys), commandes dans l'ordre donné puis keys triées"""
+    df = df.assign(order_num=pd.Categorical(df["order_num"], categories=orders))
+    if "code_article" in keys:
+        articles = df["code_article"]
+        df["code_article"] = articles.cat.set_categories(sorted(articles.cat.categories))
+    return df.groupby(["order_num"] + keys, observed=True, sort=True, as_index=False)[value].sum()
+
+
+def compare_records(command_records, bl_records, timings=None, reconcile=True):
+    """Compare toutes les lignes de commande aux lignes de BL en une seule jointure.
+
+    Retourne la table longue (une ligne par commande / EAN / code article,
+    triée par commande dans l'ordre d'apparition), les lignes de BL agrégées
+    et les vues par commande (voir comparison_views). Si reconcile est vrai,
+    les quantités de BL lues sans numéro de commande sont d'abord rattachées
+    aux commandes qui les attendent (reconcile.reconcile_orphans)."""
+    with measure(timings, "build_records"):
+        cmd_lines = records_frame(command_records, "commande")
+        bl_lines = records_frame(bl_records, "bl")
+    # Catégories communes : la jointure se fait sur les codes entiers et l'EAN int64
+    with measure(timings, "groupby_merge"):
+        orders = appearance_order(cmd_lines)
+        known = set(orders)
+        orders += [o for o in appearance_order(bl_lines) if o not in known]
+        cmd = aggregate(cmd_lines, ["ref", "code_article"], "qte_commande", orders)
+        bl = aggregate(bl_lines, ["ref"], "qte_bl", orders)
+    reconciliation = empty_reconciliation()
+    if reconcile:
+        with measure(timings, "reconcile"):
+            bl, reconciliation = reconcile_orphans(cmd, bl, orders)
+        if timings is not None and len(reconciliation):
+            timings.count("reconciled_lines", len(reconciliation))
+    with measure(timings, "groupby_merge", count=0):
+        table = cmd.merge(bl, on=["order_num", "ref"], how="left", sort=False)
+    with measure(timings, "status"):
+        table = compute_status(table)
+        bl["ref"] = ean_to_str(bl["ref"]).to_numpy()
+    return comparison_views(table, bl, reconciliation)
+
+
+def compute_status(table):
+    """status, diff et taux_service en opérations par colonne ; ref remise en chaîne"""
+    table["qte_commande"] = pd.to_numeric(table["qte_commande"], errors="coerce").fillna(0)
+    table["qte_bl"] = pd.to_numeric(table["qte_bl"], errors="coerce").fillna(0).astype(float)
+    qte_cmd = table["qte_commande"].to_numpy()
+    qte_bl = table["qte_bl"].to_numpy()
+    table["status"] = np.select(
+        [qte_bl == 0, qte_cmd == qte_bl],
+        ["MISSING_IN_BL", "OK"],
+        default="QTY_DIFF",
+    ).astype(object)
+    table["diff"] = qte_bl - qte_cmd
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.minimum(qte_bl / qte_cmd * 100, 100)
+    table["taux_service"] = np.where(qte_cmd == 0, 0.0, rate)
+    table["ref"] = ean_to_str(table["ref"]).to_numpy()
+    return table[["order_num"] + RESULT_COLUMNS]
+
+
+def _replace_orders(old, new, touched, orders, article_categories=None):
+    """old sans les commandes touched, plus new ; lignes regroupées par commande dans l'ordre orders"""
+    frames = [old[~old["order_num"].isin(touched)], new]
+    frames = [df.assign(order_num=df["order_num"].cat.set_categories(orders)) for df in frames if len(df)]
+    if article_categories is not None:
+        frames = [df.assign(code_article=df["code_article"].cat.set_categories(article_categories)) for df in frames]
+    if not frames:
+        return new.iloc[:0]
+    out = pd.concat(frames, ignore_index=True)
+    # Chaque commande vient d'un seul des deux blocs : le tri stable garde l'ordre de ses lignes
+    return out.sort_values("order_num", kind="stable", ignore_index=True)
+
+
+def patch_comparison(previous, partial, touched, orders, article_categories):
+    """Remplace dans la comparison previous les commandes touched par leur recalcul partial.
+
+    partial vient de compare_records sur les seules lignes des commandes
+    touched ; orders est l'ordre des commandes de la comparaison complète
+    et article_categories ses codes article (triés). Le résultat est
+    identique à un recalcul complet. Les rattachements de lignes sans
+    commande sont ceux de partial : touched doit alors couvrir toutes les
+    commandes (voir incremental.IncrementalComparison)."""
+    table = _replace_orders(previous["table"], partial["table"], touched, orders, article_categories)
+    bl = _replace_orders(previous["bl"], partial["bl"], touched, orders)
+    return comparison_views(table, bl, partial["reconciliation"])
+
+
+def comparison_views(table, bl, reconciliation=None):
+    """Vues par commande attendues par l'interface, à partir de la table longue et des lignes de BL agrégées.
+
+    Les vues découpent les tables sans les copier. reconciliation : lignes de
+    BL sans commande rattachées (vide pour une comparaison relue de
+    l'historique)."""
+    return {
+        "table": table,
+        "bl": bl,
+        "results": OrderViews(table),
+        "bls_dict": OrderViews(bl),
+        "reconciliation": reconciliation if reconciliation is not None else empty_reconciliation(),
+    }
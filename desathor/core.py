@@ -0,0 +1,96 @@
+import os
+
+from desathor.archive import member_count, parse_archive
+from desathor.backends import DEFAULT_BACKEND
+from desathor.compare import compare_records, measure
+from desathor.parallel import DEFAULT_WORKERS, parse_files
+from desathor.records import RecordColumns
+
+KIND_LABELS = {"commande": "commande", "bl": "BL"}
+
+
+def list_pdfs(directory):
+    """Chemins des PDF d'un dossier (non récursif), triés par nom"""
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.lower().endswith(".pdf") and os.path.isfile(os.path.join(directory, name))
+    )
+
+
+def read_files(kind, paths):
+    """[(kind, nom, contenu)] pour parse_files"""
+    files = []
+    for path in paths:
+        with open(path, "rb") as f:
+            files.append((kind, os.path.basename(path), f.read()))
+    return files
+
+
+def merge_file_timings(timings, parsed):
+    """Ajoute à timings les temps de chaque fichier extrait par parse_files"""
+    if timings is None:
+        return
+    for res in parsed:
+        file_info = {"name": res["name"], "kind": res["kind"], "records": len(res["records"]),
+                     "cached": res["timings"] is None, "error": bool(res["error"])}
+        timings.merge(res["timings"] or {}, file=file_info)
+
+
+def ingest_lines(store, files, parsed, timings=None, members=()):
+    """Archive dans store (store.LineStore) les lignes des fichiers extraits qui n'y sont pas encore.
+
+    members : résultats de archive.parse_archive, qui portent déjà le hash de leur contenu."""
+    if store is None:
+        return 0
+    with measure(timings, "store_ingest"):
+        return store.ingest_parsed(files, parsed) + store.ingest_hashed((res["hash"], res) for res in members)
+
+
+def run_comparison(files, workers=DEFAULT_WORKERS, cache=None, shard_pages=None, progress=None, timings=None,
+                   backend=DEFAULT_BACKEND, store=None, page_progress=None, cancel=None, pool=None, owner=None,
+                   archives=()):
+    """Extrait les fichiers [(kind, nom, contenu)] puis compare commandes et BL.
+
+    Retourne les résultats d'extraction par fichier (parsed), ceux en erreur
+    (errors) et la comparaison (voir compare.compare_records). timings
+    (metrics.Timings) reçoit les temps par étape, par fichier et par page.
+    backend : moteur d'extraction du texte (voir backends.BACKENDS). Si store
+    (store.LineStore) est fourni, les lignes des nouveaux fichiers y sont archivées.
+    page_progress, cancel, pool et owner : voir parallel.parse_files.
+
+    archives : archives ZIP (chemins ou fichiers ouverts) dont les PDF sont
+    extraits un à un et classés commande ou BL (archive.parse_archive) ;
+    leurs membres suivent files dans parsed, et ceux de type inconnu sont
+    listés dans skipped (et dans errors). progress compte alors fichiers et
+    membres ensemble ; page_progress et shard_pages ne s'appliquent qu'à files."""
+    offset = 0
+    total = len(files) + sum(member_count(archive) for archive in archives)
+
+    def overall(res, done, _):
+        if progress is not None:
+            progress(res, offset + done, total)
+
+    parsed = parse_files(files, workers=workers, cache=cache, shard_pages=shard_pages,
+                         progress=overall if archives else progress,
+                         detail=timings is not None and timings.detail, backend=backend,
+                         page_progress=page_progress, cancel=cancel, pool=pool, owner=owner)
+    members = []
+    for archive in archives:
+        offset = len(files) + len(members)
+        members += parse_archive(archive, workers=workers, cache=cache, progress=overall,
+                                 detail=timings is not None and timings.detail, backend=backend,
+                                 cancel=cancel, pool=pool, owner=owner)
+    skipped = [res for res in members if res["kind"] is None]
+    members = [res for res in members if res["kind"] is not None]
+    merge_file_timings(timings, parsed + members)
+    ingest_lines(store, files, parsed, timings, members)
+    parsed += members
+    command_records = RecordColumns.concat("commande", [res["records"] for res in parsed if res["kind"] == "commande"])
+    bl_records = RecordColumns.concat("bl", [res["records"] for res in parsed if res["kind"] == "bl"])
+    return {
+        "parsed": parsed,
+        "errors": [res for res in parsed if res["error"]] + skipped,
+        "skipped": skipped,
+        "comparison": compare_records(command_records, bl_records, timings),
+    }
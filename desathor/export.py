@@ -0,0 +1,151 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from desathor.aggregates import order_totals
+from desathor.compare import RESULT_COLUMNS, OrderViews
+
+STATUS_COLORS = {
+    "OK": "#d4edda",
+    "QTY_DIFF": "#fff3cd",
+    "MISSING_IN_BL": "#f8d7da",
+}
+# Table longue : une ligne par article, toutes commandes confondues
+LONG_COLUMNS = ["order_num"] + RESULT_COLUMNS
+# Formats de la table longue : libellé, extension et type MIME
+LONG_FORMATS = {
+    "parquet": ("Parquet", ".parquet", "application/vnd.apache.parquet"),
+    "csv": ("CSV", ".csv", "text/csv"),
+}
+# Lignes par groupe Parquet et par bloc CSV
+LONG_CHUNK_ROWS = 100_000
+SUMMARY_COLUMNS = [
+    "Commande",
+    "Taux de service (%)",
+    "Qté commandée",
+    "Qté livrée",
+    "Qté manquante",
+    "Articles OK",
+    "Articles différence",
+    "Articles manquants",
+]
+
+
+def included_orders(table, hide_unmatched, aggregates=None):
+    """Commandes retenues pour l'export (sans BL quand hide_unmatched est actif)"""
+    orders = order_totals(table, hide_unmatched) if aggregates is None else aggregates["orders"]
+    return orders.loc[orders["included"], "order_num"].tolist()
+
+
+def summary_frame(orders):
+    """Récapitulatif par commande à partir des agrégats par commande (aggregates.order_totals)"""
+    return pd.DataFrame({
+        "Commande": orders["order_num"].to_numpy(),
+        "Taux de service (%)": np.round(orders["taux_service"].to_numpy(dtype=float), 2),
+        "Qté commandée": orders["qte_commande"].to_numpy().astype(int),
+        "Qté livrée": orders["qte_bl"].to_numpy().astype(int),
+        "Qté manquante": orders["qte_manquante"].to_numpy().astype(int),
+        "Articles OK": orders["n_ok"].to_numpy(),
+        "Articles différence": orders["n_diff"].to_numpy(),
+        "Articles manquants": orders["n_missing"].to_numpy(),
+    }, columns=SUMMARY_COLUMNS)
+
+
+def _write_frame(worksheet, columns, rows):
+    worksheet.write_row(0, 0, columns)
+    for i, row in enumerate(rows, start=1):
+        worksheet.write_row(i, 0, row)
+
+
+def write_excel_report(table, hide_unmatched, output, aggregates=None):
+    """Écrit le classeur (une feuille C_<commande> par commande + Récapitulatif) dans output.
+
+    Mode constant_memory d'xlsxwriter : chaque ligne est écrite sur disque dès
+    qu'elle est complète. La couleur des lignes vient d'une mise en forme
+    conditionnelle par plage sur la colonne status, avec trois formats créés
+    une seule fois pour tout le classeur. Le Récapitulatif vient des agrégats
+    de la comparaison (aggregates.summarize) s'ils sont fournis."""
+    import xlsxwriter
+
+    order_stats = order_totals(table, hide_unmatched) if aggregates is None else aggregates["orders"]
+    order_stats = order_stats[order_stats["included"]]
+    orders = order_stats["order_num"].tolist()
+    views = OrderViews(table)
+    workbook = xlsxwriter.Workbook(output, {
+        "constant_memory": True,
+        # Valeurs écrites telles quelles : pas de détection d'URL ni de formule par cellule
+        "strings_to_urls": False,
+        "strings_to_formulas": False,
+    })
+    formats = {status: workbook.add_format({"bg_color": color}) for status, color in STATUS_COLORS.items()}
+    status_col = xlsxwriter.utility.xl_col_to_name(RESULT_COLUMNS.index("status"))
+    last_col = len(RESULT_COLUMNS) - 1
+    # Conversion en valeurs Python une seule fois pour toute la table
+    all_rows = table[RESULT_COLUMNS].astype({"code_article": str}).to_numpy().tolist()
+    for order_num in orders:
+        start, stop = views.span(order_num)
+        rows = all_rows[start:stop]
+        worksheet = workbook.add_worksheet(f"C_{order_num}"[:31])
+        _write_frame(worksheet, RESULT_COLUMNS, rows)
+        if rows:
+            for status, fmt in formats.items():
+                worksheet.conditional_format(1, 0, len(rows), last_col, {
+                    "type": "formula",
+                    "criteria": f'=${status_col}2="{status}"',
+                    "format": fmt,
+                })
+    summary = summary_frame(order_stats)
+    _write_frame(workbook.add_worksheet("Récapitulatif"), SUMMARY_COLUMNS, summary.to_numpy().tolist())
+    workbook.close()
+
+
+def long_frame(table, hide_unmatched, aggregates=None):
+    """Lignes (LONG_COLUMNS) des commandes retenues pour l'export, dans l'ordre de la table"""
+    orders = order_totals(table, hide_unmatched) if aggregates is None else aggregates["orders"]
+    frame = table[LONG_COLUMNS]
+    if not orders["included"].all():
+        frame = frame[frame["order_num"].isin(orders.loc[orders["included"], "order_num"]).to_numpy()]
+    # Catégories réduites aux valeurs écrites (dictionnaire Parquet)
+    return frame.assign(**{
+        column: frame[column].cat.remove_unused_categories()
+        for column in ("order_num", "code_article") if isinstance(frame[column].dtype, pd.CategoricalDtype)
+    }).reset_index(drop=True)
+
+
+def write_frame(frame, output, fmt, chunk_rows=LONG_CHUNK_ROWS):
+    """Écrit frame dans output (chemin ou fichier binaire) au format fmt (LONG_FORMATS), bloc par bloc.
+
+    Parquet : un groupe de lignes par bloc, compression zstd. CSV : en-tête
+    puis blocs de chunk_rows lignes encodés l'un après l'autre, sans
+    construire le texte du fichier entier."""
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), output, row_group_size=chunk_rows,
+                       compression="zstd")
+        return
+    if fmt != "csv":
+        raise ValueError(f"Format d'export inconnu : {fmt} (disponibles : {', '.join(LONG_FORMATS)})")
+    handle = open(output, "wb") if isinstance(output, (str, os.PathLike)) else output
+    try:
+        for start in range(0, max(len(frame), 1), chunk_rows):
+            handle.write(frame.iloc[start:start + chunk_rows].to_csv(index=False, header=start == 0).encode())
+    finally:
+        if handle is not output:
+            handle.close()
+
+
+def write_long_report(table, hide_unmatched, output, fmt="parquet", summary_output=None, aggregates=None):
+    """Écrit la table longue des commandes retenues dans output, et le Récapitulatif dans summary_output.
+
+    Même contenu que le classeur de write_excel_report sans la découpe en
+    feuilles : une ligne par article avec son numéro de commande, pour les
+    outils d'analyse. Retourne le nombre de lignes écrites."""
+    frame = long_frame(table, hide_unmatched, aggregates)
+    write_frame(frame, output, fmt)
+    if summary_output is not None:
+        order_stats = order_totals(table, hide_unmatched) if aggregates is None else aggregates["orders"]
+        write_frame(summary_frame(order_stats[order_stats["included"]]), summary_output, fmt)
+    return len(frame)
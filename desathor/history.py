@@ -0,0 +1,202 @@
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+import weakref
+
+import pandas as pd
+
+from desathor.aggregates import nbytes, summarize
+from desathor.compare import comparison_views
+from desathor.reconcile import empty_reconciliation
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+DEFAULT_MAX_MEMORY_BYTES = int(os.environ.get("DESATHOR_HISTORY_MAX_BYTES", 64 * 1024 * 1024))
+HISTORY_DIR = os.environ.get("DESATHOR_HISTORY_DIR", os.path.join(tempfile.gettempdir(), "desathor", "history"))
+
+# Historiques vivants du processus (une entrée par session Streamlit), pour le suivi admin
+_STORES = weakref.WeakSet()
+_STORES_LOCK = threading.Lock()
+
+
+def frame_bytes(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+def write_frame(df, path):
+    if PARQUET_AVAILABLE:
+        df.to_parquet(path, index=False)
+    else:
+        df.to_pickle(path)
+
+
+def read_frame(path):
+    if PARQUET_AVAILABLE:
+        return pd.read_parquet(path)
+    return pd.read_pickle(path)
+
+
+class HistoryEntry:
+    """Une comparaison de l'historique : table longue + lignes de BL agrégées.
+
+    Les vues par commande (results, bls_dict) sont construites une fois à
+    partir de ces deux tables et gardées tant que l'entrée est en mémoire ;
+    les tables sont écrites sur disque quand l'entrée sort du budget
+    mémoire. Les agrégats (aggregates.summarize) et les lignes de BL sans
+    commande rattachées (reconcile), bien plus petits, restent toujours en
+    mémoire : l'affichage des totaux ne relit jamais le disque."""
+
+    def __init__(self, timestamp, hide_unmatched, table, bl, aggregates=None, reconciliation=None, run_id=None):
+        # Identifiant stable de la comparaison (clé des exports mis en cache)
+        self.key = uuid.uuid4().hex
+        # run_id des métriques de l'analyse (metrics.emit_metrics), repris par celles de l'export et des graphiques
+        self.run_id = run_id
+        self.timestamp = timestamp
+        self.hide_unmatched = hide_unmatched
+        self.table = table
+        self.bl = bl
+        self.aggregates = aggregates if aggregates is not None else summarize(table, hide_unmatched)
+        self.reconciliation = reconciliation if reconciliation is not None else empty_reconciliation()
+        self.paths = None
+        self.nbytes = frame_bytes(table) + frame_bytes(bl)
+        self.aggregates_bytes = nbytes(self.aggregates) + frame_bytes(self.reconciliation)
+        self.disk_bytes = 0
+        self._views = None
+
+    @property
+    def spilled(self):
+        return self.table is None
+
+    def spill(self, directory):
+        ext = "parquet" if PARQUET_AVAILABLE else "pkl"
+        base = os.path.join(directory, f"{id(self):x}")
+        self.paths = (f"{base}_table.{ext}", f"{base}_bl.{ext}")
+        write_frame(self.table, self.paths[0])
+        write_frame(self.bl, self.paths[1])
+        self.disk_bytes = sum(os.path.getsize(p) for p in self.paths)
+        self.table = None
+        self.bl = None
+        self._views = None
+
+    def frames(self):
+        if not self.spilled:
+            return self.table, self.bl
+        return read_frame(self.paths[0]), read_frame(self.paths[1])
+
+    def discard(self):
+        for path in self.paths or ():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def as_dict(self):
+        """Format comparison_data attendu par l'interface (vues construites une fois par entrée en mémoire)"""
+        if self._views is not None:
+            return self._views
+        table, bl = self.frames()
+        views = {"key": self.key, "run_id": self.run_id, "timestamp": self.timestamp,
+                 "hide_unmatched": self.hide_unmatched, "aggregates": self.aggregates,
+                 **comparison_views(table, bl, self.reconciliation)}
+        if not self.spilled:
+            self._views = views
+        return views
+
+
+class HistoryStore:
+    """Historique des comparaisons d'une session, borné en mémoire.
+
+    Au-delà de max_memory_bytes, les entrées les plus anciennes sont écrites
+    sur disque (Parquet si pyarrow est installé, pickle sinon) et relues à la
+    demande ; la plus récente reste toujours en mémoire."""
+
+    def __init__(self, owner=None, max_memory_bytes=DEFAULT_MAX_MEMORY_BYTES, directory=HISTORY_DIR):
+        self.owner = owner
+        self.max_memory_bytes = max_memory_bytes
+        self._entries = []
+        self._directory = None
+        self._base_directory = directory
+        self._loaded = None
+        with _STORES_LOCK:
+            _STORES.add(self)
+
+    @property
+    def directory(self):
+        if self._directory is None:
+            os.makedirs(self._base_directory, exist_ok=True)
+            self._directory = tempfile.mkdtemp(dir=self._base_directory)
+            # Nettoyage des fichiers à la disparition de la session
+            weakref.finalize(self, shutil.rmtree, self._directory, True)
+        return self._directory
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __bool__(self):
+        return bool(self._entries)
+
+    def __getitem__(self, index):
+        entry = self._entries[index]
+        if not entry.spilled:
+            return entry.as_dict()
+        # Une seule entrée relue depuis le disque est gardée à la fois
+        if self._loaded is None or self._loaded[0] is not entry:
+            self._loaded = (entry, entry.as_dict())
+        return self._loaded[1]
+
+    def entries(self):
+        return list(self._entries)
+
+    def append(self, timestamp, hide_unmatched, table, bl, aggregates=None, reconciliation=None, run_id=None):
+        self._entries.append(HistoryEntry(timestamp, hide_unmatched, table, bl, aggregates, reconciliation, run_id))
+        self._enforce_budget()
+
+    def pop(self, index=-1):
+        entry = self._entries.pop(index)
+        entry.discard()
+        self._loaded = None
+        return entry
+
+    def clear(self):
+        for entry in self._entries:
+            entry.discard()
+        self._entries = []
+        self._loaded = None
+
+    def memory_bytes(self):
+        return sum(entry.aggregates_bytes + (0 if entry.spilled else entry.nbytes) for entry in self._entries)
+
+    def disk_bytes(self):
+        return sum(entry.disk_bytes for entry in self._entries if entry.spilled)
+
+    def _enforce_budget(self):
+        total = self.memory_bytes()
+        for entry in self._entries[:-1]:
+            if total <= self.max_memory_bytes:
+                break
+            if entry.spilled:
+                continue
+            entry.spill(self.directory)
+            total -= entry.nbytes
+
+
+def session_usage():
+    """Occupation mémoire / disque de chaque historique vivant du processus"""
+    with _STORES_LOCK:
+        stores = list(_STORES)
+    return [
+        {
+            "owner": store.owner,
+            "entries": len(store),
+            "in_memory": sum(1 for e in store.entries() if not e.spilled),
+            "memory_bytes": store.memory_bytes(),
+            "disk_bytes": store.disk_bytes(),
+        }
+        for store in stores
+    ]
@@ -0,0 +1,150 @@
+from collections import Counter
+
+from desathor.backends import DEFAULT_BACKEND
+from desathor.cache import content_key
+from desathor.compare import compare_records, measure, patch_comparison
+from desathor.core import ingest_lines, merge_file_timings, run_comparison
+from desathor.parallel import DEFAULT_WORKERS, parse_files
+from desathor.records import NO_ORDER, RecordColumns
+
+
+def order_count(comparison):
+    """Commandes d'une comparaison, sans les lignes de BL restées sans numéro (NO_ORDER)"""
+    return sum(order != NO_ORDER for order in comparison["results"])
+
+
+class IncrementalComparison:
+    """Comparaison tenue à jour au fil des ajouts et retraits de fichiers (une par session).
+
+    Les fichiers déjà inclus dans le résultat sont reconnus par le hash de
+    leur contenu : seuls les nouveaux sont extraits, et seules les commandes
+    présentes dans les lignes ajoutées ou retirées sont recomparées puis
+    remises à leur place dans la table longue ; si des lignes de BL sans
+    numéro de commande sont en jeu, toutes les lignes déjà extraites sont
+    recomparées d'un bloc. Le résultat est identique à
+    un recalcul complet (full=True), qui reste disponible à tout moment."""
+
+    def __init__(self):
+        self.entries = {}
+        self.keys = []
+        self.backend = None
+        self.comparison = None
+
+    def reset(self):
+        self.entries = {}
+        self.keys = []
+        self.backend = None
+        self.comparison = None
+
+    def run(self, files, workers=DEFAULT_WORKERS, cache=None, shard_pages=None, progress=None, timings=None,
+            backend=DEFAULT_BACKEND, full=False, store=None, page_progress=None, cancel=None, pool=None,
+            owner=None, archives=()):
+        """Met la comparaison à jour pour files [(kind, nom, contenu)] ; même retour que core.run_comparison.
+
+        "update" décrit la mise à jour : mode ("full", "incremental" ou
+        "archive"), fichiers ajoutés et retirés, commandes recalculées. Une
+        extraction interrompue (cancel) laisse la comparaison précédente intacte.
+        Avec archives (voir core.run_comparison), le recalcul est complet : le
+        contenu des membres n'est pas conservé, la mise à jour suivante repart
+        donc de zéro."""
+        if archives:
+            run = run_comparison(files, workers=workers, cache=cache, shard_pages=shard_pages, progress=progress,
+                                 timings=timings, backend=backend, store=store, page_progress=page_progress,
+                                 cancel=cancel, pool=pool, owner=owner, archives=archives)
+            self.reset()
+            run["update"] = {"mode": "archive", "added": len(run["parsed"]), "removed": 0,
+                             "touched_orders": order_count(run["comparison"])}
+            return run
+        keys = [content_key(kind, data, backend=backend) for kind, _, data in files]
+        if full or self.comparison is None or backend != self.backend:
+            return self._full(files, keys, workers, cache, shard_pages, progress, timings, backend, store,
+                              page_progress=page_progress, cancel=cancel, pool=pool, owner=owner)
+
+        added = [i for i, key in enumerate(keys) if key not in self.entries]
+        parsed = parse_files([files[i] for i in added], workers=workers, cache=cache, shard_pages=shard_pages,
+                             progress=progress, detail=timings is not None and timings.detail, backend=backend,
+                             page_progress=page_progress, cancel=cancel, pool=pool, owner=owner)
+        merge_file_timings(timings, parsed)
+        ingest_lines(store, [files[i] for i in added], parsed, timings)
+        for i, res in zip(added, parsed):
+            if not res["error"]:
+                self._store(keys[i], res)
+
+        # Un fichier compte autant de fois qu'il est fourni, comme dans un recalcul complet
+        before, after = Counter(self.keys), Counter(k for k in keys if k in self.entries)
+        changed = [key for key in before.keys() | after.keys() if before[key] != after[key]]
+        touched = set()
+        for key in changed:
+            touched.update(self.entries[key]["orders"])
+        previous_orders = self._orders()
+        removed = [key for key in before if key not in after]
+        for key in removed:
+            del self.entries[key]
+        self.keys = [key for key in keys if key in self.entries]
+        current = [self.entries[key] for key in self.keys]
+        if touched and (NO_ORDER in previous_orders or NO_ORDER in self._orders()):
+            # Les lignes de BL sans commande sont réparties entre toutes les commandes : une
+            # comparaison complète des lignes déjà extraites coûte moins qu'un recollage par commande
+            self.comparison = compare_records(
+                RecordColumns.concat("commande", [e["records"] for e in current if e["kind"] == "commande"]),
+                RecordColumns.concat("bl", [e["records"] for e in current if e["kind"] == "bl"]),
+                timings,
+            )
+            touched = set(self.comparison["results"])
+        elif touched:
+            partial = compare_records(
+                RecordColumns.concat("commande", [e["records"].select_orders(touched)
+                                                  for e in current if e["kind"] == "commande"]),
+                RecordColumns.concat("bl", [e["records"].select_orders(touched)
+                                            for e in current if e["kind"] == "bl"]),
+                timings,
+            )
+            with measure(timings, "patch_results"):
+                self.comparison = patch_comparison(self.comparison, partial, touched, self._orders(),
+                                                   self._article_categories())
+        # Les lignes sans numéro ne forment pas une commande
+        touched.discard(NO_ORDER)
+        return {
+            "parsed": parsed,
+            "errors": [res for res in parsed if res["error"]],
+            "comparison": self.comparison,
+            "update": {"mode": "incremental", "added": len(added), "removed": len(removed),
+                       "touched_orders": len(touched)},
+        }
+
+    def _full(self, files, keys, workers, cache, shard_pages, progress, timings, backend, store, **parse_options):
+        run = run_comparison(files, workers=workers, cache=cache, shard_pages=shard_pages, progress=progress,
+                             timings=timings, backend=backend, store=store, **parse_options)
+        self.reset()
+        self.backend = backend
+        for key, res in zip(keys, run["parsed"]):
+            if not res["error"]:
+                self._store(key, res)
+        self.keys = [key for key in keys if key in self.entries]
+        self.comparison = run["comparison"]
+        run["update"] = {"mode": "full", "added": len(files), "removed": 0,
+                         "touched_orders": order_count(self.comparison)}
+        return run
+
+    def _store(self, key, res):
+        self.entries[key] = {"kind": res["kind"], "name": res["name"], "records": res["records"],
+                             "orders": res["records"].appearance()}
+
+    def _orders(self):
+        """Ordre des commandes d'un recalcul complet : apparition dans les commandes, puis dans les BL"""
+        orders = {}
+        for kind in ("commande", "bl"):
+            for key in self.keys:
+                entry = self.entries[key]
+                if entry["kind"] == kind:
+                    for order in entry["orders"]:
+                        orders.setdefault(order)
+        return list(orders)
+
+    def _article_categories(self):
+        articles = set()
+        for key in self.keys:
+            entry = self.entries[key]
+            if entry["kind"] == "commande" and len(entry["records"]):
+                articles.update(entry["records"].article_categories)
+        return sorted(articles)
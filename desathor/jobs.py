@@ -0,0 +1,187 @@
+import logging
+import os
+import threading
+import time
+import uuid
+
+from desathor.parallel import DEFAULT_WORKERS
+from desathor.parsing import ExtractionCancelled
+
+# Durée de conservation d'un travail terminé dont le résultat n'a pas été récupéré (secondes)
+KEEP_FINISHED_SECONDS = 3600
+# Comparaisons exécutées en même temps au plus ; les suivantes attendent leur tour
+DEFAULT_MAX_RUNNING_JOBS = int(os.environ.get("DESATHOR_MAX_RUNNING_JOBS", 2 * DEFAULT_WORKERS))
+# Intervalle de vérification de l'annulation d'un travail en attente (secondes)
+ADMISSION_POLL = 0.2
+
+logger = logging.getLogger(__name__)
+
+
+class ComparisonJob:
+    """Comparaison exécutée dans un thread, indépendamment des réexécutions du script Streamlit.
+
+    target(job) fait le travail et retourne le résultat ; il transmet
+    job.file_done, job.page_done et job.cancel_event à parse_files
+    (progress, page_progress, cancel). Le travail ne touche jamais à
+    st.session_state : la session récupère le résultat quand il est terminé."""
+
+    def __init__(self, owner, target, slots=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.owner = owner
+        self.target = target
+        self.status = "pending"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.files_done = 0
+        self.files_total = None
+        self.last_file = None
+        self.file_errors = []
+        self.pages_done = 0
+        self.pages_total = None
+        self.first_page_at = None
+        self.cancel_event = threading.Event()
+        self._slots = slots
+        self._thread = None
+
+    @property
+    def running(self):
+        return self.status in ("pending", "running")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"desathor-job-{self.id}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        if not self._admit():
+            self.status = "cancelled"
+            self.finished_at = time.time()
+            return
+        self.status = "running"
+        self.started_at = time.time()
+        try:
+            self.result = self.target(self)
+        except ExtractionCancelled:
+            self.status = "cancelled"
+        except Exception as e:
+            logger.exception("Échec du travail %s", self.id)
+            self.error = str(e)
+            self.status = "error"
+        else:
+            self.status = "done"
+        finally:
+            self.finished_at = time.time()
+            if self._slots is not None:
+                self._slots.release()
+
+    def _admit(self):
+        """Attend une place parmi les travaux en cours ; False si le travail est annulé avant"""
+        if self._slots is None:
+            return True
+        while not self._slots.acquire(timeout=ADMISSION_POLL):
+            if self.cancel_event.is_set():
+                return False
+        if self.cancel_event.is_set():
+            self._slots.release()
+            return False
+        return True
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def file_done(self, result, done, total):
+        self.files_done = done
+        self.files_total = total
+        self.last_file = result["name"]
+        if result["error"]:
+            self.file_errors.append((result["name"], result["error"]))
+
+    def page_done(self, done, total):
+        if self.first_page_at is None:
+            self.first_page_at = time.time()
+        self.pages_done = done
+        self.pages_total = total
+
+    def progress(self):
+        """Avancement : fichiers et pages terminés, dernier fichier, erreurs, débit (pages/s), temps restant (s)"""
+        now = self.finished_at or time.time()
+        elapsed = now - self.started_at if self.started_at else 0.0
+        rate = None
+        eta = None
+        if self.first_page_at is not None and self.pages_done:
+            # Débit compté depuis la première page : ni le comptage des pages ni l'attente de place
+            rate = self.pages_done / max(now - self.first_page_at, 1e-6)
+            eta = (self.pages_total - self.pages_done) / rate
+        if self.pages_total:
+            fraction = self.pages_done / self.pages_total
+        elif self.files_total:
+            fraction = self.files_done / self.files_total
+        else:
+            fraction = 0.0
+        return {
+            "status": self.status,
+            "files_done": self.files_done,
+            "files_total": self.files_total,
+            "last_file": self.last_file,
+            "file_errors": list(self.file_errors),
+            "pages_done": self.pages_done,
+            "pages_total": self.pages_total,
+            "fraction": min(fraction, 1.0),
+            "pages_per_second": rate,
+            "eta_seconds": eta,
+            "elapsed_seconds": elapsed,
+        }
+
+
+class JobRegistry:
+    """Travaux du processus, retrouvés par identifiant d'une réexécution du script à l'autre.
+
+    Partagé par toutes les sessions (st.cache_resource) ; chaque session ne
+    garde que l'identifiant de son travail en cours. Au plus max_running
+    travaux s'exécutent à la fois (contrôle d'admission) : les suivants
+    restent en attente ("pending") jusqu'à ce qu'une place se libère. Les travaux
+    terminés sont oubliés une fois récupérés (discard) ou après
+    KEEP_FINISHED_SECONDS."""
+
+    def __init__(self, max_running=DEFAULT_MAX_RUNNING_JOBS, keep_finished_seconds=KEEP_FINISHED_SECONDS):
+        self.max_running = max_running
+        self.keep_finished_seconds = keep_finished_seconds
+        self._slots = threading.Semaphore(max_running) if max_running else None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, owner, target):
+        job = ComparisonJob(owner, target, self._slots)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        job.start()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def discard(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def jobs(self, owner=None):
+        with self._lock:
+            return [job for job in self._jobs.values() if owner is None or job.owner == owner]
+
+    def queue_position(self, job):
+        """Nombre de travaux en attente envoyés avant job (0 s'il s'exécute ou est le prochain)"""
+        if job.status != "pending":
+            return 0
+        with self._lock:
+            return sum(1 for other in self._jobs.values()
+                       if other.status == "pending" and other.created_at < job.created_at)
+
+    def _prune(self):
+        limit = time.time() - self.keep_finished_seconds
+        for job_id, job in list(self._jobs.items()):
+            if not job.running and job.finished_at < limit:
+                del self._jobs[job_id]
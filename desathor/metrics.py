@@ -0,0 +1,269 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+STAGES = [
+    "pdf_open",
+    "prescreen",
+    "page_skipped",
+    "extract_text",
+    "classify_lines",
+    "build_records",
+    "groupby_merge",
+    "reconcile",
+    "status",
+    "patch_results",
+    "aggregates",
+    "store_ingest",
+    "excel_build",
+    "long_export",
+    "chart_render",
+]
+
+METRICS_LOGGER = "desathor.metrics"
+
+# États de page de l'interface, dans l'ordre du parcours
+RERUN_STATES = ["login", "idle", "running", "results"]
+RERUN_WINDOW = 500
+RERUN_REPORT_EVERY = 200
+
+
+class Timings:
+    """Temps et compteurs par étape d'un traitement.
+
+    Les totaux par étape sont toujours tenus (quelques perf_counter par page) ;
+    le détail par page n'est conservé que si detail est vrai. Le contenu
+    (to_dict) est sérialisable, pour remonter des processus d'extraction."""
+
+    def __init__(self, detail=False):
+        self.detail = detail
+        self.stages = {}
+        self.pages = {}
+        self.files = []
+        self.counters = {}
+
+    def add(self, stage, seconds, count=1, page=None):
+        total = self.stages.get(stage)
+        if total is None:
+            total = self.stages[stage] = {"seconds": 0.0, "count": 0}
+        total["seconds"] += seconds
+        total["count"] += count
+        if self.detail and page is not None:
+            entry = self.pages.setdefault(page, {"page": page})
+            entry[stage] = entry.get(stage, 0.0) + seconds
+
+    def set(self, stage, seconds, count=1):
+        """Remplace la mesure d'une étape refaite à chaque affichage (ex. rendu des graphiques)"""
+        self.stages[stage] = {"seconds": seconds, "count": count}
+
+    def count(self, name, n=1):
+        """Compteur d'événements sans durée propre (ex. pages découpées)"""
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def note_page(self, page, **values):
+        if self.detail:
+            self.pages.setdefault(page, {"page": page}).update(values)
+
+    @contextmanager
+    def measure(self, stage, count=1):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - t0, count)
+
+    def merge(self, data, file=None):
+        """Ajoute les mesures d'un autre Timings (to_dict), éventuellement rattachées à un fichier"""
+        for stage, total in data.get("stages", {}).items():
+            self.add(stage, total["seconds"], total["count"])
+        for name, n in data.get("counters", {}).items():
+            self.count(name, n)
+        if file is not None:
+            seconds = sum(total["seconds"] for total in data.get("stages", {}).values())
+            entry = dict(file, seconds=seconds)
+            if self.detail:
+                entry["pages"] = data.get("pages", [])
+            self.files.append(entry)
+        elif self.detail:
+            for page in data.get("pages", []):
+                entry = self.pages.setdefault(page["page"], {"page": page["page"]})
+                for key, value in page.items():
+                    if key != "page":
+                        entry[key] = entry.get(key, 0) + value
+
+    def to_dict(self):
+        return {
+            "stages": {stage: dict(total) for stage, total in self.stages.items()},
+            "pages": [self.pages[k] for k in sorted(self.pages)],
+            "files": list(self.files),
+            "counters": dict(self.counters),
+        }
+
+    def prescreen_report(self):
+        """Pages écartées par le pré-filtre et estimation du temps gagné, ou None sans pré-filtre.
+
+        Le coût d'extraction est rapporté au caractère : temps d'extraction
+        des pages gardées divisé par leurs caractères, multiplié par les
+        caractères des pages écartées (couvertures et conditions générales
+        sont souvent plus chargées qu'une page de lignes). On en retire le
+        travail déjà fait sur ces pages (page_skipped) et le surcoût du
+        pré-filtre sur toutes les pages (prescreen) : le gain est négatif si
+        aucune page n'est écartée."""
+        screened = self.stages.get("prescreen")
+        if screened is None:
+            return None
+        skipped = self.stages.get("page_skipped", {"seconds": 0.0, "count": 0})
+        extract = self.stages.get("extract_text", {"seconds": 0.0, "count": 0})
+        chars_kept = self.counters.get("chars_kept", 0)
+        per_char = extract["seconds"] / chars_kept if chars_kept else 0.0
+        avoided = self.counters.get("chars_skipped", 0) * per_char
+        saved = avoided - skipped["seconds"] - screened["seconds"]
+        return {
+            "screened": screened["count"],
+            "skipped": skipped["count"],
+            "screen_seconds": round(screened["seconds"], 4),
+            "saved_seconds": round(saved, 4),
+        }
+
+    def summary(self):
+        """Une ligne par étape, dans l'ordre du traitement"""
+        known = [s for s in STAGES if s in self.stages]
+        other = [s for s in self.stages if s not in STAGES]
+        return [
+            {"stage": stage, "seconds": round(self.stages[stage]["seconds"], 4), "count": self.stages[stage]["count"]}
+            for stage in known + other
+        ]
+
+
+def percentile(sorted_values, q):
+    """Centile q (0-100) par rang le plus proche, sur des valeurs triées"""
+    rank = max(-(-len(sorted_values) * q // 100), 1)
+    return sorted_values[int(rank) - 1]
+
+
+class RerunProfiler:
+    """Durées des réexécutions de l'interface par état de page, partagées par toutes les sessions.
+
+    Chaque état garde ses window dernières mesures. record indique, toutes
+    les report_every mesures, qu'un rapport est à écrire (emit_reruns) : les
+    p50/p95 se suivent ainsi d'une version à l'autre dans les métriques."""
+
+    def __init__(self, window=RERUN_WINDOW, report_every=RERUN_REPORT_EVERY):
+        self.window = window
+        self.report_every = report_every
+        self.total = 0
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, state, seconds):
+        with self._lock:
+            samples = self._samples.get(state)
+            if samples is None:
+                samples = self._samples[state] = deque(maxlen=self.window)
+            samples.append(seconds)
+            self.total += 1
+            return bool(self.report_every) and self.total % self.report_every == 0
+
+    def report(self):
+        """Une ligne par état : nombre de mesures (fenêtre), p50, p95 et max en ms"""
+        with self._lock:
+            samples = {state: sorted(values) for state, values in self._samples.items()}
+        known = [s for s in RERUN_STATES if s in samples]
+        other = [s for s in samples if s not in RERUN_STATES]
+        return [
+            {
+                "state": state,
+                "count": len(samples[state]),
+                "p50_ms": round(percentile(samples[state], 50) * 1000, 1),
+                "p95_ms": round(percentile(samples[state], 95) * 1000, 1),
+                "max_ms": round(samples[state][-1] * 1000, 1),
+            }
+            for state in known + other
+        ]
+
+
+def metrics_logger():
+    """Logger des lignes JSON de métriques (stderr, ou DESATHOR_METRICS_FILE s'il est défini)"""
+    logger = logging.getLogger(METRICS_LOGGER)
+    if not logger.handlers:
+        path = os.environ.get("DESATHOR_METRICS_FILE")
+        handler = logging.FileHandler(path, encoding="utf-8") if path else logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+def emit_metrics(timings, **context):
+    """Écrit une ligne JSON : contexte du run, totaux par étape et par fichier.
+
+    La ligne porte un run_id (tiré au hasard sauf s'il est fourni) que
+    reprennent les lignes de suivi du même run (emit_stages)."""
+    line = {
+        "event": "desathor.run",
+        "run_id": uuid.uuid4().hex,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **context,
+        "stages": {row["stage"]: {"seconds": row["seconds"], "count": row["count"]} for row in timings.summary()},
+        "files": [
+            {key: value for key, value in f.items() if key != "pages"}
+            for f in timings.files
+        ],
+    }
+    prescreen = timings.prescreen_report()
+    if prescreen is not None:
+        line["prescreen"] = prescreen
+    if timings.counters:
+        line["counters"] = dict(timings.counters)
+    metrics_logger().info(json.dumps(line, ensure_ascii=False, default=str))
+    return line
+
+
+def emit_stages(timings, stages, run_id, **context):
+    """Écrit une ligne JSON de suivi d'un run déjà émis (emit_metrics) : étapes mesurées après coup.
+
+    Dans l'interface, le classeur Excel et les graphiques ne sont produits
+    qu'après la ligne du run, aux réexécutions suivantes."""
+    line = {
+        "event": "desathor.run.stages",
+        "run_id": run_id,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **context,
+        "stages": {stage: dict(timings.stages[stage]) for stage in stages if stage in timings.stages},
+    }
+    metrics_logger().info(json.dumps(line, ensure_ascii=False, default=str))
+    return line
+
+
+def emit_reconciliation(reconciliation, **context):
+    """Écrit une ligne JSON par comparaison : lignes de BL sans commande rattachées (reconcile), une par attribution"""
+    if not len(reconciliation):
+        return None
+    line = {
+        "event": "desathor.reconciliation",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **context,
+        "assignments": reconciliation.to_dict(orient="records"),
+    }
+    metrics_logger().info(json.dumps(line, ensure_ascii=False, default=str))
+    return line
+
+
+def emit_reruns(profiler, **context):
+    """Écrit une ligne JSON : p50/p95 des réexécutions de l'interface par état de page"""
+    line = {
+        "event": "desathor.reruns",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        **context,
+        "reruns": profiler.total,
+        "states": {row.pop("state"): row for row in profiler.report()},
+    }
+    metrics_logger().info(json.dumps(line, ensure_ascii=False, default=str))
+    return line
@@ -0,0 +1,255 @@
+import io
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from functools import partial
+from queue import Empty
+
+from desathor.backends import DEFAULT_BACKEND
+from desathor.cache import content_key
+from desathor.metrics import Timings
+from desathor.records import RecordColumns
+from desathor.parsing import (
+    PRESCREEN,
+    ExtractionCancelled,
+    extract_pages,
+    extract_records_from_bl_pdf,
+    extract_records_from_command_pdf,
+    stitch_segments,
+)
+
+PARSERS = {
+    "commande": extract_records_from_command_pdf,
+    "bl": extract_records_from_bl_pdf,
+}
+
+DEFAULT_WORKERS = int(os.environ.get("DESATHOR_WORKERS", os.cpu_count() or 1))
+
+# Intervalle de relève des pages terminées par les processus (secondes)
+POLL_INTERVAL = 0.2
+
+
+def parse_bytes(kind, data, detail=False, backend=DEFAULT_BACKEND, on_page=None):
+    """Extrait un PDF (commande ou BL) à partir de son contenu brut, avec ses temps par étape"""
+    timings = Timings(detail)
+    res = PARSERS[kind](io.BytesIO(data), timings=timings, backend=backend, on_page=on_page)
+    return {
+        "records": res["records"],
+        "order_numbers": res["order_numbers"],
+        "error": res.get("error"),
+        "timings": timings.to_dict(),
+    }
+
+
+def parse_segment(kind, data, start, stop, detail=False, backend=DEFAULT_BACKEND, on_page=None, prescreen=PRESCREEN):
+    """Extrait les pages [start, stop) d'un PDF, à recoller avec stitch_segments"""
+    timings = Timings(detail)
+    segment = extract_pages(io.BytesIO(data), kind, start, stop, timings=timings, backend=backend, on_page=on_page,
+                            prescreen=prescreen)
+    segment["timings"] = timings.to_dict()
+    return segment
+
+
+def report_page(ticks, stop, index, page):
+    """on_page des processus d'extraction : signale la page du fichier index, s'arrête si stop est levé"""
+    if stop.is_set():
+        raise ExtractionCancelled()
+    ticks.put(index)
+
+
+def iter_completed(futures, poll=None):
+    """as_completed, en appelant poll() toutes les POLL_INTERVAL secondes pendant l'attente"""
+    if poll is None:
+        yield from as_completed(futures)
+        return
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+        poll()
+        yield from done
+
+
+def count_pages(data):
+    import pdfplumber
+
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        return len(pdf.pages)
+
+
+def page_ranges(n_pages, shard_pages):
+    return [(start, min(start + shard_pages, n_pages)) for start in range(0, n_pages, shard_pages)]
+
+
+def parse_files(files, workers=DEFAULT_WORKERS, cache=None, shard_pages=None, progress=None, detail=False,
+                backend=DEFAULT_BACKEND, page_progress=None, cancel=None, pool=None, owner=None):
+    """Extrait une liste de fichiers [(kind, name, data), ...], en parallèle si workers > 1.
+
+    Si shard_pages est renseigné, les PDF de plus de shard_pages pages sont
+    découpés en segments de pages traités sur des processus distincts, puis
+    recollés (numéro de commande et section de données reportés d'un segment
+    au suivant) : le résultat est identique à l'extraction séquentielle.
+
+    Les résultats sont retournés dans l'ordre d'entrée, quel que soit l'ordre
+    de fin des processus, avec une erreur éventuelle par fichier et ses temps
+    par étape (timings, None si lu depuis le cache ; détail par page si detail).
+    backend choisit le moteur d'extraction du texte (voir backends.BACKENDS) ;
+    il fait partie de la clé de cache.
+    progress(result, done, total) est appelé à chaque fichier terminé,
+    page_progress(done, total) à chaque page extraite (pages des fichiers
+    absents du cache). Si cancel (threading.Event) est levé, l'extraction
+    s'arrête à la page suivante et lève parsing.ExtractionCancelled. Les
+    rappels sont toujours faits dans le thread appelant.
+    Avec pool (pool.SharedPool), les tâches passent par la file de owner
+    dans les processus partagés du serveur, même pour un seul fichier, au
+    lieu d'un pool de workers processus créé pour l'appel."""
+    if cancel is not None and cancel.is_set():
+        raise ExtractionCancelled()
+    results = [None] * len(files)
+    pending = []
+    done = 0
+
+    def report(i):
+        nonlocal done
+        done += 1
+        if progress is not None:
+            progress(results[i], done, len(files))
+
+    for i, (kind, name, data) in enumerate(files):
+        key = content_key(kind, data, backend=backend)
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            results[i] = {"name": name, "kind": kind, "error": None, "timings": None, **cached}
+            report(i)
+        else:
+            pending.append((i, key))
+
+    n_pages = {}
+    if pool is not None:
+        workers = pool.workers
+    if page_progress is not None or (shard_pages and workers > 1):
+        for i, _ in pending:
+            try:
+                n_pages[i] = count_pages(files[i][2])
+            except Exception:
+                # Le PDF illisible sera signalé par l'extraction complète
+                n_pages[i] = None
+    pages_total = sum(n or 0 for n in n_pages.values())
+    pages_done = dict.fromkeys(n_pages, 0)
+    if page_progress is not None:
+        page_progress(0, pages_total)
+
+    def tick(i, n=1):
+        pages_done[i] = min(pages_done[i] + n, n_pages[i] or 0)
+        if page_progress is not None:
+            page_progress(sum(pages_done.values()), pages_total)
+
+    def store(i, key, res):
+        kind, name, _ = files[i]
+        if res.get("error") is None and cache is not None:
+            cache.put(key, {"records": res["records"], "order_numbers": res["order_numbers"]})
+        results[i] = {"name": name, "kind": kind, **res}
+        if page_progress is not None:
+            # Un fichier en erreur s'arrête avant sa dernière page
+            tick(i, n_pages[i] or 0)
+        report(i)
+
+    def ranges_for(i):
+        if not shard_pages or workers <= 1:
+            return None
+        if n_pages[i] is None or n_pages[i] <= shard_pages:
+            return None
+        return page_ranges(n_pages[i], shard_pages)
+
+    plans = [(i, key, ranges_for(i)) for i, key in pending]
+    n_tasks = sum(len(ranges) if ranges else 1 for _, _, ranges in plans)
+
+    if pool is None and (workers <= 1 or n_tasks <= 1):
+        for i, key in pending:
+            kind, _, data = files[i]
+
+            def on_page(page, i=i):
+                if cancel is not None and cancel.is_set():
+                    raise ExtractionCancelled()
+                if page_progress is not None:
+                    tick(i)
+
+            track = page_progress is not None or cancel is not None
+            store(i, key, parse_bytes(kind, data, detail, backend, on_page if track else None))
+        return results
+    if not n_tasks:
+        return results
+
+    track = page_progress is not None or cancel is not None
+    executor = None
+    if pool is not None:
+        submit = partial(pool.submit, owner)
+        # Pages terminées et demande d'arrêt transmises par le gestionnaire du pool, seulement si on les suit
+        manager = pool.manager() if track else None
+    else:
+        # "spawn" : on ne duplique pas les threads du serveur Streamlit par fork
+        ctx = multiprocessing.get_context("spawn")
+        executor = ProcessPoolExecutor(max_workers=min(workers, n_tasks), mp_context=ctx)
+        submit = executor.submit
+        manager = ctx.Manager() if track else None
+    ticks = manager.Queue() if manager is not None else None
+    stop = manager.Event() if manager is not None else None
+    file_of = {}
+
+    def poll():
+        while True:
+            try:
+                index = ticks.get_nowait()
+            except Empty:
+                break
+            if page_progress is not None:
+                tick(index)
+        if cancel is not None and cancel.is_set():
+            stop.set()
+            for future in file_of:
+                future.cancel()
+            # Les tâches déjà lancées s'arrêtent à leur page suivante
+            wait(file_of)
+            raise ExtractionCancelled()
+
+    try:
+        submitted = {}
+        for i, key, ranges in plans:
+            kind, _, data = files[i]
+            on_page = partial(report_page, ticks, stop, i) if manager is not None else None
+            if ranges:
+                futures = [submit(parse_segment, kind, data, start, end, detail, backend, on_page)
+                           for start, end in ranges]
+            else:
+                futures = [submit(parse_bytes, kind, data, detail, backend, on_page)]
+            submitted[i] = (key, ranges, futures)
+            file_of.update((future, i) for future in futures)
+        # Un fichier est finalisé dès que tous ses segments sont terminés
+        remaining = {i: len(futures) for i, (_, _, futures) in submitted.items()}
+        for finished in iter_completed(file_of, poll if manager is not None else None):
+            i = file_of[finished]
+            remaining[i] -= 1
+            if remaining[i]:
+                continue
+            key, ranges, futures = submitted[i]
+            kind = files[i][0]
+            try:
+                if ranges:
+                    segments = [future.result() for future in futures]
+                    timings = Timings(detail)
+                    for segment in segments:
+                        timings.merge(segment["timings"])
+                    res = stitch_segments(kind, segments, timings)
+                    res = {"records": res["records"], "order_numbers": res["order_numbers"], "error": None,
+                           "timings": timings.to_dict()}
+                else:
+                    res = futures[0].result()
+            except Exception as e:
+                res = {"records": RecordColumns.empty(kind), "order_numbers": [], "error": str(e),
+                       "timings": None}
+            store(i, key, res)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+            if manager is not None:
+                manager.shutdown()
+    return results
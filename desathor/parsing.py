@@ -0,0 +1,276 @@
+import os
+import re
+import time
+
+from desathor.backends import DEFAULT_BACKEND, page_texts
+from desathor.records import RecordBuilder, RecordColumns
+
+
+# Motifs compilés une fois pour toutes (évalués sur chaque ligne de chaque page)
+ORDER_PATTERNS = [
+    re.compile(r"Commande\s*n[°º]?\s*[:\s-]*?(\d{5,10})", re.IGNORECASE),
+    re.compile(r"N[°º]?\s*commande\s*[:\s-]*?(\d{5,10})", re.IGNORECASE),
+    re.compile(r"Bon\s+de\s+Livraison\s+Nr\.?\s*[:\s-]*?(\d{5,10})", re.IGNORECASE),
+]
+SECTION_RE = re.compile(
+    r"(?P<header>L\s+Réf\.\s*frn\s+Code\s+ean)|(?P<footer>Récapitulatif|Page\s+\d+)",
+    re.IGNORECASE
+)
+EAN_RE = re.compile(r"\b(\d{13})\b")
+CODE_ARTICLE_RE = re.compile(r"^\d{3,6}$")
+CONDITIONNEMENT_RE = re.compile(r"Conditionnement\s*:\s*\d+\s+\d+(\d+)\s+(\d+)")
+INT_RE = re.compile(r"\b(\d+)\b")
+NUMBER_RE = re.compile(r"[\d,.]+")
+
+# Pré-filtre des pages (texte brut sans blancs, dans l'ordre du flux)
+DIGIT_RUN_RE = re.compile(r"\d{5}")
+HEADER_HINT_RE = re.compile(r"r[ée]f|ean", re.IGNORECASE)
+FOOTER_HINT_RE = re.compile(r"r[ée]capitulatif|page", re.IGNORECASE)
+# None : pré-filtre sur les seuls moteurs où lire les caractères coûte bien moins que l'extraction
+PRESCREEN = {"0": False, "1": True}.get(os.environ.get("DESATHOR_PRESCREEN"))
+PRESCREEN_BACKENDS = {"pdfplumber"}
+
+def find_order_numbers_in_text(text):
+    if not text:
+        return []
+    found = []
+    for pat in ORDER_PATTERNS:
+        for m in pat.finditer(text):
+            num = m.group(1)
+            if num and num not in found:
+                found.append(num)
+    return found
+
+def is_valid_ean13(code):
+    if not code or len(code) != 13:
+        return False
+    if code.startswith(('302', '376')):
+        return False
+    return True
+
+def find_line_order_numbers(ligne):
+    """find_order_numbers_in_text sur une ligne, précédé d'un préfiltre bon marché :
+    les trois motifs exigent le mot "commande" ou "livraison"."""
+    lower = ligne.lower()
+    if "commande" not in lower and "livraison" not in lower:
+        return []
+    return find_order_numbers_in_text(ligne)
+
+def find_ean(ligne):
+    """Premier EAN13 valide de la ligne, ou None"""
+    # Une ligne de moins de 13 caractères ne peut pas contenir d'EAN
+    if len(ligne) < 13:
+        return None
+    for ean in EAN_RE.findall(ligne):
+        if is_valid_ean13(ean):
+            return ean
+    return None
+
+def parse_command_line(ligne):
+    """Extrait le tuple (ref, code_article, qte_commande) d'une ligne de commande, ou None"""
+    ean = find_ean(ligne)
+    if ean is None:
+        return None
+    parts = ligne.split()
+    ean_pos = None
+    for idx, part in enumerate(parts):
+        if ean in part:
+            ean_pos = idx
+            break
+    code_article = ""
+    if ean_pos and ean_pos > 1:
+        candidate = parts[ean_pos - 1]
+        if CODE_ARTICLE_RE.match(candidate):
+            code_article = candidate
+    qty_match = CONDITIONNEMENT_RE.search(ligne) if "Conditionnement" in ligne else None
+    if qty_match:
+        qte = int(qty_match.group(1))
+    else:
+        nums = INT_RE.findall(ligne)
+        nums = [int(n) for n in nums if n != ean and len(n) < 6]
+        if nums:
+            qte = nums[-2] if len(nums) >= 2 else nums[-1]
+        else:
+            return None
+    return ean, code_article, qte
+
+def parse_bl_line(ligne):
+    """Extrait le tuple (ref, qte_bl) d'une ligne de BL, ou None"""
+    ean = find_ean(ligne)
+    if ean is None:
+        return None
+    nums = NUMBER_RE.findall(ligne)
+    qte = None
+    if nums:
+        candidate = nums[-2] if len(nums) >= 2 else nums[-1]
+        try:
+            qte = float(candidate.replace(",", "."))
+        except:
+            return None
+    if qte is None:
+        return None
+    return ean, qte
+
+def collect_order_numbers(order_nums, orders):
+    for num in order_nums:
+        if num not in orders:
+            orders[num] = None
+
+def scan_command_page(txt, state, out, orders):
+    """Analyse le texte d'une page de commande, en une passe par ligne.
+
+    state porte current_order et in_data_section d'une page à l'autre.
+    in_data_section peut valoir None (inconnu, début d'un segment de pages) :
+    les lignes sont alors retenues sous condition, à confirmer au recollage.
+    Ajoute les lignes à out (RecordBuilder) et à orders (dict ordonné)
+    les numéros de commande rencontrés."""
+    for ligne in txt.split("\n"):
+        order_nums = find_line_order_numbers(ligne)
+        if order_nums:
+            state["current_order"] = order_nums[0]
+            collect_order_numbers(order_nums, orders)
+        section = SECTION_RE.match(ligne)
+        if section:
+            state["in_data_section"] = section.lastgroup == "header"
+            continue
+        if state["in_data_section"] is False:
+            continue
+        rec = parse_command_line(ligne)
+        if rec is None:
+            continue
+        ean, code_article, qte = rec
+        out.append(state["current_order"], ean, qte, code_article, state["in_data_section"] is None)
+
+def scan_bl_page(txt, state, out, orders):
+    """Analyse le texte d'une page de BL (voir scan_command_page)"""
+    for ligne in txt.split("\n"):
+        order_nums = find_line_order_numbers(ligne)
+        if order_nums:
+            state["current_order"] = order_nums[0]
+            collect_order_numbers(order_nums, orders)
+        rec = parse_bl_line(ligne)
+        if rec is None:
+            continue
+        ean, qte = rec
+        out.append(state["current_order"], ean, qte)
+
+PAGE_SCANNERS = {
+    "commande": scan_command_page,
+    "bl": scan_bl_page,
+}
+
+def page_may_hold_records(kind, state, raw):
+    """Pré-filtre d'une page à partir de son texte brut (caractères dans l'ordre du flux).
+
+    Retourne False seulement si l'analyse complète de la page ne peut ni
+    produire de ligne ni modifier state : aucune suite de 5 chiffres (un
+    numéro de commande en compte au moins 5, un EAN 13) et, pour une
+    commande, aucun en-tête de tableau ni pied de section qui changerait
+    in_data_section. Les blancs sont ignorés pour ne jamais couper une suite
+    de chiffres que la mise en page recollerait."""
+    compact = "".join(raw.split())
+    if DIGIT_RUN_RE.search(compact):
+        return True
+    if kind != "commande":
+        return False
+    if HEADER_HINT_RE.search(compact):
+        return True
+    # Un pied de section ne change rien si la section de données est déjà fermée
+    return state["in_data_section"] is not False and FOOTER_HINT_RE.search(compact) is not None
+
+class ExtractionCancelled(Exception):
+    """Extraction interrompue à la demande (voir extract_pages, on_page)"""
+
+def initial_state(kind, first_page=True):
+    """État de départ ; hors première page, la section de données est inconnue"""
+    state = {"current_order": None}
+    if kind == "commande":
+        state["in_data_section"] = False if first_page else None
+    return state
+
+def iter_page_texts(pdf_file, start=0, stop=None, timings=None, backend=DEFAULT_BACKEND, screen=None):
+    """Texte des pages [start, stop), une page à la fois, par le moteur d'extraction backend.
+
+    timings (metrics.Timings) reçoit les temps d'ouverture et d'extraction du
+    texte. Les pages refusées par screen(texte brut) donnent None."""
+    return page_texts(pdf_file, start, stop, timings, backend, screen)
+
+def extract_pages(pdf_file, kind, start=0, stop=None, timings=None, backend=DEFAULT_BACKEND,
+                  prescreen=PRESCREEN, on_page=None):
+    """Extrait les pages [start, stop) d'un PDF sans connaître l'état des pages précédentes.
+
+    Avec prescreen, les pages sans données possibles (page_may_hold_records)
+    ne sont ni extraites ni analysées ; None l'active selon le moteur
+    (PRESCREEN_BACKENDS). on_page(page) est appelé après chaque page, écartée
+    ou non ; il peut lever ExtractionCancelled pour interrompre l'extraction.
+    Retourne les lignes brutes (RecordBuilder, order_num None = hérité du
+    segment précédent) et l'état final du segment, pour recollage par
+    stitch_segments."""
+    scan = PAGE_SCANNERS[kind]
+    state = initial_state(kind, first_page=(start == 0))
+    out = RecordBuilder(kind)
+    orders = {}
+    if prescreen is None:
+        prescreen = backend in PRESCREEN_BACKENDS
+    screen = (lambda raw: page_may_hold_records(kind, state, raw)) if prescreen else None
+    pages = iter_page_texts(pdf_file, start, stop, timings, backend, screen)
+    for page, txt in enumerate(pages, start=start):
+        if on_page is not None:
+            on_page(page)
+        if txt is None:
+            if timings is not None:
+                timings.note_page(page, skipped=True)
+            continue
+        if timings is None:
+            scan(txt, state, out, orders)
+            continue
+        n_records = len(out)
+        n_lines = txt.count("\n") + 1
+        t0 = time.perf_counter()
+        scan(txt, state, out, orders)
+        timings.add("classify_lines", time.perf_counter() - t0, count=n_lines, page=page)
+        timings.note_page(page, lines=n_lines, records=len(out) - n_records)
+    return {"records": out, "state": state, "order_numbers": list(orders)}
+
+def stitch_segments(kind, segments, timings=None):
+    """Recolle des segments consécutifs : résout l'order_num hérité et les lignes conditionnelles"""
+    t0 = time.perf_counter()
+    carry = initial_state(kind)
+    parts = []
+    orders = {}
+    for seg in segments:
+        parts.append(seg["records"].finish(
+            inherited_order=carry["current_order"],
+            keep_conditional=bool(carry.get("in_data_section")),
+        ))
+        collect_order_numbers(seg["order_numbers"], orders)
+        if seg["state"]["current_order"] is not None:
+            carry["current_order"] = seg["state"]["current_order"]
+        if seg["state"].get("in_data_section") is not None:
+            carry["in_data_section"] = seg["state"]["in_data_section"]
+    records = RecordColumns.concat(kind, parts)
+    if timings is not None:
+        timings.add("build_records", time.perf_counter() - t0, count=len(records))
+    return {"records": records, "order_numbers": list(orders)}
+
+def extract_records_from_command_pdf(pdf_file, timings=None, backend=DEFAULT_BACKEND, prescreen=PRESCREEN,
+                                     on_page=None):
+    try:
+        segment = extract_pages(pdf_file, "commande", timings=timings, backend=backend, prescreen=prescreen,
+                                on_page=on_page)
+    except ExtractionCancelled:
+        raise
+    except Exception as e:
+        return {"records": RecordColumns.empty("commande"), "order_numbers": [], "error": str(e)}
+    return stitch_segments("commande", [segment], timings)
+
+def extract_records_from_bl_pdf(pdf_file, timings=None, backend=DEFAULT_BACKEND, prescreen=PRESCREEN,
+                                on_page=None):
+    try:
+        segment = extract_pages(pdf_file, "bl", timings=timings, backend=backend, prescreen=prescreen,
+                                on_page=on_page)
+    except ExtractionCancelled:
+        raise
+    except Exception as e:
+        return {"records": RecordColumns.empty("bl"), "order_numbers": [], "error": str(e)}
+    return stitch_segments("bl", [segment], timings)
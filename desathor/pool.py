@@ -0,0 +1,139 @@
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from desathor.parallel import DEFAULT_WORKERS
+
+
+class SharedPool:
+    """Processus d'extraction uniques pour tout le serveur, partagés équitablement entre utilisateurs.
+
+    Au plus workers tâches tournent à la fois ; les autres attendent dans
+    une file par utilisateur. Une place libérée va à l'utilisateur qui a le
+    moins de tâches en cours (à égalité, celui servi le moins récemment) :
+    un gros envoi n'occupe que les places que personne d'autre ne demande.
+    Les processus sont créés à la première tâche puis réutilisés."""
+
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self.workers = max(int(workers), 1)
+        self._executor = None
+        self._manager = None
+        self._queues = {}
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def submit(self, owner, fn, *args):
+        """Place fn(*args) dans la file de owner ; Future résolu quand la tâche est terminée.
+
+        Une tâche encore en file peut être annulée (future.cancel())."""
+        future = Future()
+        with self._lock:
+            self._queues.setdefault(owner, deque()).append((future, fn, args))
+            started = self._dispatch()
+        self._watch(started)
+        return future
+
+    def manager(self):
+        """Gestionnaire multiprocessing partagé (files et événements vers les processus d'extraction)"""
+        with self._lock:
+            if self._manager is None:
+                self._manager = multiprocessing.get_context("spawn").Manager()
+            return self._manager
+
+    def stats(self):
+        """Profondeur des files : tâches en cours et en attente, au total et par utilisateur"""
+        with self._lock:
+            owners = set(self._queues) | set(self._running)
+            by_owner = {
+                owner: {"running": self._running.get(owner, 0), "queued": len(self._queues.get(owner, ()))}
+                for owner in owners
+            }
+        return {
+            "workers": self.workers,
+            "running": sum(o["running"] for o in by_owner.values()),
+            "queued": sum(o["queued"] for o in by_owner.values()),
+            "by_owner": by_owner,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            for queue in self._queues.values():
+                for future, _, _ in queue:
+                    future.cancel()
+            self._queues = {}
+            executor, self._executor = self._executor, None
+            manager, self._manager = self._manager, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        if manager is not None:
+            manager.shutdown()
+
+    def _executor_or_new(self):
+        if self._executor is None:
+            # "spawn" : on ne duplique pas les threads du serveur Streamlit par fork
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _next_owner(self):
+        # Les files vides sont retirées : l'ordre du dict est l'ordre de service le plus ancien d'abord
+        waiting = [owner for owner, queue in self._queues.items() if queue]
+        if not waiting:
+            return None
+        return min(waiting, key=lambda owner: self._running.get(owner, 0))
+
+    def _dispatch(self):
+        """Démarre des tâches tant qu'il reste des places (verrou tenu).
+
+        Retourne les tâches démarrées ou refusées [(owner, future, inner,
+        erreur)], à passer à _watch une fois le verrou relâché : le rappel
+        d'une tâche déjà terminée s'exécute aussitôt et reprend le verrou,
+        comme ceux du Future d'une tâche refusée."""
+        started = []
+        while sum(self._running.values()) < self.workers:
+            owner = self._next_owner()
+            if owner is None:
+                break
+            queue = self._queues.pop(owner)
+            future, fn, args = queue.popleft()
+            if queue:
+                # Replacé en fin d'ordre de service
+                self._queues[owner] = queue
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                inner = self._executor_or_new().submit(fn, *args)
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    # Un processus a été tué : le prochain envoi recrée le pool
+                    self._executor = None
+                started.append((owner, future, None, e))
+                continue
+            self._running[owner] = self._running.get(owner, 0) + 1
+            started.append((owner, future, inner, None))
+        return started
+
+    def _watch(self, started):
+        """Rattache la fin de chaque tâche démarrée à son Future, ou lui passe son erreur (verrou relâché)"""
+        for owner, future, inner, error in started:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                inner.add_done_callback(partial(self._finished, owner, future))
+
+    def _finished(self, owner, future, inner):
+        with self._lock:
+            self._running[owner] -= 1
+            if not self._running[owner]:
+                del self._running[owner]
+            if isinstance(inner.exception(), BrokenProcessPool):
+                self._executor = None
+            started = self._dispatch()
+        if inner.exception() is not None:
+            future.set_exception(inner.exception())
+        else:
+            future.set_result(inner.result())
+        self._watch(started)
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+from desathor.records import NO_ORDER, ean_to_str
+
+RECONCILIATION_COLUMNS = ["order_num", "ref", "qte_bl", "rule"]
+# Règles d'attribution : une seule commande attend l'EAN, ou plus grand reste à livrer d'abord
+RULE_UNIQUE = "unique"
+RULE_LARGEST = "largest_outstanding"
+
+
+def empty_reconciliation():
+    return pd.DataFrame(columns=RECONCILIATION_COLUMNS)
+
+
+def reconcile_orphans(cmd, bl, orders):
+    """Rattache aux lignes de commande ouvertes les quantités de BL lues sans numéro de commande (NO_ORDER).
+
+    cmd et bl sont les lignes agrégées par commande (compare.aggregate),
+    order_num catégoriel dans l'ordre orders. Pour chaque EAN, la quantité
+    orpheline, moins ce que réclament les lignes de commande elles aussi sans
+    numéro, est répartie sur les lignes (commande, EAN) dont le reste à livrer
+    est positif : plus grand reste d'abord, à égalité la commande apparue la
+    première, chacune jusqu'à son reste. Le reliquat reste sur NO_ORDER.
+
+    Les candidates sont regroupées par EAN (index par hachage) puis réparties
+    par une somme cumulée dans chaque groupe : un tri des seules lignes dont
+    l'EAN a une quantité orpheline, pas de comparaison deux à deux.
+    Retourne (bl mis à jour, attributions [RECONCILIATION_COLUMNS]) ; les
+    appelants tracent les attributions (metrics.emit_reconciliation)."""
+    if NO_ORDER not in orders or not len(bl):
+        return bl, empty_reconciliation()
+    orphan_rows = (bl["order_num"] == NO_ORDER).to_numpy()
+    if not orphan_rows.any():
+        return bl, empty_reconciliation()
+    # bl est agrégé par (commande, EAN) : un EAN au plus une fois sous NO_ORDER
+    orphans = pd.Series(bl["qte_bl"].to_numpy()[orphan_rows], index=bl["ref"].to_numpy()[orphan_rows])
+
+    wanted = cmd[cmd["ref"].isin(orphans.index)]
+    wanted = wanted.groupby(["order_num", "ref"], observed=True, sort=False, as_index=False)["qte_commande"].sum()
+    unnumbered = (wanted["order_num"] == NO_ORDER).to_numpy()
+    claimed = pd.Series(wanted["qte_commande"].to_numpy()[unnumbered], index=wanted["ref"].to_numpy()[unnumbered])
+    available = (orphans - claimed.reindex(orphans.index, fill_value=0)).clip(lower=0)
+
+    open_lines = wanted[~unnumbered].merge(bl[~orphan_rows], on=["order_num", "ref"], how="left", sort=False)
+    outstanding = open_lines["qte_commande"].to_numpy(dtype=float) - open_lines["qte_bl"].fillna(0).to_numpy()
+    open_lines = open_lines.assign(outstanding=outstanding)[outstanding > 0]
+    if open_lines.empty:
+        return bl, empty_reconciliation()
+
+    ref = open_lines["ref"].to_numpy()
+    rest = open_lines["outstanding"].to_numpy()
+    order_code = open_lines["order_num"].cat.codes.to_numpy()
+    sort = np.lexsort((order_code, -rest, ref))
+    ref, rest, order_code = ref[sort], rest[sort], order_code[sort]
+    groups, first = np.unique(ref, return_index=True)
+    group = np.repeat(np.arange(len(groups)), np.diff(np.r_[first, len(ref)]))
+    cumulative = np.cumsum(rest)
+    before = cumulative - rest - (cumulative - rest)[first][group]
+    assigned = np.clip(available.reindex(groups).to_numpy()[group] - before, 0, rest)
+    candidates = np.bincount(group)[group]
+
+    keep = assigned > 0
+    orders_index = open_lines["order_num"].cat.categories
+    additions = pd.DataFrame({
+        "order_num": pd.Categorical.from_codes(order_code[keep], categories=orders_index),
+        "ref": ref[keep],
+        "qte_bl": assigned[keep],
+    })
+    if additions.empty:
+        return bl, empty_reconciliation()
+    taken = additions.groupby("ref", sort=False)["qte_bl"].sum()
+    remaining = bl["qte_bl"].to_numpy(dtype=float, copy=True)
+    remaining[orphan_rows] -= taken.reindex(orphans.index, fill_value=0).to_numpy()
+    updated = bl.assign(qte_bl=remaining)
+    # Une ligne orpheline entièrement rattachée disparaît
+    updated = updated[~(orphan_rows & (remaining <= 0))]
+    updated = pd.concat([updated, additions], ignore_index=True)
+    updated = updated.groupby(["order_num", "ref"], observed=True, sort=True, as_index=False)["qte_bl"].sum()
+
+    reconciliation = pd.DataFrame({
+        "order_num": additions["order_num"].astype(str).to_numpy(),
+        "ref": ean_to_str(additions["ref"]).to_numpy(),
+        "qte_bl": additions["qte_bl"].to_numpy(),
+        "rule": np.where(candidates[keep] == 1, RULE_UNIQUE, RULE_LARGEST),
+    })
+    return updated, reconciliation
@@ -0,0 +1,170 @@
+from array import array
+
+import numpy as np
+import pandas as pd
+
+NO_ORDER = "__NO_ORDER__"
+EAN_WIDTH = 13
+
+QTY_COLUMN = {"commande": "qte_commande", "bl": "qte_bl"}
+# Quantités commandées entières, quantités livrées décimales
+QTY_TYPECODE = {"commande": "q", "bl": "d"}
+
+
+def _code(categories, value):
+    code = categories.get(value)
+    if code is None:
+        code = categories[value] = len(categories)
+    return code
+
+
+def _by_appearance(codes, categories):
+    """Codes renumérotés et catégories réduites à celles utilisées, dans l'ordre de première apparition"""
+    used, first = np.unique(codes, return_index=True)
+    used = used[np.argsort(first, kind="stable")]
+    remap = np.zeros(len(categories), dtype=np.int32)
+    remap[used] = np.arange(len(used), dtype=np.int32)
+    return remap[codes], [categories[c] for c in used]
+
+
+def ean_to_str(values):
+    """EAN entiers -> chaînes de 13 chiffres (zéros de tête rétablis)"""
+    return pd.Series(values, copy=False).astype(str).str.zfill(EAN_WIDTH)
+
+
+class RecordBuilder:
+    """Lignes extraites d'un document, ajoutées une à une dans des tableaux typés.
+
+    order_num et code_article sont codés en entiers (catégories dans l'ordre
+    d'apparition), l'EAN est stocké en int64. order_num None signifie hérité
+    du segment de pages précédent, conditional une ligne à confirmer au
+    recollage (voir parsing.stitch_segments)."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.ean = array("q")
+        self.qte = array(QTY_TYPECODE[kind])
+        self.order = array("i")
+        self.article = array("i")
+        self.conditional = array("b")
+        self._orders = {}
+        self._articles = {}
+
+    def __len__(self):
+        return len(self.ean)
+
+    def append(self, order_num, ean, qte, code_article="", conditional=False):
+        self.order.append(-1 if order_num is None else _code(self._orders, order_num))
+        self.ean.append(int(ean))
+        self.qte.append(qte)
+        if self.kind == "commande":
+            self.article.append(_code(self._articles, code_article))
+        self.conditional.append(conditional)
+
+    def finish(self, inherited_order=None, keep_conditional=True):
+        """Colonnes définitives : order_num hérité résolu, lignes conditionnelles gardées ou écartées"""
+        order = np.frombuffer(self.order, dtype=np.int32).copy()
+        inherited = order < 0
+        reorder = inherited.any()
+        if reorder:
+            order[inherited] = _code(self._orders, inherited_order or NO_ORDER)
+        columns = {
+            "ean": np.frombuffer(self.ean, dtype=np.int64).copy(),
+            "qte": np.array(self.qte),
+            "order": order,
+            "article": np.frombuffer(self.article, dtype=np.int32).copy() if self.kind == "commande" else None,
+        }
+        if not keep_conditional:
+            keep = np.frombuffer(self.conditional, dtype=np.int8) == 0
+            if not keep.all():
+                reorder = True
+                columns = {name: col[keep] if col is not None else None for name, col in columns.items()}
+        order_categories, article_categories = list(self._orders), list(self._articles)
+        # Lignes héritées (en tête du segment) ou écartées : catégories remises dans l'ordre d'apparition des
+        # lignes gardées, comme pour une extraction d'un seul bloc
+        if reorder:
+            columns["order"], order_categories = _by_appearance(columns["order"], order_categories)
+            if columns["article"] is not None:
+                columns["article"], article_categories = _by_appearance(columns["article"], article_categories)
+        return RecordColumns(self.kind, order_categories=order_categories,
+                             article_categories=article_categories, **columns)
+
+
+class RecordColumns:
+    """Lignes extraites en colonnes typées, converties en DataFrame sans passer par un dict par ligne"""
+
+    def __init__(self, kind, ean, qte, order, order_categories, article=None, article_categories=None):
+        self.kind = kind
+        self.ean = ean
+        self.qte = qte
+        self.order = order
+        self.order_categories = order_categories
+        self.article = article
+        self.article_categories = article_categories or []
+
+    @classmethod
+    def empty(cls, kind):
+        return RecordBuilder(kind).finish()
+
+    @classmethod
+    def concat(cls, kind, parts):
+        """Concatène des colonnes de même type en fusionnant les catégories (ordre d'apparition)"""
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return cls.empty(kind)
+        if len(parts) == 1:
+            return parts[0]
+        orders, articles = {}, {}
+        order_codes, article_codes = [], []
+        for part in parts:
+            remap = np.array([_code(orders, c) for c in part.order_categories], dtype=np.int32)
+            order_codes.append(remap[part.order])
+            if kind == "commande":
+                remap = np.array([_code(articles, c) for c in part.article_categories], dtype=np.int32)
+                article_codes.append(remap[part.article])
+        return cls(
+            kind,
+            ean=np.concatenate([part.ean for part in parts]),
+            qte=np.concatenate([part.qte for part in parts]),
+            order=np.concatenate(order_codes),
+            order_categories=list(orders),
+            article=np.concatenate(article_codes) if kind == "commande" else None,
+            article_categories=list(articles),
+        )
+
+    def __len__(self):
+        return len(self.ean)
+
+    @property
+    def nbytes(self):
+        arrays = [self.ean, self.qte, self.order] + ([self.article] if self.article is not None else [])
+        return sum(a.nbytes for a in arrays)
+
+    def appearance(self):
+        """Commandes dans l'ordre de première apparition des lignes"""
+        return [self.order_categories[code] for code in pd.unique(self.order)]
+
+    def select_orders(self, order_nums):
+        """Lignes des commandes de order_nums (catégories inchangées)"""
+        codes = [code for code, order_num in enumerate(self.order_categories) if order_num in order_nums]
+        keep = np.isin(self.order, codes)
+        return RecordColumns(
+            self.kind,
+            ean=self.ean[keep],
+            qte=self.qte[keep],
+            order=self.order[keep],
+            order_categories=self.order_categories,
+            article=self.article[keep] if self.article is not None else None,
+            article_categories=self.article_categories,
+        )
+
+    def to_frame(self):
+        """DataFrame typé : order_num et code_article catégoriels, ref en int64"""
+        data = {
+            "order_num": pd.Categorical.from_codes(self.order, categories=self.order_categories),
+            "ref": self.ean,
+        }
+        if self.kind == "commande":
+            data["code_article"] = pd.Categorical.from_codes(self.article, categories=self.article_categories)
+        data[QTY_COLUMN[self.kind]] = self.qte
+        return pd.DataFrame(data)
@@ -0,0 +1,191 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from desathor.records import EAN_WIDTH, ean_to_str
+
+DEFAULT_STORE_PATH = os.environ.get(
+    "DESATHOR_STORE_PATH",
+    os.path.join(os.path.expanduser("~"), ".local", "share", "desathor", "lines.sqlite"),
+)
+# Hashes par requête de known_files (SQLite : 999 paramètres au plus avant la version 3.32)
+KNOWN_FILES_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file_hash TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    n_lines INTEGER NOT NULL,
+    ingested_at TEXT NOT NULL,
+    PRIMARY KEY (file_hash, kind)
+);
+CREATE TABLE IF NOT EXISTS lines (
+    file_hash TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    order_num TEXT NOT NULL,
+    ean INTEGER NOT NULL,
+    code_article TEXT,
+    qty REAL NOT NULL,
+    ingested_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_lines_order ON lines (order_num);
+CREATE INDEX IF NOT EXISTS idx_lines_ean ON lines (ean);
+CREATE INDEX IF NOT EXISTS idx_lines_file ON lines (file_hash);
+"""
+
+LINE_COLUMNS = ["kind", "order_num", "ref", "code_article", "qty", "name", "ingested_at"]
+
+
+def file_hash(data):
+    """Hash du contenu d'un fichier source (indépendant du nom et du parseur)"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class LineStore:
+    """Base SQLite de toutes les lignes extraites (commandes et BL), conservée entre les sessions.
+
+    Une ligne par ligne extraite : hash du fichier source, type, commande,
+    EAN (entier), code article, quantité et date d'ingestion. Un fichier
+    déjà présent (même contenu, même type) n'est jamais ingéré deux fois.
+    Chaque opération ouvre sa propre connexion : la base est partagée sans
+    verrou Python par toutes les sessions et tous les processus."""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self._init_lock = threading.Lock()
+        self._ready = False
+
+    @contextmanager
+    def connect(self):
+        if not self._ready:
+            with self._init_lock:
+                if not self._ready:
+                    directory = os.path.dirname(self.path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    with sqlite3.connect(self.path, timeout=30) as conn:
+                        # WAL : les lectures ne bloquent pas pendant une ingestion
+                        conn.execute("PRAGMA journal_mode=WAL")
+                        conn.executescript(SCHEMA)
+                    self._ready = True
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA synchronous=NORMAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def known_files(self, hashes):
+        """Sous-ensemble de hashes [(file_hash, kind)] déjà présents dans la base"""
+        hashes = list(hashes)
+        if not hashes:
+            return set()
+        file_hashes = [h for h, _ in hashes]
+        rows = []
+        with self.connect() as conn:
+            # Par paquets : SQLite borne le nombre de paramètres d'une requête
+            for i in range(0, len(file_hashes), KNOWN_FILES_CHUNK):
+                chunk = file_hashes[i:i + KNOWN_FILES_CHUNK]
+                rows += conn.execute(
+                    "SELECT file_hash, kind FROM files WHERE file_hash IN (%s)" % ",".join("?" * len(chunk)),
+                    chunk,
+                ).fetchall()
+        return set(rows) & set(hashes)
+
+    def ingest(self, kind, name, data_hash, records, timestamp=None):
+        """Ajoute en une transaction toutes les lignes d'un fichier (RecordColumns) ; 0 si déjà présent"""
+        ingested_at = (timestamp or datetime.now()).isoformat(timespec="seconds")
+        orders = records.order_categories
+        order_nums = [orders[code] for code in records.order.tolist()]
+        if kind == "commande":
+            articles = records.article_categories
+            code_articles = [articles[code] for code in records.article.tolist()]
+        else:
+            code_articles = [None] * len(records)
+        rows = zip(
+            [data_hash] * len(records),
+            [kind] * len(records),
+            order_nums,
+            records.ean.tolist(),
+            code_articles,
+            records.qte.tolist(),
+            [ingested_at] * len(records),
+        )
+        with self.connect() as conn:
+            with conn:
+                inserted = conn.execute(
+                    "INSERT OR IGNORE INTO files (file_hash, kind, name, n_lines, ingested_at) VALUES (?, ?, ?, ?, ?)",
+                    (data_hash, kind, name, len(records), ingested_at),
+                ).rowcount
+                if not inserted:
+                    return 0
+                conn.executemany("INSERT INTO lines VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(records)
+
+    def ingest_parsed(self, files, parsed):
+        """Ingère les résultats de parse_files sans erreur dont le fichier n'est pas encore en base.
+
+        files : [(kind, nom, contenu)] dans l'ordre de parsed. Retourne le
+        nombre de fichiers ajoutés."""
+        return self.ingest_hashed((file_hash(data), res) for (_, _, data), res in zip(files, parsed))
+
+    def ingest_hashed(self, entries):
+        """Comme ingest_parsed, pour des résultats dont le hash du contenu est déjà calculé [(hash, résultat)]"""
+        entries = [(h, res) for h, res in entries if not res["error"]]
+        known = self.known_files((h, res["kind"]) for h, res in entries)
+        added = 0
+        for h, res in entries:
+            if (h, res["kind"]) in known:
+                continue
+            self.ingest(res["kind"], res["name"], h, res["records"])
+            known.add((h, res["kind"]))
+            added += 1
+        return added
+
+    def _lines(self, where, params):
+        with self.connect() as conn:
+            df = pd.read_sql_query(
+                "SELECT l.kind, l.order_num, l.ean, l.code_article, l.qty, f.name, l.ingested_at "
+                "FROM lines l JOIN files f ON f.file_hash = l.file_hash AND f.kind = l.kind "
+                f"WHERE {where} ORDER BY l.ingested_at, l.kind = 'bl', f.name, l.rowid",
+                conn,
+                params=params,
+            )
+        df["ean"] = ean_to_str(df["ean"]).to_numpy()
+        df["code_article"] = df["code_article"].fillna("")
+        df.columns = LINE_COLUMNS
+        return df
+
+    def order_lines(self, order_num):
+        """Lignes de commande et de BL déjà ingérées pour une commande"""
+        return self._lines("l.order_num = ?", (str(order_num),))
+
+    def ean_lines(self, ean):
+        """Lignes de commande et de BL déjà ingérées pour un EAN"""
+        return self._lines("l.ean = ?", (int(str(ean).strip().zfill(EAN_WIDTH)),))
+
+    def order_summary(self, order_num):
+        """Quantités commandées et livrées par EAN pour une commande, toutes ingestions confondues"""
+        lines = self.order_lines(order_num)
+        if lines.empty:
+            return pd.DataFrame(columns=["ref", "qte_commande", "qte_bl"])
+        summary = lines.pivot_table(index="ref", columns="kind", values="qty", aggfunc="sum", fill_value=0)
+        summary = summary.reindex(columns=["commande", "bl"], fill_value=0)
+        summary.columns = ["qte_commande", "qte_bl"]
+        return summary.reset_index()
+
+    def stats(self):
+        with self.connect() as conn:
+            files = conn.execute("SELECT kind, COUNT(*), COALESCE(SUM(n_lines), 0) FROM files GROUP BY kind").fetchall()
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        return {
+            "files": {kind: n for kind, n, _ in files},
+            "lines": sum(n_lines for _, _, n_lines in files),
+            "bytes": size,
+        }